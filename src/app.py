@@ -1,21 +1,44 @@
+import time
+
+# Startup is reported per phase, the first being these imports
+IMPORTS_START_TIME = time.perf_counter()
+
+import asyncio
+import os
 from contextlib import asynccontextmanager
 from pythonjsonlogger import jsonlogger
 import socket
-import time
 import logging
-from typing import List
+import threading
+from typing import List, Tuple
 from apscheduler.schedulers.background import BackgroundScheduler
 from pydantic import BaseModel, Field
 from fastapi.staticfiles import StaticFiles
 from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from src.data import Data, ApplicationSummary
-from src.search import SearchResultMeta
+from src.data import (
+    Data,
+    DataGeneration,
+    ApplicationSummary,
+    ApplicationsResponse,
+    get_fulltext_search_engine_factory,
+    get_semantic_search_engine_factory,
+)
+from src.search import SearchEngineResult, SearchResultMeta
 from src.search_hybrid import combine_results
-from src.search_query import SearchQuery
+from src.search_query import SearchCursor, SearchQuery
 from src.config import Settings
+from src.cache import LRUCache
+from src.embedding_service import EmbeddingClient
+from src.executor import BoundedExecutor, SingleFlight
+from src.memory import get_memory_usage
+from src.search_semantic import get_embedding_function
+from src.timing import PhaseTimer
 from src.util import get_json_log_formatter
 
+startup_timer = PhaseTimer()
+startup_timer.record("imports", time.perf_counter() - IMPORTS_START_TIME)
+
 ######################################################################
 # CONFIGURATION
 
@@ -38,7 +61,11 @@ async def lifespan(app: FastAPI):
 
     class HealthCheckFilter(logging.Filter):
         def filter(self, record):
-            return record.getMessage().find("GET /health HTTP") == -1
+            message = record.getMessage()
+            return (
+                message.find("GET /health HTTP") == -1
+                and message.find("GET /ready HTTP") == -1
+            )
 
     access_logger = logging.getLogger("uvicorn.access")
     # Remove existing logger otherwise access messages will be printed twice, once plain, once in json
@@ -48,21 +75,147 @@ async def lifespan(app: FastAPI):
     access_logger.addHandler(access_log_handler)
     access_logger.addFilter(HealthCheckFilter())
 
+    # Loading runs in the background, so that the worker answers /health
+    # (liveness) right away, and /ready once it can serve searches
+    threading.Thread(target=start_up, name="startup", daemon=True).start()
+
     yield
 
+    search_executor.shutdown()
+
 
 ######################################################################
 # STATE
 
 
-data = Data(settings.storage_dir)
-data.reload()
+query_embedding_cache: LRUCache[str, List[float]] = LRUCache(
+    max_size=settings.query_embedding_cache_size,
+    ttl_seconds=settings.query_embedding_cache_ttl_seconds,
+)
+
+data = Data(
+    settings.storage_dir,
+    semantic_search_engine_factory=get_semantic_search_engine_factory(
+        backend=settings.semantic_search_backend,
+        embedding_dtype=settings.semantic_search_embedding_dtype,
+        query_embedding_cache=query_embedding_cache,
+        embedding_client=(
+            None
+            if settings.embedding_service_socket is None
+            else EmbeddingClient(settings.embedding_service_socket)
+        ),
+    ),
+    fulltext_search_engine_factory=get_fulltext_search_engine_factory(
+        backend=settings.fulltext_search_backend
+    ),
+)
+
+# Set once data is loaded and the model is warm
+ready = threading.Event()
+# Held while starting up, which a failed startup is retried from
+startup_lock = threading.Lock()
+
+# Engine calls are CPU-bound, running them on the event loop would stall
+# every other request on this worker
+search_executor = BoundedExecutor(
+    max_workers=settings.search_max_concurrency, thread_name_prefix="search"
+)
+
+# Generation id and canonical query, so that a reload invalidates entries
+RankingCacheKey = Tuple[str, Tuple[str, int, float, str]]
+# The same, with the offset and limit of a page
+SearchCacheKey = Tuple[str, Tuple[str, int, float, str], int, int]
+
+# Results of recent queries, ranked up to the depth they were searched to
+ranking_cache: LRUCache[
+    RankingCacheKey, Tuple[int, List[SearchEngineResult]]
+] = LRUCache(
+    max_size=settings.search_ranking_cache_size,
+    ttl_seconds=settings.search_ranking_cache_ttl_seconds,
+)
+
+# Serialized pages of results
+search_result_cache: LRUCache[SearchCacheKey, bytes] = LRUCache(
+    max_size=settings.search_result_cache_size
+)
+
+# Identical queries arriving while one is being computed wait for its result
+search_single_flight: SingleFlight[SearchCacheKey, bytes] = SingleFlight()
+
+
+def start_up():
+    if not startup_lock.acquire(blocking=False):
+        return
+    try:
+        _start_up()
+    finally:
+        startup_lock.release()
+
+
+def _start_up():
+    try:
+        data.reload()
+        for phase, seconds in data.generation.load_seconds_by_phase.items():
+            startup_timer.record(phase, seconds)
+
+        if settings.embedding_service_socket is None:
+            with startup_timer.phase("model"):
+                get_embedding_function()
+
+        with startup_timer.phase("warm_up"):
+            data.generation.semantic_search_engine.warm_up()
+            data.generation.fulltext_search_engine.search("warm up")
+    except Exception:
+        # The worker stays unready, so health checks take it out of rotation
+        logging.exception("worker %d failed to start", os.getpid())
+        return
+
+    ready.set()
+
+    logging.info(
+        "worker %d ready in %.2f seconds (%s)",
+        os.getpid(),
+        startup_timer.get_total_seconds(),
+        ", ".join(
+            f"{phase}: {seconds:.2f}s"
+            for phase, seconds in startup_timer.seconds_by_phase.items()
+        ),
+    )
+    memory_usage = get_memory_usage()
+    if memory_usage is not None:
+        logging.info(
+            "worker %d resident memory: %.1f MiB private, %.1f MiB shared",
+            os.getpid(),
+            memory_usage["private"] / 2**20,
+            memory_usage["shared"] / 2**20,
+        )
+
+
+def get_generation() -> DataGeneration:
+    if not hasattr(data, "generation"):
+        raise HTTPException(status_code=503, detail="Data is still loading")
+    return data.generation
+
+
+def reload_data():
+    previous_generation_id = data.generation.id if hasattr(data, "generation") else None
+    if ready.is_set():
+        data.reload()
+    else:
+        # Startup loads the current generation itself. One that failed is
+        # retried, rather than leaving the worker unready until restarted
+        start_up()
+
+    if hasattr(data, "generation") and data.generation.id != previous_generation_id:
+        search_result_cache.clear()
+        ranking_cache.clear()
+
 
 app = FastAPI(lifespan=lifespan)
 
 scheduler = BackgroundScheduler()
 scheduler.add_job(
-    func=data.reload,
+    func=reload_data,
     trigger="cron",
     minute="5,35",
     max_instances=1,
@@ -105,88 +258,174 @@ class SearchResult(BaseModel):
 
 class SearchResponse(BaseModel):
     results: List[SearchResult] = Field(serialization_alias="results")
-
-
-class ApplicationsResponse(BaseModel):
-    application_summaries: List[ApplicationSummary] = Field(
-        serialization_alias="applicationSummaries"
-    )
+    # Token to pass as `cursor` for the next page, if there is one
+    next_cursor: str | None = Field(default=None, serialization_alias="nextCursor")
 
 
 ######################################################################
 # API ROUTES
 
 
-@app.get("/search")
-async def search(q: str, response: Response) -> SearchResponse:
-    try:
-        query = SearchQuery(
-            q,
-            default_hybrid_search_fulltext_std_dev_factor=1,
-            default_semantic_score_cutoff=0.35,
+async def rank_results(
+    query: SearchQuery, generation: DataGeneration, k: int
+) -> List[SearchEngineResult]:
+    """
+    Results of the query, ranked, up to `k` of them.
+    """
+
+    def search_semantic():
+        return generation.semantic_search_engine.search(
+            query.string, min_score=query.params.semantic_score_cutoff, k=k
         )
-    except Exception as e:
-        logging.error("Error parsing query '%s': %s", q, e)
-        raise HTTPException(status_code=400, detail=str(e))
+
+    def search_fulltext():
+        return generation.fulltext_search_engine.search(query.string, k=k)
+
+    def search_fulltext_all():
+        # Which fulltext results make it into hybrid results depends on the
+        # scores of all of them
+        return generation.fulltext_search_engine.search(query.string)
 
     if query.params.strategy == "semantic":
-        results = data.semantic_search_engine.search(
-            query.string, min_score=query.params.semantic_score_cutoff
-        )
+        return await search_executor.run(search_semantic)
 
     elif query.params.strategy == "fulltext":
-        results = data.fulltext_search_engine.search(query.string)
+        return await search_executor.run(search_fulltext)
 
     elif query.params.strategy == "hybrid":
-        semantic_results = data.semantic_search_engine.search(
-            query.string, min_score=query.params.semantic_score_cutoff
+        semantic_results, fulltext_results = await asyncio.gather(
+            search_executor.run(search_semantic),
+            search_executor.run(search_fulltext_all),
         )
-        fulltext_results = data.fulltext_search_engine.search(query.string)
-        results = combine_results(
+        return combine_results(
             semantic_results=semantic_results,
             fulltext_results=fulltext_results,
             fulltext_std_dev_factor=query.params.hybrid_search_fulltext_std_dev_factor,
-        )
+        )[:k]
     else:
         raise Exception('Unknown strategy: "%s"' % query.params.strategy)
 
-    response.headers["Cache-Control"] = f"max-age={settings.cache_max_age_seconds}"
 
-    # Debugging intermittent issue. Other half of this is in data.py /
-    # Data / reload.
+async def get_ranked_results(
+    query: SearchQuery, generation: DataGeneration, depth: int, search_depth: int
+) -> List[SearchEngineResult]:
+    """
+    Results of the query, ranked, up to at least `depth` of them when there
+    are that many. Served from earlier searches of the same query when they
+    went deep enough, otherwise searched up to `search_depth`.
+    """
+    cache_key = (generation.id, query.cache_key)
+    cached = ranking_cache.get(cache_key)
+    if cached is not None:
+        cached_depth, ranked_results = cached
+        # Fewer results than were searched for means that there are no more
+        if cached_depth >= depth or len(ranked_results) < cached_depth:
+            return ranked_results
+
+    ranked_results = await rank_results(query, generation, k=search_depth)
+    ranking_cache.put(cache_key, (search_depth, ranked_results))
+    return ranked_results
+
+
+async def render_search_response(
+    query: SearchQuery, generation: DataGeneration, offset: int, limit: int
+) -> bytes:
+    end = offset + limit
+    # One result past the page tells whether there is a next page. Searching
+    # one page further serves the next page from the same ranking.
+    results = await get_ranked_results(
+        query,
+        generation,
+        depth=min(end + 1, settings.max_search_results),
+        search_depth=min(end + limit + 1, settings.max_search_results),
+    )
 
-    search_results: List[SearchResult] = []
-    for r in results[0 : settings.max_search_results]:
-        try:
-            search_results.append(
+    next_cursor = None
+    if len(results) > end and end < settings.max_search_results:
+        next_cursor = SearchCursor(
+            query_string=query.query_string,
+            generation_id=generation.id,
+            offset=end,
+            limit=limit,
+        ).encode()
+
+    return (
+        SearchResponse(
+            results=[
                 SearchResult(
                     meta=SearchResultMeta(search_type=r.type, search_score=r.score),
-                    data=data.application_summaries_by_ref[r.ref],
+                    data=generation.application_summaries_by_ref[r.ref],
                 )
-            )
-        except Exception as e:
-            logging.warn(
-                "Anomaly detected: could not retrieve application %s: %s", r.ref, e
+                for r in results[offset:end]
+            ],
+            next_cursor=next_cursor,
+        )
+        .model_dump_json(by_alias=True)
+        .encode("utf-8")
+    )
+
+
+@app.get("/search", response_model=SearchResponse)
+async def search(
+    q: str | None = None, limit: int | None = None, cursor: str | None = None
+) -> Response:
+    """
+    Search applications. Results are paginated by `limit`, the response
+    carries a `nextCursor` to pass as `cursor`, instead of `q`, to get the
+    next page.
+    """
+    search_cursor = None
+    try:
+        if cursor is not None:
+            search_cursor = SearchCursor.decode(cursor)
+            q = search_cursor.query_string
+            offset = search_cursor.offset
+            limit = search_cursor.limit if limit is None else limit
+        elif q is None:
+            raise Exception("Missing search query")
+        else:
+            offset = 0
+
+        limit = settings.max_search_results if limit is None else limit
+        if limit < 1 or limit > settings.max_search_results:
+            raise Exception(
+                f"Invalid limit: must be between 1 and {settings.max_search_results}"
             )
 
-    return SearchResponse(results=search_results)
+        query = SearchQuery(
+            q,
+            default_hybrid_search_fulltext_std_dev_factor=1,
+            default_semantic_score_cutoff=0.35,
+        )
+    except Exception as e:
+        logging.error("Error parsing query '%s': %s", q, e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    generation = get_generation()
+    # Results were ranked differently in the generation the cursor was made in
+    if search_cursor is not None and search_cursor.generation_id != generation.id:
+        raise HTTPException(
+            status_code=400, detail="Search results changed, search again"
+        )
+    headers = {"Cache-Control": f"max-age={settings.cache_max_age_seconds}"}
+
+    cache_key = (generation.id, query.cache_key, offset, limit)
+    body = search_result_cache.get(cache_key)
+    if body is None:
+        body = await search_single_flight.run(
+            cache_key,
+            lambda: render_search_response(query, generation, offset, limit),
+        )
+        search_result_cache.put(cache_key, body)
 
-    # return SearchResponse(
-    #     results=[
-    #         SearchResult(
-    #             meta=SearchResultMeta(search_type=r.type, search_score=r.score),
-    #             data=data.application_summaries_by_ref[r.ref],
-    #         )
-    #         for r in results[0 : settings.max_search_results]
-    #     ]
-    # )
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
-@app.get("/applications")
-async def get_applications(response: Response) -> ApplicationsResponse:
-    response.headers["Cache-Control"] = f"max-age={settings.cache_max_age_seconds}"
-    return ApplicationsResponse(
-        application_summaries=list(data.application_summaries_by_ref.values())
+@app.get("/applications", response_model=ApplicationsResponse)
+async def get_applications(request: Request) -> Response:
+    return get_generation().applications_response.to_response(
+        request.headers,
+        headers={"Cache-Control": f"max-age={settings.cache_max_age_seconds}"},
     )
 
 
@@ -195,4 +434,24 @@ async def get_healthcheck():
     return {"ok": True}
 
 
+@app.get("/ready")
+async def get_readiness():
+    if not ready.is_set():
+        raise HTTPException(status_code=503, detail="Starting up")
+    return {"ok": True, "startup_seconds_by_phase": startup_timer.seconds_by_phase}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "query_embedding_cache": query_embedding_cache.get_stats(),
+        "search_result_cache": search_result_cache.get_stats(),
+        "ranking_cache": ranking_cache.get_stats(),
+        "search_single_flight": search_single_flight.get_stats(),
+        "search_executor": search_executor.get_stats(),
+        "memory": get_memory_usage(),
+        "startup_seconds_by_phase": startup_timer.seconds_by_phase,
+    }
+
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
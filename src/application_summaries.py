@@ -0,0 +1,209 @@
+import numpy as np
+from bisect import bisect_left
+from collections import Counter
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Self, Sequence, Tuple
+from src.array_file import EncodedStrings, encode_strings, read_arrays, write_arrays
+
+
+class ApplicationSummary(BaseModel):
+    application_ref: str = Field(serialization_alias="applicationRef")
+    chain_id: int = Field(serialization_alias="chainId")
+    round_application_id: str = Field(serialization_alias="roundApplicationId")
+    round_id: str = Field(serialization_alias="roundId")
+    round_name: str = Field(serialization_alias="roundName")
+    project_id: str = Field(serialization_alias="projectId")
+    name: str = Field(serialization_alias="name")
+    website_url: str = Field(serialization_alias="websiteUrl")
+    logo_image_cid: str | None = Field(default=None, serialization_alias="logoImageCid")
+    banner_image_cid: str | None = Field(
+        default=None, serialization_alias="bannerImageCid"
+    )
+    summary_text: str = Field(serialization_alias="summaryText")
+    payout_wallet_address: str = Field(serialization_alias="payoutWalletAddress")
+    created_at_block: int = Field(serialization_alias="createdAtBlock")
+    contributor_count: int = Field(serialization_alias="contributorCount")
+    contributions_total_usd: float = Field(serialization_alias="contributionsTotalUsd")
+    anchor_address: str = Field(serialization_alias="anchorAddress")
+
+    @classmethod
+    def from_metadata(cls, metadata: Any) -> Self:
+        return cls(
+            application_ref=metadata.get("application_ref"),
+            round_id=metadata.get("round_id"),
+            round_name=metadata.get("round_name"),
+            round_application_id=metadata.get("round_application_id"),
+            chain_id=metadata.get("chain_id"),
+            project_id=metadata.get("project_id"),
+            name=metadata.get("name"),
+            website_url=metadata.get("website_url"),
+            logo_image_cid=metadata.get("logo_image_cid"),
+            banner_image_cid=metadata.get("banner_image_cid"),
+            summary_text=metadata.get("summary_text"),
+            payout_wallet_address=metadata.get("payout_wallet_address"),
+            created_at_block=metadata.get("created_at_block"),
+            contributor_count=metadata.get("contributor_count"),
+            contributions_total_usd=metadata.get("contributions_total_usd"),
+            anchor_address=metadata.get("anchor_address"),
+        )
+
+
+application_summaries_adapter = TypeAdapter(List[ApplicationSummary])
+
+
+def validate_application_summaries(
+    metadatas: Sequence[Mapping[str, Any]]
+) -> Tuple[List[ApplicationSummary | None], Dict[str, int]]:
+    """
+    Validate a batch of document metadata into application summaries in a
+    single pass. Returns the summaries, in order, with None in place of
+    invalid records, and how many records were invalid by reason, e.g.
+    `{"name: string_type": 2}`. Records are counted once, under their first
+    error.
+    """
+    try:
+        return list(application_summaries_adapter.validate_python(metadatas)), {}
+    except ValidationError as e:
+        reasons_by_position: Dict[int, str] = {}
+        for error in e.errors():
+            position, *field = error["loc"]
+            reasons_by_position.setdefault(
+                int(position),
+                f"{'.'.join(map(str, field))}: {error['type']}"
+                if len(field) > 0
+                else error["type"],
+            )
+
+    # Invalid records are rare, validating the rest again keeps the common
+    # case to a single pass
+    valid_positions = [
+        position
+        for position in range(len(metadatas))
+        if position not in reasons_by_position
+    ]
+    valid_summaries = application_summaries_adapter.validate_python(
+        [metadatas[position] for position in valid_positions]
+    )
+    summaries: List[ApplicationSummary | None] = [None] * len(metadatas)
+    for position, summary in zip(valid_positions, valid_summaries):
+        summaries[position] = summary
+
+    return summaries, dict(Counter(reasons_by_position.values()))
+
+
+# File layout version, see src.array_file
+MAGIC = b"APPSUMS\x01"
+
+STRING_FIELDS = [
+    "application_ref",
+    "round_application_id",
+    "round_id",
+    "round_name",
+    "project_id",
+    "name",
+    "website_url",
+    "logo_image_cid",
+    "banner_image_cid",
+    "summary_text",
+    "payout_wallet_address",
+    "anchor_address",
+]
+NUMERIC_FIELDS = {
+    "chain_id": np.int64,
+    "created_at_block": np.int64,
+    "contributor_count": np.int64,
+    "contributions_total_usd": np.float64,
+}
+
+# Code of a None string
+NO_STRING = -1
+
+
+class ApplicationSummaryStore(Mapping[str, ApplicationSummary]):
+    """
+    Application summaries by ref, stored by column rather than as objects.
+
+    Strings are interned in a single table, shared by all string fields,
+    and each string field is a column of codes into it. Numeric fields are
+    fixed-width columns. A persisted store is memory-mapped, and summaries
+    are only materialized when looked up.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+        self.strings = EncodedStrings(arrays["strings_offsets"], arrays["strings_blob"])
+        self.ref_codes = arrays["application_ref_codes"]
+        # Rows in ref order, to look refs up by bisection
+        self.rows_by_ref = arrays["rows_by_ref"]
+
+    @classmethod
+    def from_summaries(cls, summaries: Iterable[ApplicationSummary]) -> Self:
+        codes_by_string: Dict[str, int] = {}
+        string_columns: Dict[str, list] = {field: [] for field in STRING_FIELDS}
+        numeric_columns: Dict[str, list] = {field: [] for field in NUMERIC_FIELDS}
+
+        for summary in summaries:
+            for field in STRING_FIELDS:
+                value = getattr(summary, field)
+                string_columns[field].append(
+                    NO_STRING
+                    if value is None
+                    else codes_by_string.setdefault(value, len(codes_by_string))
+                )
+            for field in NUMERIC_FIELDS:
+                numeric_columns[field].append(getattr(summary, field))
+
+        strings = list(codes_by_string)
+        strings_offsets, strings_blob = encode_strings(strings)
+        arrays = {"strings_offsets": strings_offsets, "strings_blob": strings_blob}
+        for field in STRING_FIELDS:
+            arrays[f"{field}_codes"] = np.array(string_columns[field], dtype=np.int32)
+        for field, dtype in NUMERIC_FIELDS.items():
+            arrays[field] = np.array(numeric_columns[field], dtype=dtype)
+
+        ref_codes = string_columns["application_ref"]
+        arrays["rows_by_ref"] = np.array(
+            sorted(range(len(ref_codes)), key=lambda row: strings[ref_codes[row]]),
+            dtype=np.int32,
+        )
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, path: str) -> Self:
+        return cls(read_arrays(path, magic=MAGIC))
+
+    def save(self, path: str) -> None:
+        write_arrays(path, self.arrays, magic=MAGIC)
+
+    def __len__(self) -> int:
+        return len(self.ref_codes)
+
+    def __iter__(self) -> Iterator[str]:
+        for code in self.ref_codes:
+            yield self.strings[code]
+
+    def __contains__(self, ref: object) -> bool:
+        return isinstance(ref, str) and self._get_row(ref) is not None
+
+    def __getitem__(self, ref: str) -> ApplicationSummary:
+        row = self._get_row(ref)
+        if row is None:
+            raise KeyError(ref)
+
+        fields: Dict[str, Any] = {}
+        for field in STRING_FIELDS:
+            code = self.arrays[f"{field}_codes"][row]
+            fields[field] = None if code == NO_STRING else self.strings[code]
+        for field in NUMERIC_FIELDS:
+            fields[field] = self.arrays[field][row].item()
+        # Validated when the store was built
+        return ApplicationSummary.model_construct(**fields)
+
+    def _get_ref(self, row: int) -> str:
+        return self.strings[self.ref_codes[row]]
+
+    def _get_row(self, ref: str) -> int | None:
+        i = bisect_left(self.rows_by_ref, ref, key=self._get_ref)
+        if i < len(self.rows_by_ref) and self._get_ref(self.rows_by_ref[i]) == ref:
+            return int(self.rows_by_ref[i])
+        return None
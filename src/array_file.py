@@ -0,0 +1,100 @@
+import json
+import mmap
+import numpy as np
+from typing import Dict, Sequence, Tuple
+
+
+class EncodedStrings(Sequence[str]):
+    """
+    Read-only sequence of strings stored back to back as UTF-8 in `blob`,
+    the i-th spanning `offsets[i]:offsets[i + 1]`. Strings are decoded when
+    accessed.
+    """
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        return (
+            self.blob[self.offsets[i] : self.offsets[i + 1]].tobytes().decode("utf-8")
+        )
+
+
+def encode_strings(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+# File layout: magic, header length (uint64 LE), JSON header describing each
+# array's dtype, shape and offset, then the arrays, each aligned to
+# ARRAY_ALIGNMENT bytes. The magic identifies the kind of file and the
+# version of its contents.
+ARRAY_ALIGNMENT = 64
+
+
+def write_arrays(path: str, arrays: Dict[str, np.ndarray], magic: bytes) -> None:
+    descriptors = {}
+    offset = 0
+    for name, array in arrays.items():
+        descriptors[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset += _align(array.nbytes)
+
+    header = json.dumps({"arrays": descriptors}).encode("utf-8")
+    data_start = _align(len(magic) + 8 + len(header))
+
+    with open(path, "wb") as file:
+        file.write(magic)
+        file.write(len(header).to_bytes(8, "little"))
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(data_start + descriptors[name]["offset"])
+            file.write(np.ascontiguousarray(array).tobytes())
+        # Trailing padding (and empty arrays) must be within the file
+        file.truncate(data_start + offset)
+
+
+def read_arrays(path: str, magic: bytes) -> Dict[str, np.ndarray]:
+    """
+    Return read-only arrays backed by a memory map of the file.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(magic)) != magic:
+            raise Exception(f"Unexpected magic in {path}, expected {magic!r}")
+        header_length = int.from_bytes(file.read(8), "little")
+        header = json.loads(file.read(header_length))
+        data_start = _align(len(magic) + 8 + header_length)
+        # The mapping stays valid after the file is closed, and is released
+        # when the last array referencing it is
+        mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = {}
+    for name, descriptor in header["arrays"].items():
+        dtype = np.dtype(descriptor["dtype"])
+        shape = tuple(descriptor["shape"])
+        arrays[name] = np.frombuffer(
+            mapped_file,
+            dtype=dtype,
+            count=int(np.prod(shape)),
+            offset=data_start + descriptor["offset"],
+        ).reshape(shape)
+    return arrays
+
+
+def _align(size: int) -> int:
+    return -(-size // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
@@ -11,7 +11,37 @@ class Settings(BaseSettings):
     bind_address: str = "0.0.0.0"
     auto_reload: bool = False
     indexer_base_url: str = "https://indexer-production.fly.dev"
+    indexer_max_concurrent_requests: int = 8
+    indexer_request_timeout_seconds: float = 30
+    indexer_request_max_retries: int = 3
     cache_max_age_seconds: int = 60 * 10
+    # write the fetched applications to applications_aggregate.json in the
+    # storage dir on every ingest, for debugging
+    ingest_raw_dump: bool = False
+    fulltext_search_backend: Literal["lunr"] | Literal["bm25"] = "lunr"
+    semantic_search_backend: Literal["chroma"] | Literal["numpy"] = "chroma"
+    # only used by the numpy backend
+    semantic_search_embedding_dtype: Literal["float32"] | Literal["float16"] = "float32"
+    embedding_batch_size: int = 32
+    # processes used to embed documents while indexing
+    embedding_processes: int = 1
+    # processes rendering application descriptions into summary texts while
+    # ingesting
+    enrichment_processes: int = 1
+    # threads running search engine calls in each HTTP worker
+    search_max_concurrency: int = 4
+    # when set, a single embedding service process listening on this Unix
+    # socket embeds queries for all HTTP workers
+    embedding_service_socket: str | None = None
+    embedding_service_max_batch_size: int = 32
+    embedding_service_max_batch_wait_seconds: float = 0.002
+    search_result_cache_size: int = 1000
+    # ranked results of recent queries, from which their later pages are
+    # served
+    search_ranking_cache_size: int = 1000
+    search_ranking_cache_ttl_seconds: int = 60 * 5
+    query_embedding_cache_size: int = 10000
+    query_embedding_cache_ttl_seconds: int = 60 * 60 * 24
     deployment_environment: str
     log_level: (
         Literal["TRACE"]
@@ -1,128 +1,534 @@
 import time
+import contextlib
+import multiprocessing
 import shutil
 import os
-import pickle
+import hashlib
+import itertools
+import tempfile
 from os import path
 import requests
 import logging
 from pydantic import BaseModel, Field
-from typing import Dict, List, Any, Self
+from functools import partial
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Mapping,
+    Self,
+    Tuple,
+    cast,
+)
 from langchain.schema import Document
 from langchain.document_loaders import JSONLoader
-from strip_markdown import strip_markdown
+from src.application_summaries import (
+    ApplicationSummary,
+    ApplicationSummaryStore,
+    validate_application_summaries,
+)
 from src.search_fulltext import FullTextSearchEngine
-from src.search_semantic import SemanticSearchEngine
+from src.search_fulltext_bm25 import BM25FullTextSearchEngine
+from src.search_semantic import EMBEDDING_MODEL_NAME, SemanticSearchEngine
+from src.search_semantic_numpy import NumpySemanticSearchEngine
+from src.fetch import Fetcher, HttpCache
+from src.cache import LRUCache
+from src.embedding_cache import EmbeddingCache
+from src.embedding_service import EmbeddingClient
+from src.rendered_response import RenderedResponse
+from src.summary_text import SummaryTextCache, get_summary_text, get_summary_texts
+from src.timing import PhaseTimer
 import json
+from dataclasses import dataclass, field
 from src.util import (
     ApplicationFileLocator,
     InputDocument,
     InvalidInputDocumentException,
     get_applications_file_url_from_application_file_locator,
     get_rounds_file_url_from_chain_id,
+    iter_batches,
+    iter_json_array_items,
 )
 
-# TODO lift to configuration
-MAX_SUMMARY_TEXT_LENGTH = 300
+# Metadata added by JSONLoader that depends on the position of the record in
+# the source file rather than on its content. Only the deprecated
+# projects.json loader still uses JSONLoader.
+POSITIONAL_METADATA_KEYS = ["source", "seq_num"]
+
+
+def get_input_document_content_hash(input_document: InputDocument) -> str:
+    metadata = {
+        key: value
+        for key, value in input_document.document.metadata.items()
+        if key not in POSITIONAL_METADATA_KEYS
+    }
+    return hashlib.sha256(
+        json.dumps(
+            [input_document.document.page_content, metadata], sort_keys=True
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+@dataclass
+class FetchedRoundNames:
+    not_modified: bool
+    round_names_by_id: Dict[str, str]
+
+
+def fetch_round_names(
+    rounds_file_url: str,
+    round_ids: List[str],
+    fetcher: Fetcher,
+    http_cache: HttpCache | None = None,
+) -> FetchedRoundNames:
+    """
+    Stream the rounds file of a chain and index the names of the given rounds
+    by round id, without holding the whole file in memory. When an
+    `http_cache` is given, the index is persisted with it and reused for as
+    long as the rounds file is not modified.
+    """
+    cached_round_names_by_id = None
+    if http_cache is not None:
+        try:
+            cached_round_names_by_id = http_cache.load_json(rounds_file_url)
+        except FileNotFoundError:
+            pass
+
+    # The cached index only covers the rounds that were asked for when it
+    # was built, it cannot be revalidated for new ones
+    revalidate = cached_round_names_by_id is not None and all(
+        round_id in cached_round_names_by_id for round_id in round_ids
+    )
+
+    with fetcher.get(
+        rounds_file_url, http_cache=http_cache if revalidate else None, stream=True
+    ) as response:
+        if response.status_code == 304:
+            return FetchedRoundNames(
+                not_modified=True,
+                round_names_by_id=cast(Dict[str, str], cached_round_names_by_id),
+            )
+        elif response.status_code != 200:
+            raise Exception(f"Unexpected status {response.status_code}")
+
+        wanted_round_ids = set(round_ids)
+        round_names_by_id: Dict[str, str] = {}
+        for round in iter_json_array_items(response.iter_content(chunk_size=65536)):
+            if round["id"] in wanted_round_ids:
+                round_names_by_id[round["id"]] = round["metadata"]["name"]
+
+        if http_cache is not None:
+            http_cache.store_json(rounds_file_url, response, round_names_by_id)
+
+    return FetchedRoundNames(not_modified=False, round_names_by_id=round_names_by_id)
+
+
+@dataclass
+class FetchedApplicationsFile:
+    response: requests.Response
+    # The body of a 200 response, spooled to disk so that the bodies of all
+    # rounds are never held in memory together
+    body_file: IO[bytes] | None
+
+
+def iter_spooled_json_array_items(file: IO[bytes]) -> Iterator[Any]:
+    with file:
+        file.seek(0)
+        yield from iter_json_array_items(iter(lambda: file.read(65536), b""))
+
+
+@dataclass
+class FetchedApplications:
+    changed_rounds_count: int
+    # None when nothing changed and loading unchanged rounds was not requested.
+    # Can only be iterated once: unchanged rounds are streamed from the HTTP
+    # cache as they are consumed.
+    applications: Iterable[Any] | None
+    # Rounds whose applications or name could not be fetched, which are
+    # missing from `applications`
+    failed_locators: List[ApplicationFileLocator] = field(default_factory=list)
 
 
 def fetch_and_enrich_applications(
     applications_file_locators: List[ApplicationFileLocator],
     indexer_base_url: str,
-) -> List[Any]:
-    rounds_data_by_chain_id = {}
+    fetcher: Fetcher | None = None,
+    http_cache: HttpCache | None = None,
+    load_if_unchanged: bool = True,
+) -> FetchedApplications:
+    if fetcher is None:
+        fetcher = Fetcher()
 
-    def get_round_name(chain_id: int, round_id: str) -> str:
-        if not chain_id in rounds_data_by_chain_id:
-            rounds_file_url = get_rounds_file_url_from_chain_id(
-                chain_id, indexer_base_url
-            )
-            response = requests.get(rounds_file_url)
-            # TODO index by round id
-            rounds_data_by_chain_id[chain_id] = json.loads(response.content)
+    def fetch_applications_file(url: str) -> FetchedApplicationsFile | None:
+        body_file = None
+        try:
+            with fetcher.get(url, http_cache=http_cache, stream=True) as response:
+                if response.status_code not in (200, 304):
+                    logging.error("Error fetching %s: %d", url, response.status_code)
+                    return None
+                if response.status_code == 200:
+                    body_file = tempfile.TemporaryFile()
+                    for chunk in response.iter_content(chunk_size=65536):
+                        body_file.write(chunk)
+        except requests.RequestException as e:
+            logging.error("Error fetching %s: %s", url, e)
+            if body_file is not None:
+                body_file.close()
+            return None
+        return FetchedApplicationsFile(response=response, body_file=body_file)
 
-        rounds_data = rounds_data_by_chain_id[chain_id]
-        round = next(round for round in rounds_data if round["id"] == round_id)
-        return round["metadata"]["name"]
+    def iter_enriched_applications(
+        applications: Iterable[Any], chain_id: int, round_name: str
+    ) -> Iterator[Any]:
+        for application in applications:
+            application["chainId"] = chain_id
+            application["roundName"] = round_name
+            yield application
+
+    def fetch_chain_round_names(chain_id: int) -> FetchedRoundNames | None:
+        rounds_file_url = get_rounds_file_url_from_chain_id(chain_id, indexer_base_url)
+        try:
+            return fetch_round_names(
+                rounds_file_url,
+                [
+                    locator.round_id
+                    for locator in applications_file_locators
+                    if locator.chain_id == chain_id
+                ],
+                fetcher=fetcher,
+                http_cache=http_cache,
+            )
+        except Exception as e:
+            logging.error("Error fetching %s: %s", rounds_file_url, e)
+            return None
 
-    all_applications = []
-    for applications_file_locator in applications_file_locators:
-        applications_file_url = get_applications_file_url_from_application_file_locator(
+    chain_ids = list(
+        dict.fromkeys(locator.chain_id for locator in applications_file_locators)
+    )
+    applications_files_urls = [
+        get_applications_file_url_from_application_file_locator(
             applications_file_locator, indexer_base_url
         )
-        response = requests.get(applications_file_url)
-        if response.status_code == 200:
-            round_applications = json.loads(response.content)
+        for applications_file_locator in applications_file_locators
+    ]
+
+    # Rounds files and applications files are all fetched in one go, so that
+    # total time is close to that of the slowest request
+    start_time = time.perf_counter()
+    fetch_tasks: List[Callable[[], Any]] = [
+        partial(fetch_chain_round_names, chain_id) for chain_id in chain_ids
+    ] + [partial(fetch_applications_file, url) for url in applications_files_urls]
+    fetched = fetcher.map(lambda fetch_task: fetch_task(), fetch_tasks)
+    round_names_by_chain_id: Dict[int, FetchedRoundNames | None] = dict(
+        zip(chain_ids, fetched[: len(chain_ids)])
+    )
+    applications_files: List[FetchedApplicationsFile | None] = fetched[len(chain_ids) :]
+    logging.debug(
+        "fetched %d files in %.2f seconds",
+        len(fetched),
+        time.perf_counter() - start_time,
+    )
+
+    def get_round_name(chain_id: int, round_id: str) -> str:
+        round_names = round_names_by_chain_id[chain_id]
+        if round_names is None:
+            raise Exception(f"No rounds data for chain {chain_id}")
+        return round_names.round_names_by_id[round_id]
+
+    # A round whose applications file and rounds file were both not modified
+    # is known to be unchanged without looking at it
+    unchanged_locator_indices = set()
+    for locator_index, applications_file in enumerate(applications_files):
+        chain_id = applications_file_locators[locator_index].chain_id
+        round_names = round_names_by_chain_id[chain_id]
+        if (
+            applications_file is not None
+            and applications_file.response.status_code == 304
+            and round_names is not None
+            and round_names.not_modified
+        ):
+            unchanged_locator_indices.add(locator_index)
+
+    if len(unchanged_locator_indices) == len(applications_file_locators) and (
+        not load_if_unchanged
+    ):
+        return FetchedApplications(changed_rounds_count=0, applications=None)
+
+    changed_rounds_count = 0
+    failed_locators: List[ApplicationFileLocator] = []
+    # Per round, so that each round is only read and parsed as it is
+    # consumed
+    rounds_applications: List[Iterable[Any]] = []
+    for locator_index, applications_file_locator in enumerate(
+        applications_file_locators
+    ):
+        applications_file_url = applications_files_urls[locator_index]
+        applications_file = applications_files[locator_index]
+        if applications_file is None:
+            failed_locators.append(applications_file_locator)
+            continue
+
+        if locator_index in unchanged_locator_indices:
+            rounds_applications.append(
+                cast(HttpCache, http_cache).iter_json_array_items(applications_file_url)
+            )
+            continue
+
+        try:
             round_name = get_round_name(
                 applications_file_locator.chain_id, applications_file_locator.round_id
             )
-            for application in round_applications:
-                application["chainId"] = applications_file_locator.chain_id
-                application["roundName"] = round_name
-            all_applications += round_applications
-        else:
+        except Exception as e:
             logging.error(
-                "Error fetching %s: %d", applications_file_url, response.status_code
+                "Error getting name of round %s: %s", applications_file_locator, e
             )
-    return all_applications
+            failed_locators.append(applications_file_locator)
+            if applications_file.body_file is not None:
+                applications_file.body_file.close()
+            continue
 
+        if applications_file.body_file is not None:
+            round_applications = iter_spooled_json_array_items(
+                applications_file.body_file
+            )
+        else:
+            # Applications cached by a previous run are already enriched,
+            # they only need to be enriched again if their round was renamed
+            round_applications = cast(HttpCache, http_cache).iter_json_array_items(
+                applications_file_url
+            )
+            if all(
+                application["roundName"] == round_name
+                for application in cast(HttpCache, http_cache).iter_json_array_items(
+                    applications_file_url
+                )
+            ):
+                rounds_applications.append(round_applications)
+                continue
 
-def load_input_documents_from_file(
-    applications_file_path: str, approved_applications_only: bool = True
-) -> List[InputDocument]:
-    def get_application_json_document_metadata(record: dict, metadata: dict) -> dict:
-        metadata["project_id"] = record.get("project_id")
-        metadata["name"] = record.get("name")
-        metadata["website_url"] = record.get("website_url")
-        metadata["chain_id"] = record.get("chain_id")
-        metadata["round_id"] = record.get("round_id")
-        metadata["round_name"] = record.get("round_name")
-        metadata["round_application_id"] = record.get("round_application_id")
-        metadata["payout_wallet_address"] = record.get("payout_wallet_address")
-        metadata["created_at_block"] = record.get("created_at_block")
-        metadata["contributor_count"] = record.get("contributor_count")
-        metadata["contributions_total_usd"] = record.get("contributions_total_usd")
-        metadata["anchor_address"] = record.get("anchor_address")
+        changed_rounds_count += 1
+        round_applications = iter_enriched_applications(
+            round_applications, applications_file_locator.chain_id, round_name
+        )
+        if http_cache is not None:
+            round_applications = http_cache.iter_storing_json_array(
+                applications_file_url, applications_file.response, round_applications
+            )
+        rounds_applications.append(round_applications)
 
-        banner_image_cid = record.get("banner_image_cid")
-        if banner_image_cid is not None:
-            metadata["banner_image_cid"] = banner_image_cid
-        logo_image_cid = record.get("logo_image_cid")
-        if logo_image_cid is not None:
-            metadata["logo_image_cid"] = logo_image_cid
-        return metadata
+    logging.info(
+        "%d of %d rounds changed, %d could not be fetched",
+        changed_rounds_count,
+        len(applications_file_locators),
+        len(failed_locators),
+    )
 
-    jq_schema = ".[]"
-    if approved_applications_only:
-        jq_schema += ' | select(.status == "APPROVED")'
-    jq_schema += " | { chain_id: .chainId, round_id: .roundId, round_name: .roundName, round_application_id: .id, project_id: .projectId, name: .metadata.application.project.title, payout_wallet_address: .metadata.application.recipient, website_url: .metadata.application.project.website, description: .metadata.application.project.description, banner_image_cid: .metadata.application.project.bannerImg, logo_image_cid: .metadata.application.project.logoImg, created_at_block: .createdAtBlock, contributions_total_usd: .amountUSD, contributor_count: .uniqueContributors, anchor_address: .anchorAddress}"
+    return FetchedApplications(
+        changed_rounds_count=changed_rounds_count,
+        applications=itertools.chain.from_iterable(rounds_applications),
+        failed_locators=failed_locators,
+    )
 
-    loader = JSONLoader(
-        applications_file_path,
-        jq_schema=jq_schema,
-        content_key="description",
-        metadata_func=get_application_json_document_metadata,
-        text_content=False,
+
+def get_round_key(chain_id: int | str, round_id: str) -> Tuple[str, str]:
+    # Round ids are addresses, which the indexer and configuration may not
+    # spell with the same case
+    return (str(chain_id), round_id.lower())
+
+
+def get_application_ref_round_key(application_ref: str) -> Tuple[str, str]:
+    chain_id, round_id, _ = application_ref.split(":", 2)
+    return get_round_key(chain_id, round_id)
+
+
+def get_nested(record: Any, *keys: str) -> Any:
+    """
+    Value at the given path, or None if any part of it is missing.
+    """
+    for key in keys:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def get_application_document(application: dict) -> Document:
+    description = get_nested(
+        application, "metadata", "application", "project", "description"
     )
+    metadata = {
+        "project_id": application.get("projectId"),
+        "name": get_nested(application, "metadata", "application", "project", "title"),
+        "website_url": get_nested(
+            application, "metadata", "application", "project", "website"
+        ),
+        "chain_id": application.get("chainId"),
+        "round_id": application.get("roundId"),
+        "round_name": application.get("roundName"),
+        "round_application_id": application.get("id"),
+        "payout_wallet_address": get_nested(
+            application, "metadata", "application", "recipient"
+        ),
+        "created_at_block": application.get("createdAtBlock"),
+        "contributor_count": application.get("uniqueContributors"),
+        "contributions_total_usd": application.get("amountUSD"),
+        "anchor_address": application.get("anchorAddress"),
+    }
 
-    documents: List[InputDocument] = []
-    for raw_document in loader.load():
-        try:
-            enrich_raw_document_with_computed_metadata(raw_document)
-            documents.append(InputDocument(raw_document))
-        except InvalidInputDocumentException:
-            pass
+    banner_image_cid = get_nested(
+        application, "metadata", "application", "project", "bannerImg"
+    )
+    if banner_image_cid is not None:
+        metadata["banner_image_cid"] = banner_image_cid
+    logo_image_cid = get_nested(
+        application, "metadata", "application", "project", "logoImg"
+    )
+    if logo_image_cid is not None:
+        metadata["logo_image_cid"] = logo_image_cid
+
+    # Same coercion of the description as langchain's JSONLoader
+    if isinstance(description, str):
+        page_content = description
+    elif isinstance(description, dict):
+        page_content = json.dumps(description) if description else ""
+    else:
+        page_content = str(description) if description is not None else ""
+
+    return Document(page_content=page_content, metadata=metadata)
 
-    return documents
 
+# Applications whose summaries are rendered together
+ENRICHMENT_BATCH_SIZE = 512
+
+
+def iter_input_documents(
+    applications: Iterable[Any],
+    approved_applications_only: bool = True,
+    summary_text_cache: SummaryTextCache | None = None,
+    processes: int = 1,
+) -> Iterator[InputDocument]:
+    """
+    Turn raw applications, as served by the indexer and enriched with their
+    chain id and round name, into input documents, one batch at a time.
+    Each batch is validated at once into the application summaries the
+    documents carry. Invalid applications are skipped and reported by reason.
+
+    Rendering descriptions into summary texts is the costliest step, it is
+    spread across `processes` processes and skipped for descriptions found
+    in `summary_text_cache`.
+    """
+    raw_documents = (
+        get_application_document(application)
+        for application in applications
+        if not approved_applications_only or application.get("status") == "APPROVED"
+    )
+
+    documents_count = 0
+    summarizing_seconds = 0.0
+    validating_seconds = 0.0
+    invalid_counts_by_reason: Counter[str] = Counter()
+    with (
+        # Forked, as spawned workers would import this module and its
+        # dependencies again. They only render text and hold no locks.
+        ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("fork")
+        )
+        if processes > 1
+        else contextlib.nullcontext()
+    ) as executor:
+        for batch in iter_batches(raw_documents, ENRICHMENT_BATCH_SIZE):
+            start_time = time.perf_counter()
+            summary_texts = get_summary_texts(
+                [raw_document.page_content for raw_document in batch],
+                cache=summary_text_cache,
+                executor=executor,
+            )
+            summarizing_seconds += time.perf_counter() - start_time
+            documents_count += len(batch)
+
+            for raw_document, summary_text in zip(batch, summary_texts):
+                enrich_raw_document_with_computed_metadata(raw_document, summary_text)
+
+            start_time = time.perf_counter()
+            (
+                application_summaries,
+                batch_invalid_counts_by_reason,
+            ) = validate_application_summaries(
+                [raw_document.metadata for raw_document in batch]
+            )
+            validating_seconds += time.perf_counter() - start_time
+            invalid_counts_by_reason.update(batch_invalid_counts_by_reason)
+
+            for raw_document, application_summary in zip(batch, application_summaries):
+                if application_summary is not None:
+                    yield InputDocument(raw_document, application_summary)
+
+    logging.info(
+        "summarized %d documents in %.2f seconds (%.1f docs/sec) with %d process(es)",
+        documents_count,
+        summarizing_seconds,
+        documents_count / summarizing_seconds if summarizing_seconds > 0 else 0,
+        processes,
+    )
+    logging.info(
+        "validated %d documents in %.2f seconds (%.1f docs/sec)",
+        documents_count,
+        validating_seconds,
+        documents_count / validating_seconds if validating_seconds > 0 else 0,
+    )
+    if len(invalid_counts_by_reason) > 0:
+        logging.warning(
+            "skipped %d invalid applications, by reason: %s",
+            invalid_counts_by_reason.total(),
+            dict(invalid_counts_by_reason),
+        )
 
-def enrich_raw_document_with_computed_metadata(document: Document) -> None:
+
+def iter_json_array_file_items(filename: str) -> Iterator[Any]:
+    with open(filename, "rb") as file:
+        yield from iter_json_array_items(iter(lambda: file.read(65536), b""))
+
+
+def iter_dumping_json_array(items: Iterable[Any], filename: str) -> Iterator[Any]:
+    """
+    Pass items through, writing them to a JSON array file as they go.
+    """
+    with open(filename, "w") as file:
+        file.write("[")
+        for i, item in enumerate(items):
+            if i > 0:
+                file.write(",\n")
+            json.dump(item, file)
+            yield item
+        file.write("]\n")
+
+
+def load_input_documents_from_file(
+    applications_file_path: str, approved_applications_only: bool = True
+) -> List[InputDocument]:
+    return list(
+        iter_input_documents(
+            iter_json_array_file_items(applications_file_path),
+            approved_applications_only=approved_applications_only,
+        )
+    )
+
+
+def enrich_raw_document_with_computed_metadata(
+    document: Document, summary_text: str | None = None
+) -> None:
     chain_id = document.metadata["chain_id"]
     round_id = document.metadata["round_id"]
     round_application_id = document.metadata["round_application_id"]
-    description_plain = strip_markdown(document.page_content)
-    summary_text = description_plain[:MAX_SUMMARY_TEXT_LENGTH]
-    if len(description_plain) > MAX_SUMMARY_TEXT_LENGTH:
-        summary_text = summary_text + "..."
+    if summary_text is None:
+        summary_text = get_summary_text(document.page_content)
     document.metadata[
         "application_ref"
     ] = f"{chain_id}:{round_id}:{round_application_id}"
@@ -133,7 +539,7 @@ def enrich_raw_document_with_computed_metadata(document: Document) -> None:
 # Use a projects.json to generate input documents from. Fills in missing
 # fields with dummy values. Legacy.
 def deprecated_load_input_documents_from_projects_json(
-    projects_json_path: str,
+    projects_json_path: str, processes: int = 1
 ) -> List[InputDocument]:
     fake_application_counter = 0
 
@@ -169,13 +575,24 @@ def deprecated_load_input_documents_from_projects_json(
         text_content=False,
     )
 
+    raw_documents = loader.load()
+    with (
+        # Forked, as spawned workers would import this module and its
+        # dependencies again. They only render text and hold no locks.
+        ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("fork")
+        )
+        if processes > 1
+        else contextlib.nullcontext()
+    ) as executor:
+        summary_texts = get_summary_texts(
+            [raw_document.page_content for raw_document in raw_documents],
+            executor=executor,
+        )
+
     input_documents: List[InputDocument] = []
-    for raw_document in loader.load():
+    for raw_document, summary_text in zip(raw_documents, summary_texts):
         try:
-            description_plain = strip_markdown(raw_document.page_content)
-            summary_text = description_plain[:MAX_SUMMARY_TEXT_LENGTH]
-            if len(description_plain) > MAX_SUMMARY_TEXT_LENGTH:
-                summary_text = summary_text + "..."
             raw_document.metadata["summary_text"] = summary_text
             input_documents.append(InputDocument(raw_document))
         except InvalidInputDocumentException:
@@ -184,90 +601,400 @@ def deprecated_load_input_documents_from_projects_json(
     return input_documents
 
 
-class ApplicationSummary(BaseModel):
-    application_ref: str = Field(serialization_alias="applicationRef")
-    chain_id: int = Field(serialization_alias="chainId")
-    round_application_id: str = Field(serialization_alias="roundApplicationId")
-    round_id: str = Field(serialization_alias="roundId")
-    round_name: str = Field(serialization_alias="roundName")
-    project_id: str = Field(serialization_alias="projectId")
-    name: str = Field(serialization_alias="name")
-    website_url: str = Field(serialization_alias="websiteUrl")
-    logo_image_cid: str | None = Field(serialization_alias="logoImageCid")
-    banner_image_cid: str | None = Field(serialization_alias="bannerImageCid")
-    summary_text: str = Field(serialization_alias="summaryText")
-    payout_wallet_address: str = Field(serialization_alias="payoutWalletAddress")
-    created_at_block: int = Field(serialization_alias="createdAtBlock")
-    contributor_count: int = Field(serialization_alias="contributorCount")
-    contributions_total_usd: float = Field(serialization_alias="contributionsTotalUsd")
-    anchor_address: str = Field(serialization_alias="anchorAddress")
+class ApplicationsResponse(BaseModel):
+    application_summaries: List[ApplicationSummary] = Field(
+        serialization_alias="applicationSummaries"
+    )
+
+
+# Number of generations kept on disk. Older ones may still be in use by
+# workers that have not reloaded yet, so the previous one is never removed
+# right away.
+KEPT_GENERATIONS_COUNT = 3
+
+
+# Bumped whenever the contents or layout of a generation change, so that
+# generations persisted by an older version are rebuilt rather than reused
+GENERATION_SCHEMA_VERSION = 2
+
+
+class GenerationManifest(BaseModel):
+    """
+    Describes what a generation was built with and from. A generation is
+    only reused, at boot or as the base of an incremental ingest, when it
+    was built with the same schema, model and engines.
+    """
+
+    schema_version: int
+    embedding_model_name: str
+    semantic_search_engine: str
+    fulltext_search_engine: str
+    # Hash of the configured rounds and indexer, None when ingesting a file
+    sources_hash: str | None
+    # Hash of the content of the applications the generation was built from
+    source_dataset_hash: str
+    application_count: int
+
+    def is_compatible(
+        self,
+        semantic_search_engine: SemanticSearchEngine,
+        fulltext_search_engine: FullTextSearchEngine,
+    ) -> bool:
+        return (
+            self.schema_version == GENERATION_SCHEMA_VERSION
+            and self.embedding_model_name == EMBEDDING_MODEL_NAME
+            and self.semantic_search_engine == type(semantic_search_engine).__name__
+            and self.fulltext_search_engine == type(fulltext_search_engine).__name__
+        )
+
+
+def get_sources_hash(
+    application_files_locators: List[ApplicationFileLocator], indexer_base_url: str
+) -> str:
+    return hashlib.sha256(
+        json.dumps(
+            [
+                indexer_base_url,
+                [
+                    [locator.chain_id, locator.round_id]
+                    for locator in application_files_locators
+                ],
+            ]
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def get_raw_dump_filename(storage_dir: str) -> str:
+    return path.join(storage_dir, "applications_aggregate.json")
+
+
+def get_generations_dirname(storage_dir: str) -> str:
+    return path.join(storage_dir, "generations")
+
+
+def get_embedding_cache_dirname(storage_dir: str) -> str:
+    return path.join(storage_dir, "embedding_cache")
+
+
+def get_summary_text_cache_filename(storage_dir: str) -> str:
+    return path.join(storage_dir, "summary_text_cache.json")
+
+
+def get_current_generation_filename(storage_dir: str) -> str:
+    return path.join(storage_dir, "current_generation")
+
+
+def read_current_generation_id(storage_dir: str) -> str | None:
+    current_generation_filename = get_current_generation_filename(storage_dir)
+    if not os.path.exists(current_generation_filename):
+        return None
+    with open(current_generation_filename) as file:
+        return file.read().strip()
+
+
+def write_current_generation_id(storage_dir: str, generation_id: str) -> None:
+    current_generation_filename = get_current_generation_filename(storage_dir)
+    with open(current_generation_filename + ".tmp", "w") as file:
+        file.write(generation_id)
+    os.replace(current_generation_filename + ".tmp", current_generation_filename)
+
+
+def read_generation_manifest(
+    storage_dir: str, generation_id: str
+) -> GenerationManifest | None:
+    manifest_filename = path.join(
+        get_generations_dirname(storage_dir), generation_id, "manifest.json"
+    )
+    try:
+        with open(manifest_filename) as file:
+            return GenerationManifest.model_validate_json(file.read())
+    except (OSError, ValueError) as e:
+        logging.info("no valid manifest for generation %s: %s", generation_id, e)
+        return None
+
+
+def read_reusable_generation_id(
+    storage_dir: str,
+    sources_hash: str,
+    semantic_search_engine_factory: Callable[[], SemanticSearchEngine],
+    fulltext_search_engine_factory: Callable[[], FullTextSearchEngine],
+) -> str | None:
+    """
+    The current generation, if it can be served as is after a restart: it
+    was built with the same schema, model and engines, from the same rounds,
+    it has applications, and it loads.
+    """
+    generation_id = read_current_generation_id(storage_dir)
+    if generation_id is None:
+        return None
+
+    manifest = read_generation_manifest(storage_dir, generation_id)
+    if manifest is None:
+        return None
+    if not manifest.is_compatible(
+        semantic_search_engine_factory(), fulltext_search_engine_factory()
+    ):
+        logging.info("generation %s was built with another setup", generation_id)
+        return None
+    if manifest.sources_hash != sources_hash:
+        logging.info("generation %s was built from other rounds", generation_id)
+        return None
+    if manifest.application_count == 0:
+        logging.warning("generation %s has no applications", generation_id)
+        return None
+
+    try:
+        generation = DataGeneration.load(
+            storage_dir,
+            generation_id,
+            semantic_search_engine_factory,
+            fulltext_search_engine_factory,
+        )
+    except Exception as e:
+        logging.warning("generation %s could not be loaded: %s", generation_id, e)
+        return None
+    if len(generation.application_summaries_by_ref) != manifest.application_count:
+        logging.warning(
+            "generation %s has %d applications, its manifest %d",
+            generation_id,
+            len(generation.application_summaries_by_ref),
+            manifest.application_count,
+        )
+        return None
+
+    return generation_id
+
+
+def prune_generations(storage_dir: str) -> None:
+    generations_dirname = get_generations_dirname(storage_dir)
+    current_generation_id = read_current_generation_id(storage_dir)
+    # Anything else in the directory, such as a file dropped by a tool, is
+    # not a generation and is left alone
+    generation_ids = sorted(
+        (name for name in os.listdir(generations_dirname) if name.isdigit()), key=int
+    )
+
+    # Left behind by a build that did not complete, never served
+    incomplete_generation_ids = [
+        generation_id
+        for generation_id in generation_ids
+        if generation_id != current_generation_id
+        and not path.exists(
+            path.join(generations_dirname, generation_id, "manifest.json")
+        )
+    ]
+    for generation_id in incomplete_generation_ids:
+        logging.debug("removing incomplete generation %s", generation_id)
+        shutil.rmtree(path.join(generations_dirname, generation_id))
+
+    generation_ids = [
+        generation_id
+        for generation_id in generation_ids
+        if generation_id not in incomplete_generation_ids
+    ]
+    for generation_id in generation_ids[:-KEPT_GENERATIONS_COUNT]:
+        logging.debug("removing generation %s", generation_id)
+        shutil.rmtree(path.join(generations_dirname, generation_id))
+
+
+def validate_generation_files(
+    generation_dirname: str,
+    semantic_search_engine: SemanticSearchEngine,
+    fulltext_search_engine: FullTextSearchEngine,
+) -> None:
+    """
+    Make sure every file a worker loads a generation from was persisted,
+    before the generation can be switched to.
+    """
+    expected_filenames = [
+        path.join(generation_dirname, "applications.bin"),
+        path.join(generation_dirname, "content_hashes.json"),
+        path.join(generation_dirname, fulltext_search_engine.index_filename),
+    ] + [
+        path.join(generation_dirname, "semantic_index", filename)
+        for filename in semantic_search_engine.persisted_filenames
+    ]
+    missing_filenames = [
+        filename for filename in expected_filenames if not path.exists(filename)
+    ]
+    if len(missing_filenames) > 0:
+        raise Exception(
+            f"Generation {generation_dirname} is missing {', '.join(missing_filenames)}"
+        )
+
+
+def get_semantic_search_engine_factory(
+    backend: Literal["chroma", "numpy"] = "chroma",
+    embedding_dtype: Literal["float32", "float16"] = "float32",
+    embedding_batch_size: int = 32,
+    embedding_processes: int = 1,
+    query_embedding_cache: LRUCache[str, List[float]] | None = None,
+    document_embedding_cache: EmbeddingCache | None = None,
+    embedding_client: EmbeddingClient | None = None,
+) -> Callable[[], SemanticSearchEngine]:
+    if backend == "chroma":
+        return partial(
+            SemanticSearchEngine,
+            query_embedding_cache=query_embedding_cache,
+            embedding_batch_size=embedding_batch_size,
+            embedding_processes=embedding_processes,
+            document_embedding_cache=document_embedding_cache,
+            embedding_client=embedding_client,
+        )
+    elif backend == "numpy":
+        return partial(
+            NumpySemanticSearchEngine,
+            query_embedding_cache=query_embedding_cache,
+            embedding_batch_size=embedding_batch_size,
+            embedding_processes=embedding_processes,
+            document_embedding_cache=document_embedding_cache,
+            embedding_client=embedding_client,
+            dtype=embedding_dtype,
+        )
+    else:
+        raise Exception(f"Unknown semantic search backend: {backend}")
+
+
+def get_fulltext_search_engine_factory(
+    backend: Literal["lunr", "bm25"] = "lunr",
+) -> Callable[[], FullTextSearchEngine]:
+    if backend == "lunr":
+        return FullTextSearchEngine
+    elif backend == "bm25":
+        return BM25FullTextSearchEngine
+    else:
+        raise Exception(f"Unknown fulltext search backend: {backend}")
+
+
+@dataclass
+class DataGeneration:
+    """
+    Application summaries and the indices built from them. A generation is
+    never modified after it has been persisted, so summaries and indices
+    are always in sync.
+    """
+
+    id: str
+    application_summaries_by_ref: Mapping[str, ApplicationSummary]
+    # The /applications response, rendered at ingest
+    applications_response: RenderedResponse
+    fulltext_search_engine: FullTextSearchEngine
+    semantic_search_engine: SemanticSearchEngine
+    # How long loading each part took, reported as part of worker startup
+    load_seconds_by_phase: Dict[str, float] = field(default_factory=dict)
 
     @classmethod
-    def from_metadata(cls, metadata: Any) -> Self:
+    def load(
+        cls,
+        storage_dir: str,
+        generation_id: str,
+        semantic_search_engine_factory: Callable[
+            [], SemanticSearchEngine
+        ] = SemanticSearchEngine,
+        fulltext_search_engine_factory: Callable[
+            [], FullTextSearchEngine
+        ] = FullTextSearchEngine,
+    ) -> Self:
+        generation_dirname = path.join(
+            get_generations_dirname(storage_dir), generation_id
+        )
+        timer = PhaseTimer()
+
+        with timer.phase("application_summaries"):
+            application_summaries_by_ref = ApplicationSummaryStore.load(
+                path.join(generation_dirname, "applications.bin")
+            )
+
+        with timer.phase("applications_response"):
+            applications_response = RenderedResponse.load(
+                path.join(generation_dirname, "applications_response")
+            )
+
+        with timer.phase("fulltext_index"):
+            fulltext_search_engine = fulltext_search_engine_factory()
+            fulltext_search_engine.load_index(
+                path.join(generation_dirname, fulltext_search_engine.index_filename)
+            )
+
+        with timer.phase("semantic_index"):
+            semantic_search_engine = semantic_search_engine_factory()
+            semantic_search_engine.load(path.join(generation_dirname, "semantic_index"))
+
         return cls(
-            application_ref=metadata.get("application_ref"),
-            round_id=metadata.get("round_id"),
-            round_name=metadata.get("round_name"),
-            round_application_id=metadata.get("round_application_id"),
-            chain_id=metadata.get("chain_id"),
-            project_id=metadata.get("project_id"),
-            name=metadata.get("name"),
-            website_url=metadata.get("website_url"),
-            logo_image_cid=metadata.get("logo_image_cid"),
-            banner_image_cid=metadata.get("banner_image_cid"),
-            summary_text=metadata.get("summary_text"),
-            payout_wallet_address=metadata.get("payout_wallet_address"),
-            created_at_block=metadata.get("created_at_block"),
-            contributor_count=metadata.get("contributor_count"),
-            contributions_total_usd=metadata.get("contributions_total_usd"),
-            anchor_address=metadata.get("anchor_address"),
+            id=generation_id,
+            application_summaries_by_ref=application_summaries_by_ref,
+            applications_response=applications_response,
+            fulltext_search_engine=fulltext_search_engine,
+            semantic_search_engine=semantic_search_engine,
+            load_seconds_by_phase=timer.seconds_by_phase,
         )
 
 
 class Data:
     """
     Convenience aggregation of all the data the service is meant to use during operation.
+
+    Request handlers should read `generation` once and use that reference
+    throughout, so that they are not affected by a concurrent `reload`.
     """
 
-    # TODO add properties that return applications and search engines
-    # but raise if they have not been initialized (i.e. if `reload` has not)
-    # been called after instantiation
+    # TODO add a property that returns the generation but raises if it has
+    # not been initialized (i.e. if `reload` has not been called after
+    # instantiation)
 
-    application_summaries_by_ref: Dict[str, ApplicationSummary]
-    fulltext_search_engine: FullTextSearchEngine
-    semantic_search_engine: SemanticSearchEngine
+    generation: DataGeneration
 
-    def __init__(self, storage_dir: str):
+    def __init__(
+        self,
+        storage_dir: str,
+        semantic_search_engine_factory: Callable[
+            [], SemanticSearchEngine
+        ] = SemanticSearchEngine,
+        fulltext_search_engine_factory: Callable[
+            [], FullTextSearchEngine
+        ] = FullTextSearchEngine,
+    ):
         self.storage_dir = storage_dir
+        self.semantic_search_engine_factory = semantic_search_engine_factory
+        self.fulltext_search_engine_factory = fulltext_search_engine_factory
 
     # TODO test
     def reload(self):
-        # Only application data is reloaded because indices are
-        # currently only built once on service startup.
+        generation_id = read_current_generation_id(self.storage_dir)
+        if generation_id is None:
+            raise Exception(f"No data generation found in {self.storage_dir}")
 
-        with open(path.join(self.storage_dir, "applications.pkl"), "rb") as file:
-            applications = pickle.load(file)
-            if not hasattr(self, "application_summaries_by_ref"):
-                self.application_summaries_by_ref = applications
-            else:
-                if len(applications) == 0:
-                    logging.warn(
-                        "Anomaly detected: freshly reloaded applications is zero. Not replacing data set.",
-                        len(self.application_summaries_by_ref),
-                        len(applications),
-                    )
-                else:
-                    self.application_summaries_by_ref = applications
+        if hasattr(self, "generation") and self.generation.id == generation_id:
+            return
 
-        if not hasattr(self, "fulltext_search_engine"):
-            self.fulltext_search_engine = FullTextSearchEngine()
-            self.fulltext_search_engine.load_index(
-                path.join(self.storage_dir, "fulltext_search_index.json")
+        start_time = time.perf_counter()
+        generation = DataGeneration.load(
+            self.storage_dir,
+            generation_id,
+            semantic_search_engine_factory=self.semantic_search_engine_factory,
+            fulltext_search_engine_factory=self.fulltext_search_engine_factory,
+        )
+
+        if (
+            hasattr(self, "generation")
+            and len(generation.application_summaries_by_ref) == 0
+        ):
+            logging.warn(
+                "Anomaly detected: freshly reloaded applications is zero. Not replacing data set of %d applications.",
+                len(self.generation.application_summaries_by_ref),
             )
+            return
 
-        if not hasattr(self, "semantic_search_engine"):
-            self.semantic_search_engine = SemanticSearchEngine()
-            self.semantic_search_engine.load(path.join(self.storage_dir, "chromadb"))
+        # Single reference assignment: requests in flight keep using the
+        # generation they started with
+        self.generation = generation
+
+        logging.info(
+            "loaded data generation %s with %d applications in %.2f seconds",
+            generation_id,
+            len(generation.application_summaries_by_ref),
+            time.perf_counter() - start_time,
+        )
 
     @classmethod
     # TODO test
@@ -277,64 +1004,379 @@ class Data:
         storage_dir: str,
         indexer_base_url: str,
         first_run: bool,
+        fetcher: Fetcher | None = None,
+        http_cache: HttpCache | None = None,
+        semantic_search_engine_factory: Callable[
+            [], SemanticSearchEngine
+        ] = SemanticSearchEngine,
+        fulltext_search_engine_factory: Callable[
+            [], FullTextSearchEngine
+        ] = FullTextSearchEngine,
+        raw_dump_filename: str | None = None,
+        summary_text_cache: SummaryTextCache | None = None,
+        enrichment_processes: int = 1,
     ) -> None:
+        """
+        Fetch the given rounds and ingest their applications. When
+        `raw_dump_filename` is given, the fetched applications are also
+        written there as a JSON array, for debugging.
+        """
         if first_run and os.path.exists(storage_dir):
             logging.info(f"Clearing {storage_dir}...")
-            shutil.rmtree(storage_dir)
+            # Embeddings and summary texts only depend on the text they are
+            # computed from, so they survive restarts
+            for entry in os.scandir(storage_dir):
+                if entry.path in (
+                    get_embedding_cache_dirname(storage_dir),
+                    get_summary_text_cache_filename(storage_dir),
+                ):
+                    continue
+                elif entry.is_dir():
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+            if http_cache is not None:
+                http_cache.clear()
 
         os.makedirs(storage_dir, exist_ok=True)
 
-        source_dataset_filename = path.join(storage_dir, "applications_aggregate.json")
-
-        with open(source_dataset_filename, "w") as f:
-            aggregated_applications = fetch_and_enrich_applications(
+        try:
+            fetched_applications = fetch_and_enrich_applications(
                 application_files_locators,
                 indexer_base_url,
+                fetcher=fetcher,
+                http_cache=http_cache,
+                load_if_unchanged=first_run,
             )
-            aggregated_applications[0]["projectId"] = str(int(time.time()))
-            json.dump(aggregated_applications, f, indent=2)
 
-        cls.ingest_from_file_and_persist(
-            source_dataset_filename=source_dataset_filename,
+            if fetched_applications.applications is None:
+                logging.info("No rounds changed, skipping ingest")
+                return
+
+            applications = fetched_applications.applications
+            if raw_dump_filename is not None:
+                applications = iter_dumping_json_array(applications, raw_dump_filename)
+
+            # Applications flow from the fetched rounds to the index builders
+            # one at a time, only their input documents are held together
+            ingested = cls.ingest_and_persist(
+                input_documents=iter_input_documents(
+                    applications,
+                    approved_applications_only=True,
+                    summary_text_cache=summary_text_cache,
+                    processes=enrichment_processes,
+                ),
+                storage_dir=storage_dir,
+                first_run=first_run,
+                semantic_search_engine_factory=semantic_search_engine_factory,
+                fulltext_search_engine_factory=fulltext_search_engine_factory,
+                sources_hash=get_sources_hash(
+                    application_files_locators, indexer_base_url
+                ),
+                unfetched_locators=fetched_applications.failed_locators,
+            )
+
+            # Validators are only persisted once the data they vouch for has
+            # made it into a generation, otherwise the next run fetches it
+            # again
+            if ingested and http_cache is not None:
+                http_cache.save()
+        finally:
+            if http_cache is not None:
+                http_cache.discard()
+
+        if summary_text_cache is not None:
+            summary_text_cache.save()
+
+    @classmethod
+    def ingest_from_file_and_persist(
+        cls,
+        source_dataset_filename: str,
+        storage_dir: str,
+        first_run: bool,
+        semantic_search_engine_factory: Callable[
+            [], SemanticSearchEngine
+        ] = SemanticSearchEngine,
+        fulltext_search_engine_factory: Callable[
+            [], FullTextSearchEngine
+        ] = FullTextSearchEngine,
+        sources_hash: str | None = None,
+        summary_text_cache: SummaryTextCache | None = None,
+        enrichment_processes: int = 1,
+    ) -> None:
+        cls.ingest_and_persist(
+            input_documents=iter_input_documents(
+                iter_json_array_file_items(source_dataset_filename),
+                approved_applications_only=True,
+                summary_text_cache=summary_text_cache,
+                processes=enrichment_processes,
+            ),
             storage_dir=storage_dir,
             first_run=first_run,
+            semantic_search_engine_factory=semantic_search_engine_factory,
+            fulltext_search_engine_factory=fulltext_search_engine_factory,
+            sources_hash=sources_hash,
         )
+        if summary_text_cache is not None:
+            summary_text_cache.save()
 
     @classmethod
-    def ingest_from_file_and_persist(
-        cls, source_dataset_filename: str, storage_dir: str, first_run: bool
-    ) -> None:
-        applications_filename = path.join(storage_dir, "applications.pkl")
-        fulltext_index_filename = path.join(storage_dir, "fulltext_search_index.json")
-        semantic_index_dirname = path.join(storage_dir, "chromadb")
+    def ingest_and_persist(
+        cls,
+        input_documents: Iterable[InputDocument],
+        storage_dir: str,
+        first_run: bool,
+        semantic_search_engine_factory: Callable[
+            [], SemanticSearchEngine
+        ] = SemanticSearchEngine,
+        fulltext_search_engine_factory: Callable[
+            [], FullTextSearchEngine
+        ] = FullTextSearchEngine,
+        sources_hash: str | None = None,
+        unfetched_locators: List[ApplicationFileLocator] | None = None,
+    ) -> bool:
+        """
+        Build a new generation from the input documents and switch to it.
 
-        input_documents = load_input_documents_from_file(
-            source_dataset_filename, approved_applications_only=True
+        Applications of `unfetched_locators`, rounds that could not be
+        fetched, are carried over from the current generation rather than
+        removed. If the current generation cannot be updated, it is kept as
+        is and False is returned. Otherwise the current generation holds the
+        input documents, whether it was just built or already did.
+        """
+        semantic_search_engine = semantic_search_engine_factory()
+        fulltext_search_engine = fulltext_search_engine_factory()
+
+        previous_generation_id = read_current_generation_id(storage_dir)
+        previous_manifest = (
+            None
+            if first_run or previous_generation_id is None
+            else read_generation_manifest(storage_dir, previous_generation_id)
         )
+        # A generation built with another schema, model or engines cannot be
+        # updated incrementally
+        if previous_manifest is not None and not previous_manifest.is_compatible(
+            semantic_search_engine, fulltext_search_engine
+        ):
+            logging.info(
+                "generation %s was built with another setup, rebuilding",
+                previous_generation_id,
+            )
+            previous_manifest = None
+
+        previous_generation_dirname = (
+            None
+            if previous_manifest is None or previous_generation_id is None
+            else path.join(get_generations_dirname(storage_dir), previous_generation_id)
+        )
+        previous_content_hashes_by_ref: Dict[str, str] = {}
+        if previous_generation_dirname is not None:
+            with open(
+                path.join(previous_generation_dirname, "content_hashes.json")
+            ) as file:
+                previous_content_hashes_by_ref = json.load(file)
+
+        if (
+            unfetched_locators
+            and previous_generation_dirname is None
+            and previous_generation_id is not None
+            and not first_run
+        ):
+            # Their applications would be lost
+            logging.error(
+                "%d rounds could not be fetched and generation %s cannot be updated, keeping it",
+                len(unfetched_locators),
+                previous_generation_id,
+            )
+            return False
 
         application_summaries_by_ref: Dict[str, ApplicationSummary] = {}
-        for input_document in input_documents:
-            application_summaries_by_ref[
-                input_document.document.metadata["application_ref"]
-            ] = ApplicationSummary.from_metadata(input_document.document.metadata)
-
-        with open(applications_filename + ".tmp", "wb") as file:
-            pickle.dump(application_summaries_by_ref, file)
-        os.rename(applications_filename + ".tmp", applications_filename)
-
-        if first_run:
-            if os.path.exists(fulltext_index_filename) or os.path.exists(
-                semantic_index_dirname
+        content_hashes_by_ref: Dict[str, str] = {}
+
+        def iter_recorded_input_documents() -> Iterator[InputDocument]:
+            # Summaries and content hashes are kept for every document, the
+            # documents themselves only as long as the indices need them
+            for input_document in input_documents:
+                application_ref = input_document.document.metadata["application_ref"]
+                application_summaries_by_ref[application_ref] = (
+                    input_document.application_summary
+                    or ApplicationSummary.from_metadata(
+                        input_document.document.metadata
+                    )
+                )
+                content_hashes_by_ref[
+                    application_ref
+                ] = get_input_document_content_hash(input_document)
+                yield input_document
+
+        def get_source_dataset_hash() -> str:
+            return hashlib.sha256(
+                json.dumps(content_hashes_by_ref, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+
+        # Every ingest builds a complete new generation next to the current
+        # one, which is only switched to once it has been fully persisted
+        generation_id = str(time.time_ns())
+        generation_dirname = path.join(
+            get_generations_dirname(storage_dir), generation_id
+        )
+        applications_filename = path.join(generation_dirname, "applications.bin")
+        content_hashes_filename = path.join(generation_dirname, "content_hashes.json")
+        semantic_index_dirname = path.join(generation_dirname, "semantic_index")
+
+        if previous_generation_dirname is not None:
+            # Only the documents that changed are indexed, so only they are
+            # held
+            changed_input_documents = [
+                input_document
+                for input_document in iter_recorded_input_documents()
+                if previous_content_hashes_by_ref.get(
+                    input_document.document.metadata["application_ref"]
+                )
+                != content_hashes_by_ref[
+                    input_document.document.metadata["application_ref"]
+                ]
+            ]
+            unchanged_count = len(content_hashes_by_ref) - len(changed_input_documents)
+
+            if unfetched_locators:
+                unfetched_round_keys = {
+                    get_round_key(locator.chain_id, locator.round_id)
+                    for locator in unfetched_locators
+                }
+                previous_application_summaries_by_ref = ApplicationSummaryStore.load(
+                    path.join(previous_generation_dirname, "applications.bin")
+                )
+                carried_over_count = 0
+                for (
+                    application_ref,
+                    content_hash,
+                ) in previous_content_hashes_by_ref.items():
+                    if (
+                        application_ref not in content_hashes_by_ref
+                        and get_application_ref_round_key(application_ref)
+                        in unfetched_round_keys
+                    ):
+                        content_hashes_by_ref[application_ref] = content_hash
+                        application_summaries_by_ref[
+                            application_ref
+                        ] = previous_application_summaries_by_ref[application_ref]
+                        carried_over_count += 1
+                logging.warning(
+                    "%d rounds could not be fetched, carried over their %d applications",
+                    len(unfetched_locators),
+                    carried_over_count,
+                )
+
+            if len(application_summaries_by_ref) == 0:
+                raise Exception("No applications to ingest, not building a generation")
+
+            if (
+                cast(GenerationManifest, previous_manifest).source_dataset_hash
+                == get_source_dataset_hash()
+                and cast(GenerationManifest, previous_manifest).sources_hash
+                == sources_hash
             ):
-                raise Exception(
-                    "Reindexing not yet supported. Remove old indices before restarting service."
+                logging.info("applications unchanged, skipping ingest")
+                return True
+
+            removed_refs = [
+                application_ref
+                for application_ref in previous_content_hashes_by_ref
+                if application_ref not in content_hashes_by_ref
+            ]
+
+            logging.info(
+                "incremental ingest: %d changed, %d removed, %d unchanged",
+                len(changed_input_documents),
+                len(removed_refs),
+                unchanged_count,
+            )
+
+            if len(changed_input_documents) == 0 and len(removed_refs) == 0:
+                return True
+
+        # A generation that fails to build is removed rather than left behind
+        # without a manifest
+        try:
+            os.makedirs(generation_dirname)
+
+            if previous_generation_dirname is None:
+                # Documents flow through both indices as they are produced,
+                # only a batch of them is held by the semantic index and
+                # their fulltext fields by the fulltext index
+                fulltext_search_engine.index(
+                    semantic_search_engine.iter_indexing(
+                        iter_recorded_input_documents(),
+                        persist_directory=semantic_index_dirname,
+                    )
+                )
+                if len(application_summaries_by_ref) == 0:
+                    raise Exception(
+                        "No applications to ingest, not building a generation"
+                    )
+                fulltext_search_engine.save_index(
+                    path.join(generation_dirname, fulltext_search_engine.index_filename)
+                )
+            else:
+                shutil.copytree(
+                    path.join(previous_generation_dirname, "semantic_index"),
+                    semantic_index_dirname,
+                )
+                semantic_search_engine.load(semantic_index_dirname)
+                semantic_search_engine.update(changed_input_documents, removed_refs)
+
+                fulltext_search_engine.load_index(
+                    path.join(
+                        previous_generation_dirname,
+                        fulltext_search_engine.index_filename,
+                    )
                 )
+                fulltext_search_engine.update(changed_input_documents, removed_refs)
+                fulltext_search_engine.save_index(
+                    path.join(generation_dirname, fulltext_search_engine.index_filename)
+                )
+
+            ApplicationSummaryStore.from_summaries(
+                application_summaries_by_ref.values()
+            ).save(applications_filename)
+
+            # Rendered once here rather than by every HTTP worker, which map
+            # the files instead
+            RenderedResponse.render(
+                ApplicationsResponse(
+                    application_summaries=list(application_summaries_by_ref.values())
+                )
+                .model_dump_json(by_alias=True)
+                .encode("utf-8")
+            ).save(path.join(generation_dirname, "applications_response"))
 
-            semantic_search_engine = SemanticSearchEngine()
-            semantic_search_engine.index(
-                input_documents, persist_directory=semantic_index_dirname
+            with open(content_hashes_filename, "w") as file:
+                json.dump(content_hashes_by_ref, file)
+
+            validate_generation_files(
+                generation_dirname, semantic_search_engine, fulltext_search_engine
             )
 
-            fulltext_search_engine = FullTextSearchEngine()
-            fulltext_search_engine.index(input_documents)
-            fulltext_search_engine.save_index(fulltext_index_filename)
+            # Written last: a generation without a manifest is never reused
+            with open(path.join(generation_dirname, "manifest.json"), "w") as file:
+                file.write(
+                    GenerationManifest(
+                        schema_version=GENERATION_SCHEMA_VERSION,
+                        embedding_model_name=EMBEDDING_MODEL_NAME,
+                        semantic_search_engine=type(semantic_search_engine).__name__,
+                        fulltext_search_engine=type(fulltext_search_engine).__name__,
+                        sources_hash=sources_hash,
+                        source_dataset_hash=get_source_dataset_hash(),
+                        application_count=len(application_summaries_by_ref),
+                    ).model_dump_json()
+                )
+        except BaseException:
+            shutil.rmtree(generation_dirname, ignore_errors=True)
+            raise
+
+        write_current_generation_id(storage_dir, generation_id)
+        logging.info("switched to data generation %s", generation_id)
+
+        prune_generations(storage_dir)
+        return True
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import os
+import numpy as np
+from os import path
+from typing import Dict, List, Tuple
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of document embeddings, keyed by a hash of the model
+    name and of the exact text fed to the model.
+
+    Vectors are appended to a flat float32 file that is read through a
+    memory map, keys map to row numbers in that file. Vectors are always
+    persisted before the keys that point to them.
+    """
+
+    def __init__(self, dirname: str, model_name: str):
+        self.dirname = dirname
+        self.model_name = model_name
+        self._rows_by_key: Dict[str, int] = {}
+        self._dimensions: int | None = None
+        self._vectors: np.ndarray | None = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows_by_key)
+
+    def get_dimensions(self) -> int | None:
+        return self._dimensions
+
+    def get_many(self, texts: List[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """
+        Return cached embeddings by position in `texts`, and the positions
+        of the texts that are not cached.
+        """
+        embeddings_by_position: Dict[int, np.ndarray] = {}
+        missing_positions: List[int] = []
+        for position, text in enumerate(texts):
+            row = self._rows_by_key.get(self._get_key(text))
+            if row is None or self._vectors is None:
+                missing_positions.append(position)
+            else:
+                embeddings_by_position[position] = self._vectors[row]
+        return embeddings_by_position, missing_positions
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray) -> None:
+        if len(texts) == 0:
+            return
+
+        if self._dimensions is None:
+            self._dimensions = embeddings.shape[1]
+        elif self._dimensions != embeddings.shape[1]:
+            raise Exception(
+                f"Expected embeddings with {self._dimensions} dimensions, got {embeddings.shape[1]}"
+            )
+
+        new_keys: Dict[str, None] = {}
+        new_embeddings = []
+        for text, embedding in zip(texts, embeddings):
+            key = self._get_key(text)
+            if key not in self._rows_by_key and key not in new_keys:
+                new_keys[key] = None
+                new_embeddings.append(embedding)
+        if len(new_keys) == 0:
+            return
+
+        os.makedirs(self.dirname, exist_ok=True)
+        first_new_row = len(self._rows_by_key)
+        with open(self._get_vectors_filename(), "ab") as file:
+            # Drops rows left behind by an interrupted write, which no key
+            # points to
+            file.truncate(first_new_row * self._dimensions * 4)
+            file.write(np.asarray(new_embeddings, dtype=np.float32).tobytes())
+
+        for i, key in enumerate(new_keys):
+            self._rows_by_key[key] = first_new_row + i
+        self._save_index()
+        self._map_vectors()
+
+    def _get_key(self, text: str) -> str:
+        return hashlib.sha256(
+            (self.model_name + "\0" + text).encode("utf-8")
+        ).hexdigest()
+
+    def _load(self) -> None:
+        index_filename = self._get_index_filename()
+        if not os.path.exists(index_filename):
+            return
+
+        with open(index_filename) as file:
+            index = json.load(file)
+        if index["model_name"] != self.model_name:
+            logging.info(
+                "embedding cache was built with %s, ignoring it", index["model_name"]
+            )
+            return
+
+        self._dimensions = index["dimensions"]
+        self._rows_by_key = {key: row for row, key in enumerate(index["keys"])}
+        self._map_vectors()
+        logging.debug("loaded %d cached embeddings", len(self._rows_by_key))
+
+    def _save_index(self) -> None:
+        keys = [""] * len(self._rows_by_key)
+        for key, row in self._rows_by_key.items():
+            keys[row] = key
+
+        index_filename = self._get_index_filename()
+        with open(index_filename + ".tmp", "w") as file:
+            json.dump(
+                {
+                    "model_name": self.model_name,
+                    "dimensions": self._dimensions,
+                    "keys": keys,
+                },
+                file,
+            )
+        os.replace(index_filename + ".tmp", index_filename)
+
+    def _map_vectors(self) -> None:
+        if self._dimensions is None or len(self._rows_by_key) == 0:
+            self._vectors = None
+            return
+        self._vectors = np.memmap(
+            self._get_vectors_filename(),
+            dtype=np.float32,
+            mode="r",
+            shape=(len(self._rows_by_key), self._dimensions),
+        )
+
+    def _get_index_filename(self) -> str:
+        return path.join(self.dirname, "index.json")
+
+    def _get_vectors_filename(self) -> str:
+        return path.join(self.dirname, "vectors.f32")
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from typing import Callable, List, Tuple
+from src.util import setup_json_logging
+
+# Frames are a 4-byte big-endian length followed by the payload. Requests
+# carry a UTF-8 query, responses a status byte followed by either float32
+# embedding bytes or a UTF-8 error message.
+FRAME_HEADER = struct.Struct(">I")
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+class EmbeddingServer:
+    """
+    Serves query embeddings over a Unix socket to any number of local
+    processes, so that only one process holds the model. Requests that
+    arrive together are embedded together: after the first request of a
+    batch, the server waits up to `max_batch_wait_seconds` for more, and
+    requests arriving while a batch is being embedded make up the next one.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        embed: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_batch_wait_seconds: float = 0.002,
+    ):
+        self.socket_path = socket_path
+        self.embed = embed
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait_seconds = max_batch_wait_seconds
+        self.batches = 0
+        self.requests = 0
+
+    def serve_forever(self) -> None:
+        asyncio.run(self.serve())
+
+    async def serve(self) -> None:
+        self._queue: asyncio.Queue[
+            Tuple[str, asyncio.Future[np.ndarray]]
+        ] = asyncio.Queue()
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(
+            self._handle_connection, path=self.socket_path
+        )
+        logging.info("embedding service listening on %s", self.socket_path)
+
+        async with server:
+            await asyncio.gather(server.serve_forever(), self._embed_batches())
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                (length,) = FRAME_HEADER.unpack(header)
+                query = (await reader.readexactly(length)).decode("utf-8")
+
+                future = asyncio.get_running_loop().create_future()
+                await self._queue.put((query, future))
+                try:
+                    payload = bytes([STATUS_OK]) + (await future).tobytes()
+                except Exception as e:
+                    payload = bytes([STATUS_ERROR]) + str(e).encode("utf-8")
+
+                writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Client went away
+            pass
+        finally:
+            writer.close()
+
+    async def _embed_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_batch_wait_seconds
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            start_time = time.perf_counter()
+            queries = [query for query, _ in batch]
+            try:
+                embeddings = await loop.run_in_executor(None, self.embed, queries)
+            except Exception as e:
+                logging.exception("could not embed batch of %d queries", len(batch))
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(np.asarray(embedding, dtype=np.float32))
+
+            self.batches += 1
+            self.requests += len(batch)
+            logging.debug(
+                "embedded batch of %d queries in %.4f seconds (%.1f queries per batch on average)",
+                len(batch),
+                time.perf_counter() - start_time,
+                self.requests / self.batches,
+            )
+
+
+class EmbeddingClient:
+    """
+    Thread-safe client of an EmbeddingServer. Keeps one connection per
+    concurrent caller and reuses them across calls.
+    """
+
+    def __init__(self, socket_path: str, timeout_seconds: float = 30):
+        self.socket_path = socket_path
+        self.timeout_seconds = timeout_seconds
+        self._idle_connections: List[socket.socket] = []
+        self._lock = threading.Lock()
+        # Only waited for until first reached: after that, a missing socket
+        # means the service is gone and callers are told right away
+        self._waited_for_service = False
+
+    def embed_query(self, query: str) -> List[float]:
+        try:
+            response = self._request(self._acquire_connection(), query)
+        except (ConnectionError, FileNotFoundError):
+            # An idle connection may be left over from a service that has
+            # since been restarted
+            response = self._request(self._connect(), query)
+
+        if response[0] != STATUS_OK:
+            raise Exception(f"Embedding service error: {response[1:].decode()}")
+        return np.frombuffer(response[1:], dtype=np.float32).tolist()
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._idle_connections:
+                connection.close()
+            self._idle_connections = []
+
+    def _acquire_connection(self) -> socket.socket:
+        with self._lock:
+            if len(self._idle_connections) > 0:
+                return self._idle_connections.pop()
+        return self._connect()
+
+    def _release_connection(self, connection: socket.socket) -> None:
+        with self._lock:
+            self._idle_connections.append(connection)
+
+    def _request(self, connection: socket.socket, query: str) -> bytes:
+        try:
+            payload = query.encode("utf-8")
+            connection.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+            (length,) = FRAME_HEADER.unpack(
+                self._receive_exactly(connection, FRAME_HEADER.size)
+            )
+            response = self._receive_exactly(connection, length)
+        except Exception:
+            connection.close()
+            raise
+        self._release_connection(connection)
+        return response
+
+    def _connect(self) -> socket.socket:
+        # The service may still be loading the model, e.g. right after the
+        # HTTP workers have started
+        deadline = time.monotonic() + (
+            0 if self._waited_for_service else self.timeout_seconds
+        )
+        while True:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout_seconds)
+            try:
+                connection.connect(self.socket_path)
+                self._waited_for_service = True
+                return connection
+            except (FileNotFoundError, ConnectionRefusedError):
+                connection.close()
+                if time.monotonic() >= deadline:
+                    self._waited_for_service = True
+                    raise
+                time.sleep(0.1)
+
+    def _receive_exactly(self, connection: socket.socket, size: int) -> bytes:
+        chunks = []
+        while size > 0:
+            chunk = connection.recv(size)
+            if len(chunk) == 0:
+                raise ConnectionError("Embedding service closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+
+def run_embedding_server(
+    socket_path: str,
+    log_level: str = "INFO",
+    deployment_environment: str = "local",
+    max_batch_size: int = 32,
+    max_batch_wait_seconds: float = 0.002,
+) -> None:
+    """
+    Entry point of the embedding service process.
+    """
+    setup_json_logging(log_level, deployment_environment)
+
+    # Imported here, so that importing this module for the client does not
+    # load the model
+    from src.search_semantic import get_embedding_function
+
+    model = get_embedding_function().client
+
+    def embed(queries: List[str]) -> np.ndarray:
+        # Same preprocessing as SentenceTransformerEmbeddings.embed_query
+        return model.encode(
+            [query.replace("\n", " ") for query in queries],
+            batch_size=len(queries),
+        )
+
+    EmbeddingServer(
+        socket_path,
+        embed,
+        max_batch_size=max_batch_size,
+        max_batch_wait_seconds=max_batch_wait_seconds,
+    ).serve_forever()
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+R = TypeVar("R")
+
+
+class BoundedExecutor:
+    """
+    Runs blocking calls on a fixed-size thread pool so that they don't block
+    the event loop. Calls beyond `max_workers` wait in the pool's queue.
+    Keeps counters of queued, running and completed calls.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = "executor"):
+        self.max_workers = max_workers
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=thread_name_prefix
+        )
+        self._lock = threading.Lock()
+
+    async def run(self, func: Callable[[], R]) -> R:
+        with self._lock:
+            self.queued += 1
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._call, func
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+            }
+
+    def _call(self, func: Callable[[], R]) -> R:
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+
+class SingleFlight(Generic[K, R]):
+    """
+    Coalesces concurrent calls with the same key: while a call is in flight,
+    later callers await its result instead of starting their own. Must be
+    used from a single event loop.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._tasks_by_key: Dict[K, asyncio.Future[R]] = {}
+
+    async def run(self, key: K, func: Callable[[], Awaitable[R]]) -> R:
+        task = self._tasks_by_key.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func())
+            self._tasks_by_key[key] = task
+            task.add_done_callback(lambda done_task: self._forget(key, done_task))
+        else:
+            self.coalesced += 1
+        # A caller that goes away (e.g. client disconnect) must not cancel
+        # the computation for the others
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._tasks_by_key),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
+
+    def _forget(self, key: K, task: "asyncio.Future[R]") -> None:
+        if self._tasks_by_key.get(key) is task:
+            del self._tasks_by_key[key]
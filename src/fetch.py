@@ -0,0 +1,245 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from os import path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, TypeVar
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from src.util import iter_json_array_items
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class Fetcher:
+    """
+    Bounded-concurrency HTTP client. Keeps one keep-alive session per host,
+    applies a timeout to every request and retries failed requests with
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        timeout_seconds: float = 30,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._sessions_by_host: Dict[str, requests.Session] = {}
+        self._sessions_lock = threading.Lock()
+
+    def get(
+        self, url: str, http_cache: "HttpCache | None" = None, stream: bool = False
+    ) -> requests.Response:
+        """
+        When `http_cache` is given, the request is conditional on the cached
+        validators and may be answered with 304 Not Modified.
+        """
+        headers = {} if http_cache is None else http_cache.get_conditional_headers(url)
+        return self._get_session(url).get(
+            url, headers=headers, timeout=self.timeout_seconds, stream=stream
+        )
+
+    def map(self, func: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """
+        Apply `func` to every item concurrently, with at most
+        `max_concurrency` calls in flight. Results are returned in the
+        order of `items`.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return list(executor.map(func, items))
+
+    def close(self) -> None:
+        with self._sessions_lock:
+            for session in self._sessions_by_host.values():
+                session.close()
+            self._sessions_by_host.clear()
+
+    def _get_session(self, url: str) -> requests.Session:
+        host = urlsplit(url).netloc
+        with self._sessions_lock:
+            if host not in self._sessions_by_host:
+                logging.debug("opening http session for %s", host)
+                self._sessions_by_host[host] = self._create_session()
+            return self._sessions_by_host[host]
+
+    def _create_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            # Hand the last response back instead of raising, callers
+            # check the status code
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.max_concurrency,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+
+class HttpCache:
+    """
+    Persistent cache of JSON documents keyed by URL, together with the ETag
+    and Last-Modified validators of the response they came from, so that
+    they can be requested again conditionally.
+
+    The cached document need not be the response body verbatim: callers may
+    store a processed version of it, so that a 304 spares the processing
+    too.
+
+    Stored documents are pending until `save`: until then, requests are
+    still conditional on the previously saved validators, so that a run
+    that fails after fetching fetches the same documents again.
+    """
+
+    def __init__(self, dirname: str):
+        self.dirname = dirname
+        self._lock = threading.Lock()
+        self._entries_by_url: Dict[str, Dict[str, str]] = {}
+        self._pending_entries_by_url: Dict[str, Dict[str, str]] = {}
+        self._load_index()
+
+    def get_conditional_headers(self, url: str) -> Dict[str, str]:
+        with self._lock:
+            entry = self._entries_by_url.get(url)
+        if entry is None:
+            return {}
+
+        headers = {}
+        if "etag" in entry:
+            headers["If-None-Match"] = entry["etag"]
+        if "last_modified" in entry:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load_json(self, url: str) -> Any:
+        with open(self._get_document_filename(url)) as file:
+            return json.load(file)
+
+    def iter_json_array_items(self, url: str) -> Iterator[Any]:
+        """
+        Like `load_json` for a cached JSON array, but yields its items one at
+        a time instead of loading it whole.
+        """
+        with open(self._get_document_filename(url), "rb") as file:
+            yield from iter_json_array_items(iter(lambda: file.read(65536), b""))
+
+    def store_json(self, url: str, response: requests.Response, document: Any) -> None:
+        entry = self._get_validators(response)
+        if len(entry) == 0:
+            # Cannot be revalidated, no point in keeping it
+            return
+
+        os.makedirs(self.dirname, exist_ok=True)
+        pending_document_filename = self._get_pending_document_filename(url)
+        with open(pending_document_filename + ".tmp", "w") as file:
+            json.dump(document, file)
+        os.replace(pending_document_filename + ".tmp", pending_document_filename)
+
+        with self._lock:
+            self._pending_entries_by_url[url] = entry
+
+    def iter_storing_json_array(
+        self, url: str, response: requests.Response, items: Iterable[Any]
+    ) -> Iterator[Any]:
+        """
+        Like `store_json` for a JSON array, but passes its items through,
+        writing them as they go instead of holding them all. The array is
+        only stored once every item went through.
+        """
+        entry = self._get_validators(response)
+        if len(entry) == 0:
+            yield from items
+            return
+
+        os.makedirs(self.dirname, exist_ok=True)
+        pending_document_filename = self._get_pending_document_filename(url)
+        with open(pending_document_filename + ".tmp", "w") as file:
+            file.write("[")
+            for i, item in enumerate(items):
+                if i > 0:
+                    file.write(",\n")
+                json.dump(item, file)
+                yield item
+            file.write("]\n")
+        os.replace(pending_document_filename + ".tmp", pending_document_filename)
+
+        with self._lock:
+            self._pending_entries_by_url[url] = entry
+
+    def save(self) -> None:
+        """
+        Commit the documents stored since the last save, and persist the
+        validators they came with.
+        """
+        os.makedirs(self.dirname, exist_ok=True)
+        index_filename = path.join(self.dirname, "index.json")
+        with self._lock:
+            for url, entry in self._pending_entries_by_url.items():
+                os.replace(
+                    self._get_pending_document_filename(url),
+                    self._get_document_filename(url),
+                )
+                self._entries_by_url[url] = entry
+            self._pending_entries_by_url = {}
+            with open(index_filename + ".tmp", "w") as file:
+                json.dump(self._entries_by_url, file)
+        os.replace(index_filename + ".tmp", index_filename)
+
+    def discard(self) -> None:
+        """
+        Forget the documents stored since the last save.
+        """
+        with self._lock:
+            for url in self._pending_entries_by_url:
+                try:
+                    os.remove(self._get_pending_document_filename(url))
+                except FileNotFoundError:
+                    pass
+            self._pending_entries_by_url = {}
+
+    def clear(self) -> None:
+        self.discard()
+        with self._lock:
+            self._entries_by_url = {}
+
+    def _get_validators(self, response: requests.Response) -> Dict[str, str]:
+        validators = {}
+        if "ETag" in response.headers:
+            validators["etag"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            validators["last_modified"] = response.headers["Last-Modified"]
+        return validators
+
+    def _load_index(self) -> None:
+        index_filename = path.join(self.dirname, "index.json")
+        if os.path.exists(index_filename):
+            with open(index_filename) as file:
+                self._entries_by_url = json.load(file)
+
+    def _get_document_filename(self, url: str) -> str:
+        return path.join(
+            self.dirname, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def _get_pending_document_filename(self, url: str) -> str:
+        return path.join(
+            self.dirname,
+            hashlib.sha256(url.encode("utf-8")).hexdigest() + ".pending.json",
+        )
@@ -1,26 +1,59 @@
 import uvicorn
 import logging
-import socket
+import multiprocessing
+from datetime import datetime
+from os import path
 from dotenv import load_dotenv
 from apscheduler.schedulers.background import BackgroundScheduler
 from src.config import Settings
-from src.util import get_json_log_formatter, parse_applicaton_file_locators
-from src.data import Data
+from src.util import parse_applicaton_file_locators, setup_json_logging
+from src.data import (
+    Data,
+    get_embedding_cache_dirname,
+    get_fulltext_search_engine_factory,
+    get_raw_dump_filename,
+    get_semantic_search_engine_factory,
+    get_sources_hash,
+    get_summary_text_cache_filename,
+    read_reusable_generation_id,
+)
+from src.embedding_cache import EmbeddingCache
+from src.embedding_service import run_embedding_server
+from src.fetch import Fetcher, HttpCache
+from src.search_semantic import EMBEDDING_MODEL_NAME
+from src.summary_text import SummaryTextCache
 
 
 load_dotenv()
 settings = Settings()  # type: ignore -- TODO investigate why this is necessary
 
-logger = logging.getLogger()
-logger.setLevel(settings.log_level)
-logHandler = logging.StreamHandler()
-logHandler.setFormatter(
-    get_json_log_formatter(
-        hostname=socket.gethostname(),
-        deployment_environment=settings.deployment_environment,
+setup_json_logging(settings.log_level, settings.deployment_environment)
+
+fetcher = Fetcher(
+    max_concurrency=settings.indexer_max_concurrent_requests,
+    timeout_seconds=settings.indexer_request_timeout_seconds,
+    max_retries=settings.indexer_request_max_retries,
+)
+http_cache = HttpCache(path.join(settings.storage_dir, "http_cache"))
+semantic_search_engine_factory = get_semantic_search_engine_factory(
+    backend=settings.semantic_search_backend,
+    embedding_dtype=settings.semantic_search_embedding_dtype,
+    embedding_batch_size=settings.embedding_batch_size,
+    embedding_processes=settings.embedding_processes,
+    document_embedding_cache=EmbeddingCache(
+        get_embedding_cache_dirname(settings.storage_dir),
+        model_name=EMBEDDING_MODEL_NAME,
     ),
 )
-logger.addHandler(logHandler)
+fulltext_search_engine_factory = get_fulltext_search_engine_factory(
+    backend=settings.fulltext_search_backend
+)
+summary_text_cache = SummaryTextCache(
+    get_summary_text_cache_filename(settings.storage_dir)
+)
+raw_dump_filename = (
+    get_raw_dump_filename(settings.storage_dir) if settings.ingest_raw_dump else None
+)
 
 
 def update_dataset():
@@ -31,23 +64,70 @@ def update_dataset():
         storage_dir=settings.storage_dir,
         indexer_base_url=settings.indexer_base_url,
         first_run=False,
+        fetcher=fetcher,
+        http_cache=http_cache,
+        semantic_search_engine_factory=semantic_search_engine_factory,
+        fulltext_search_engine_factory=fulltext_search_engine_factory,
+        raw_dump_filename=raw_dump_filename,
+        summary_text_cache=summary_text_cache,
+        enrichment_processes=settings.enrichment_processes,
     )
 
 
 def main():
     logging.info("Starting with config: %s", settings)
 
-    Data.ingest_from_application_locators_and_persist(
-        application_files_locators=parse_applicaton_file_locators(
-            settings.application_files_locators
+    if settings.embedding_service_socket is not None:
+        logging.info("Starting embedding service...")
+        # Spawned rather than forked, so the service does not inherit the
+        # parent's threads
+        multiprocessing.get_context("spawn").Process(
+            target=run_embedding_server,
+            kwargs={
+                "socket_path": settings.embedding_service_socket,
+                "log_level": settings.log_level,
+                "deployment_environment": settings.deployment_environment,
+                "max_batch_size": settings.embedding_service_max_batch_size,
+                "max_batch_wait_seconds": settings.embedding_service_max_batch_wait_seconds,
+            },
+            name="embedding-service",
+            daemon=True,
+        ).start()
+
+    application_files_locators = parse_applicaton_file_locators(
+        settings.application_files_locators
+    )
+    reusable_generation_id = read_reusable_generation_id(
+        settings.storage_dir,
+        sources_hash=get_sources_hash(
+            application_files_locators, settings.indexer_base_url
         ),
-        storage_dir=settings.storage_dir,
-        indexer_base_url=settings.indexer_base_url,
-        first_run=True,
+        semantic_search_engine_factory=semantic_search_engine_factory,
+        fulltext_search_engine_factory=fulltext_search_engine_factory,
     )
 
+    if reusable_generation_id is None:
+        Data.ingest_from_application_locators_and_persist(
+            application_files_locators=application_files_locators,
+            storage_dir=settings.storage_dir,
+            indexer_base_url=settings.indexer_base_url,
+            first_run=True,
+            fetcher=fetcher,
+            http_cache=http_cache,
+            semantic_search_engine_factory=semantic_search_engine_factory,
+            fulltext_search_engine_factory=fulltext_search_engine_factory,
+            raw_dump_filename=raw_dump_filename,
+            summary_text_cache=summary_text_cache,
+            enrichment_processes=settings.enrichment_processes,
+        )
+    else:
+        logging.info(
+            "Warm start from data generation %s, updating in the background",
+            reusable_generation_id,
+        )
+
     scheduler = BackgroundScheduler()
-    scheduler.add_job(
+    update_dataset_job = scheduler.add_job(
         func=update_dataset,
         trigger="cron",
         minute="0,30",
@@ -56,6 +136,11 @@ def main():
     )
     scheduler.start()
 
+    if reusable_generation_id is not None:
+        # The reused generation is served while this first update catches up
+        # with whatever changed while the service was down
+        update_dataset_job.modify(next_run_time=datetime.now())
+
     if settings.auto_reload is True and settings.http_workers is not None:
         raise Exception("Auto reload and multiple HTTP workers are mutually exclusive.")
 
@@ -0,0 +1,41 @@
+import os
+from typing import Dict
+
+SMAPS_ROLLUP_FILENAME = "/proc/self/smaps_rollup"
+
+
+def get_memory_usage() -> Dict[str, int] | None:
+    """
+    Resident memory of the current process in bytes, split into pages it
+    shares with other processes (e.g. mapped index files, read through the
+    page cache) and pages private to it. `pss` charges each shared page
+    proportionally to the processes sharing it, so summing it across
+    workers gives their actual total.
+
+    Returns None where /proc/self/smaps_rollup is not available.
+    """
+    if not os.path.exists(SMAPS_ROLLUP_FILENAME):
+        return None
+
+    kilobytes_by_key: Dict[str, int] = {}
+    with open(SMAPS_ROLLUP_FILENAME) as file:
+        for line in file:
+            key, _, value = line.partition(":")
+            parts = value.split()
+            if len(parts) == 2 and parts[1] == "kB":
+                kilobytes_by_key[key] = int(parts[0])
+
+    return {
+        "rss": kilobytes_by_key.get("Rss", 0) * 1024,
+        "pss": kilobytes_by_key.get("Pss", 0) * 1024,
+        "shared": (
+            kilobytes_by_key.get("Shared_Clean", 0)
+            + kilobytes_by_key.get("Shared_Dirty", 0)
+        )
+        * 1024,
+        "private": (
+            kilobytes_by_key.get("Private_Clean", 0)
+            + kilobytes_by_key.get("Private_Dirty", 0)
+        )
+        * 1024,
+    }
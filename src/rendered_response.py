@@ -0,0 +1,124 @@
+import brotli
+import gzip
+import hashlib
+import json
+import mmap
+import os
+from os import path
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Self
+from fastapi import Response
+
+
+@dataclass(frozen=True)
+class RenderedResponse:
+    """
+    A JSON response body rendered once, together with its compressed
+    variants and a strong ETag per variant, to be served as-is to any
+    number of requests.
+
+    A saved response is loaded as memory maps of its files, so that
+    processes serving it share a single copy through the page cache.
+    """
+
+    bodies_by_encoding: Dict[str, bytes | memoryview]
+    etag: str
+
+    @classmethod
+    def render(cls, body: bytes) -> Self:
+        return cls(
+            bodies_by_encoding={
+                "identity": body,
+                "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+                "br": brotli.compress(body),
+            },
+            etag=hashlib.sha256(body).hexdigest()[:32],
+        )
+
+    def save(self, dirname: str) -> None:
+        os.makedirs(dirname, exist_ok=True)
+        for encoding, body in self.bodies_by_encoding.items():
+            with open(path.join(dirname, f"body.{encoding}"), "wb") as file:
+                file.write(body)
+        with open(path.join(dirname, "index.json"), "w") as file:
+            json.dump(
+                {"etag": self.etag, "encodings": list(self.bodies_by_encoding)}, file
+            )
+
+    @classmethod
+    def load(cls, dirname: str) -> Self:
+        with open(path.join(dirname, "index.json")) as file:
+            index = json.load(file)
+
+        bodies_by_encoding: Dict[str, bytes | memoryview] = {}
+        for encoding in index["encodings"]:
+            with open(path.join(dirname, f"body.{encoding}"), "rb") as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    bodies_by_encoding[encoding] = b""
+                else:
+                    bodies_by_encoding[encoding] = memoryview(
+                        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                    )
+
+        return cls(bodies_by_encoding=bodies_by_encoding, etag=index["etag"])
+
+    def to_response(
+        self, request_headers: Mapping[str, str], headers: Dict[str, str] = {}
+    ) -> Response:
+        encoding = self._select_encoding(request_headers.get("accept-encoding", ""))
+        # Variants are different representations, so a strong ETag must
+        # tell them apart
+        etag = (
+            f'"{self.etag}"' if encoding == "identity" else f'"{self.etag}-{encoding}"'
+        )
+
+        response_headers = {**headers, "ETag": etag, "Vary": "Accept-Encoding"}
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+
+        if self._matches(request_headers.get("if-none-match", "")):
+            return Response(status_code=304, headers=response_headers)
+
+        return Response(
+            # A copy of a mapped body only lives as long as the request
+            content=bytes(self.bodies_by_encoding[encoding]),
+            media_type="application/json",
+            headers=response_headers,
+        )
+
+    def _select_encoding(self, accept_encoding: str) -> str:
+        accepted_encodings = parse_accept_encoding(accept_encoding)
+        for encoding in ["br", "gzip"]:
+            if encoding in self.bodies_by_encoding and (
+                encoding in accepted_encodings or "*" in accepted_encodings
+            ):
+                return encoding
+        return "identity"
+
+    def _matches(self, if_none_match: str) -> bool:
+        for tag in if_none_match.split(","):
+            tag = tag.strip().removeprefix("W/").strip('"')
+            if tag == "*" or tag == self.etag or tag.startswith(self.etag + "-"):
+                return True
+        return False
+
+
+def parse_accept_encoding(accept_encoding: str) -> List[str]:
+    """
+    Return the encodings in an Accept-Encoding header, leaving out those
+    explicitly refused with q=0.
+    """
+    encodings = []
+    for item in accept_encoding.split(","):
+        encoding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if encoding != "" and quality > 0:
+            encodings.append(encoding.lower())
+    return encodings
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Any
+from typing import Any, Iterable, List
 from pydantic import BaseModel, Field
 from abc import ABC, abstractmethod
 from src.util import InputDocument
@@ -25,7 +25,7 @@ class SearchEngineResult:
 
 class SearchEngine(ABC):
     @abstractmethod
-    def index(self, project_docs: List[InputDocument]) -> None:
+    def index(self, project_docs: Iterable[InputDocument]) -> None:
         pass
 
     @abstractmethod
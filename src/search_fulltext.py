@@ -1,15 +1,71 @@
 import json
 import time
 import logging
-from lunr import lunr
-from lunr.index import Index
-from typing import List
+from typing import Dict, Iterable, List
 from src.util import InputDocument
 from src.search import SearchEngine, SearchEngineResult, SearchType
 
 
 class FullTextSearchEngine(SearchEngine):
-    def index(self, input_documents: List[InputDocument]) -> None:
+    # lunr indices are immutable, so the documents they were built from are
+    # kept (and persisted) to allow rebuilding after an update
+    documents_by_ref: Dict[str, dict]
+
+    # Name of the persisted index within a data generation
+    index_filename = "fulltext_search_index.json"
+
+    def index(self, input_documents: Iterable[InputDocument]) -> None:
+        self.documents_by_ref = {}
+        for input_document in input_documents:
+            document = self._to_lunr_document(input_document)
+            self.documents_by_ref[document["application_ref"]] = document
+        self._build_index()
+
+    def update(
+        self, input_documents: List[InputDocument], deleted_refs: List[str]
+    ) -> None:
+        for input_document in input_documents:
+            document = self._to_lunr_document(input_document)
+            self.documents_by_ref[document["application_ref"]] = document
+        for deleted_ref in deleted_refs:
+            self.documents_by_ref.pop(deleted_ref, None)
+        self._build_index()
+
+    def search(
+        self, query_string: str, k: int | None = None
+    ) -> List[SearchEngineResult]:
+        # lunr scores every match, only the results can be limited
+        return [
+            SearchEngineResult(ref=r["ref"], score=r["score"], type=SearchType.fulltext)
+            for r in self.search_index.search(query_string)[:k]
+        ]
+
+    def save_index(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(
+                {
+                    "index": self.search_index.serialize(),
+                    "documents": list(self.documents_by_ref.values()),
+                },
+                file,
+            )
+
+    def load_index(self, path: str) -> None:
+        # Imported here, like in _build_index, since importing lunr imports
+        # nltk when installed, which takes over a second
+        from lunr.index import Index
+
+        with open(path) as file:
+            serialized = json.loads(file.read())
+            self.search_index = Index.load(serialized["index"])
+            self.documents_by_ref = {
+                document["application_ref"]: document
+                for document in serialized["documents"]
+            }
+
+    def _build_index(self) -> None:
+        from lunr import lunr
+
         start_time = time.perf_counter()
 
         self.search_index = lunr(
@@ -19,33 +75,18 @@ class FullTextSearchEngine(SearchEngine):
                 "description",
                 "website_url",
             ],
-            documents=[
-                dict(
-                    application_ref=i.document.metadata["application_ref"],
-                    name=i.document.metadata["name"],
-                    description=i.document.page_content,
-                    website_url=i.document.metadata["website_url"],
-                )
-                for i in input_documents
-            ],
+            documents=list(self.documents_by_ref.values()),
         )
         logging.debug(
             "indexed %d projects in %.2f seconds with lunr.py",
-            len(input_documents),
+            len(self.documents_by_ref),
             time.perf_counter() - start_time,
         )
 
-    def search(self, query_string: str) -> List[SearchEngineResult]:
-        return [
-            SearchEngineResult(ref=r["ref"], score=r["score"], type=SearchType.fulltext)
-            for r in self.search_index.search(query_string)
-        ]
-
-    def save_index(self, path: str) -> None:
-        with open(path, "w") as file:
-            json.dump(self.search_index.serialize(), file)
-
-    def load_index(self, path: str) -> None:
-        with open(path) as file:
-            serialized_index = json.loads(file.read())
-            self.search_index = Index.load(serialized_index)
+    def _to_lunr_document(self, input_document: InputDocument) -> dict:
+        return dict(
+            application_ref=input_document.document.metadata["application_ref"],
+            name=input_document.document.metadata["name"],
+            description=input_document.document.page_content,
+            website_url=input_document.document.metadata["website_url"],
+        )
@@ -0,0 +1,296 @@
+import json
+import re
+import time
+import logging
+import numpy as np
+from collections import Counter
+from functools import lru_cache
+from bisect import bisect_left
+from typing import Dict, List, Sequence
+from src.array_file import EncodedStrings, encode_strings, read_arrays, write_arrays
+from src.util import InputDocument
+from src.search import SearchEngineResult, SearchType
+from src.search_fulltext import FullTextSearchEngine
+
+# Same parameters, boosts and token pipeline (split, trim, stop words, stem)
+# as the lunr index, so that rankings are comparable
+K1 = 1.2
+B = 0.75
+FIELD_BOOSTS = {"name": 10, "description": 1, "website_url": 1}
+
+SEPARATOR_RE = re.compile(r"[ \t\n\r\f\v\xa0-]+")
+TRIM_RE = re.compile(r"^\W*?([^\W]+)\W*?$")
+
+
+# lunr is imported on first use: importing it imports nltk when installed,
+# which takes over a second of worker startup
+
+
+@lru_cache(maxsize=None)
+def get_stop_words() -> frozenset[str]:
+    from lunr.stop_word_filter import WORDS
+
+    return frozenset(WORDS)
+
+
+@lru_cache(maxsize=100_000)
+def stem(word: str) -> str:
+    from lunr.stemmer import porter_stemmer
+
+    return porter_stemmer.stem(word)
+
+
+def tokenize(text: str | None) -> List[str]:
+    stop_words = get_stop_words()
+    terms = []
+    for token in SEPARATOR_RE.split((text or "").lower()):
+        match = TRIM_RE.match(token)
+        term = match.group(1) if match is not None else token
+        if term != "" and term not in stop_words:
+            terms.append(stem(term))
+    return terms
+
+
+# File layout version, see src.array_file
+MAGIC = b"BM25IDX\x01"
+
+
+class BM25FullTextSearchEngine(FullTextSearchEngine):
+    """
+    BM25 over an inverted index held in NumPy arrays. Terms are mapped to
+    integer ids, and for every field the postings of term `t` are the slice
+    `offsets[t]:offsets[t + 1]` of the `doc_ids` and `term_frequencies`
+    arrays.
+
+    The persisted index is a single file of flat arrays that is memory-mapped
+    on load, so loading involves no parsing and processes loading the same
+    file share its pages.
+
+    Queries are bags of terms: lunr's query syntax (field scoping, wildcards,
+    fuzzy matching, presence operators) is not supported.
+    """
+
+    index_filename = "fulltext_search_index.bin"
+
+    # Sorted, so that a term's position is its id
+    terms: Sequence[str]
+    refs: Sequence[str]
+    idfs: np.ndarray
+    offsets_by_field: Dict[str, np.ndarray]
+    doc_ids_by_field: Dict[str, np.ndarray]
+    term_frequencies_by_field: Dict[str, np.ndarray]
+    length_norms_by_field: Dict[str, np.ndarray]
+
+    def search(
+        self, query_string: str, k: int | None = None
+    ) -> List[SearchEngineResult]:
+        query_term_ids = set(
+            term_id
+            for term_id in (self._get_term_id(term) for term in tokenize(query_string))
+            if term_id is not None
+        )
+
+        scores = np.zeros(len(self.refs), dtype=np.float32)
+        for field_name, boost in FIELD_BOOSTS.items():
+            offsets = self.offsets_by_field[field_name]
+            field_term_ids = [
+                term_id
+                for term_id in query_term_ids
+                if offsets[term_id + 1] > offsets[term_id]
+            ]
+            field_scores = np.zeros(len(self.refs), dtype=np.float32)
+            for term_id in field_term_ids:
+                start, end = offsets[term_id], offsets[term_id + 1]
+                doc_ids = self.doc_ids_by_field[field_name][start:end]
+                term_frequencies = self.term_frequencies_by_field[field_name][start:end]
+                # Doc ids are unique within a posting list, so fancy-indexed
+                # += does not lose updates
+                field_scores[doc_ids] += (
+                    self.idfs[term_id]
+                    * (K1 + 1)
+                    * term_frequencies
+                    / (
+                        term_frequencies
+                        + self.length_norms_by_field[field_name][doc_ids]
+                    )
+                )
+            if len(field_term_ids) > 0:
+                # lunr scores each field by the dot product of the document
+                # and query vectors, divided by the query vector magnitude
+                scores += boost * field_scores / np.sqrt(len(field_term_ids))
+
+        matching_doc_ids = np.flatnonzero(scores > 0)
+        if k is not None and len(matching_doc_ids) > k:
+            # Only the k best matches are sorted. Matches tied with the k-th
+            # are all kept, so that ties are broken as in a full sort.
+            matching_scores = scores[matching_doc_ids]
+            kth_best_score = np.partition(matching_scores, -k)[-k]
+            matching_doc_ids = matching_doc_ids[matching_scores >= kth_best_score]
+        ranked_doc_ids = matching_doc_ids[
+            np.argsort(-scores[matching_doc_ids], kind="stable")
+        ][:k]
+        return [
+            SearchEngineResult(
+                ref=self.refs[doc_id],
+                score=round(float(scores[doc_id]), 3),
+                type=SearchType.fulltext,
+            )
+            for doc_id in ranked_doc_ids
+        ]
+
+    def update(
+        self, input_documents: List[InputDocument], deleted_refs: List[str]
+    ) -> None:
+        self._load_documents()
+        super().update(input_documents, deleted_refs)
+
+    def save_index(self, path: str) -> None:
+        self._load_documents()
+        terms_offsets, terms_blob = encode_strings(self.terms)
+        refs_offsets, refs_blob = encode_strings(self.refs)
+        documents_blob = np.frombuffer(
+            json.dumps(list(self.documents_by_ref.values())).encode("utf-8"),
+            dtype=np.uint8,
+        )
+
+        arrays = {
+            "terms_offsets": terms_offsets,
+            "terms_blob": terms_blob,
+            "refs_offsets": refs_offsets,
+            "refs_blob": refs_blob,
+            "documents_blob": documents_blob,
+            "idfs": self.idfs,
+        }
+        for field_name in FIELD_BOOSTS:
+            arrays[f"{field_name}.offsets"] = self.offsets_by_field[field_name]
+            arrays[f"{field_name}.doc_ids"] = self.doc_ids_by_field[field_name]
+            arrays[f"{field_name}.term_frequencies"] = self.term_frequencies_by_field[
+                field_name
+            ]
+            arrays[f"{field_name}.length_norms"] = self.length_norms_by_field[
+                field_name
+            ]
+
+        write_arrays(path, arrays, magic=MAGIC)
+
+    def load_index(self, path: str) -> None:
+        start_time = time.perf_counter()
+
+        arrays = read_arrays(path, magic=MAGIC)
+        self.terms = EncodedStrings(arrays["terms_offsets"], arrays["terms_blob"])
+        self.refs = EncodedStrings(arrays["refs_offsets"], arrays["refs_blob"])
+        self.idfs = arrays["idfs"]
+        self.offsets_by_field = {}
+        self.doc_ids_by_field = {}
+        self.term_frequencies_by_field = {}
+        self.length_norms_by_field = {}
+        for field_name in FIELD_BOOSTS:
+            self.offsets_by_field[field_name] = arrays[f"{field_name}.offsets"]
+            self.doc_ids_by_field[field_name] = arrays[f"{field_name}.doc_ids"]
+            self.term_frequencies_by_field[field_name] = arrays[
+                f"{field_name}.term_frequencies"
+            ]
+            self.length_norms_by_field[field_name] = arrays[
+                f"{field_name}.length_norms"
+            ]
+        # Only needed to update the index, decoded on demand
+        self._documents_blob = arrays["documents_blob"]
+        self.documents_by_ref = {}
+
+        logging.debug(
+            "mapped bm25 index of %d projects from %s in %.4f seconds",
+            len(self.refs),
+            path,
+            time.perf_counter() - start_time,
+        )
+
+    def _load_documents(self) -> None:
+        if self._documents_blob is None:
+            return
+        self.documents_by_ref = {
+            document["application_ref"]: document
+            for document in json.loads(self._documents_blob.tobytes())
+        }
+        self._documents_blob = None
+
+    def _get_term_id(self, term: str) -> int | None:
+        term_id = bisect_left(self.terms, term)
+        if term_id < len(self.terms) and self.terms[term_id] == term:
+            return term_id
+        return None
+
+    def _build_index(self) -> None:
+        start_time = time.perf_counter()
+
+        documents = list(self.documents_by_ref.values())
+        self.refs = [document["application_ref"] for document in documents]
+        self._documents_blob = None
+
+        # Terms get ids in first-seen order, renumbered in lexical order
+        # once all are known, so that they can be looked up by bisection
+        term_ids: Dict[str, int] = {}
+        postings_by_field = {}
+        for field_name in FIELD_BOOSTS:
+            term_id_column, doc_id_column, term_frequency_column = [], [], []
+            lengths = np.zeros(len(documents), dtype=np.float32)
+            for doc_id, document in enumerate(documents):
+                terms = tokenize(document[field_name])
+                lengths[doc_id] = len(terms)
+                for term, term_frequency in Counter(terms).items():
+                    term_id_column.append(term_ids.setdefault(term, len(term_ids)))
+                    doc_id_column.append(doc_id)
+                    term_frequency_column.append(term_frequency)
+            postings_by_field[field_name] = (
+                np.asarray(term_id_column, dtype=np.int32),
+                np.asarray(doc_id_column, dtype=np.int32),
+                np.asarray(term_frequency_column, dtype=np.float32),
+                lengths,
+            )
+
+        self.terms = sorted(term_ids)
+        sorted_term_ids = np.empty(len(term_ids), dtype=np.int32)
+        sorted_term_ids[[term_ids[term] for term in self.terms]] = np.arange(
+            len(term_ids), dtype=np.int32
+        )
+
+        documents_with_term = np.zeros(len(term_ids), dtype=np.float64)
+        self.offsets_by_field = {}
+        self.doc_ids_by_field = {}
+        self.term_frequencies_by_field = {}
+        self.length_norms_by_field = {}
+        for field_name, (
+            term_id_column,
+            doc_id_column,
+            term_frequency_column,
+            lengths,
+        ) in postings_by_field.items():
+            term_id_column = sorted_term_ids[term_id_column]
+            counts = np.bincount(term_id_column, minlength=len(term_ids))
+            # As in lunr, a document counts once per field containing the term
+            documents_with_term += counts
+            order = np.argsort(term_id_column, kind="stable")
+            self.offsets_by_field[field_name] = np.concatenate(
+                [[0], np.cumsum(counts)]
+            ).astype(np.int64)
+            self.doc_ids_by_field[field_name] = doc_id_column[order]
+            self.term_frequencies_by_field[field_name] = term_frequency_column[order]
+
+            average_length = lengths.mean() if len(lengths) > 0 else 0
+            self.length_norms_by_field[field_name] = (
+                K1
+                * (1 - B + B * lengths / (average_length if average_length > 0 else 1))
+            ).astype(np.float32)
+
+        self.idfs = np.log(
+            1
+            + np.abs(
+                (len(documents) - documents_with_term + 0.5)
+                / (documents_with_term + 0.5)
+            )
+        ).astype(np.float32)
+
+        logging.debug(
+            "indexed %d projects in %.2f seconds with bm25",
+            len(documents),
+            time.perf_counter() - start_time,
+        )
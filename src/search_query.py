@@ -1,7 +1,12 @@
+import base64
+import binascii
+import json
+import re
 import shlex
-from typing import Union, Literal, List
+from dataclasses import dataclass
+from typing import Dict, List, Self, Tuple, Union, Literal
 from pydantic import Field, BaseModel
-import argparse
+from src.cache import LRUCache
 
 
 class SearchParams(BaseModel):
@@ -11,6 +16,135 @@ class SearchParams(BaseModel):
     keywords: List[str]
 
 
+# Options and the parameters they set. The syntax is that of the argparse
+# parser this replaces, see parse_query_arguments.
+PARAMETERS_BY_OPTION = {
+    "--strategy": "strategy",
+    "--hybrid-search-fulltext-std-dev-factor": "hybrid_search_fulltext_std_dev_factor",
+    "--semantic-score-cutoff": "semantic_score_cutoff",
+}
+# argparse also accepted these, which only ever ended parsing
+HELP_OPTIONS = ["-h", "--help"]
+NEGATIVE_NUMBER_PATTERN = re.compile(r"^-\d+$|^-\d*\.\d+$")
+# Characters shlex treats specially, apart from whitespace
+SHELL_QUOTING_CHARACTERS = set("'\"\\")
+SHELL_WHITESPACE_PATTERN = re.compile(r"[ \t\r\n]+")
+
+# Kinds of arguments
+KEYWORD = "keyword"
+OPTION = "option"
+SEPARATOR = "separator"
+
+
+class InvalidQueryArgumentsException(Exception):
+    pass
+
+
+def split_query_string(query_string: str) -> List[str]:
+    """
+    Same as shlex.split, which is only needed for queries using quotes or
+    escapes.
+    """
+    if SHELL_QUOTING_CHARACTERS.isdisjoint(query_string):
+        return [
+            argument
+            for argument in SHELL_WHITESPACE_PATTERN.split(query_string)
+            if argument != ""
+        ]
+    return shlex.split(query_string)
+
+
+def get_argument_kind(argument: str) -> Tuple[str, str | None, str | None]:
+    """
+    Kind of an argument, with the option it names and its inline value for
+    options, following argparse: options can be abbreviated to any
+    unambiguous prefix, and negative numbers are not options.
+    """
+    if argument == "" or argument[0] != "-" or len(argument) == 1:
+        return KEYWORD, None, None
+    if argument in PARAMETERS_BY_OPTION or argument in HELP_OPTIONS:
+        return OPTION, argument, None
+
+    option_prefix, equals, value = argument.partition("=")
+    if option_prefix in PARAMETERS_BY_OPTION:
+        return OPTION, option_prefix, value
+
+    if argument.startswith("--"):
+        options = [
+            option
+            for option in [*PARAMETERS_BY_OPTION, *HELP_OPTIONS]
+            if option.startswith(option_prefix)
+        ]
+        if len(options) > 1:
+            raise InvalidQueryArgumentsException(f"ambiguous option: {argument}")
+        if len(options) == 1:
+            return OPTION, options[0], value if equals else None
+
+    if NEGATIVE_NUMBER_PATTERN.match(argument) or " " in argument:
+        return KEYWORD, None, None
+    # Unknown option, or argparse's short option for help
+    return OPTION, None, None
+
+
+def parse_query_arguments(arguments: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Keywords and option values, by parameter, of the given arguments.
+
+    Follows the argparse parser this replaces, which took a single group
+    of keywords anywhere among the options, and only keywords after `--`.
+    """
+    kinds: List[Tuple[str, str | None, str | None]] = []
+    for position, argument in enumerate(arguments):
+        if argument == "--":
+            kinds.append((SEPARATOR, None, None))
+            kinds.extend((KEYWORD, None, None) for _ in arguments[position + 1 :])
+            break
+        kinds.append(get_argument_kind(argument))
+
+    keywords: List[str] | None = None
+    values_by_parameter: Dict[str, str] = {}
+    position = 0
+    while position < len(arguments):
+        kind, option, value = kinds[position]
+
+        if kind != OPTION:
+            if keywords is not None:
+                raise InvalidQueryArgumentsException(
+                    f"unrecognized arguments: {arguments[position]}"
+                )
+            end = position
+            while end < len(arguments) and kinds[end][0] != OPTION:
+                end += 1
+            keywords = arguments[position:end]
+            # argparse drops the first separator
+            if "--" in keywords:
+                keywords.remove("--")
+            position = end
+            continue
+
+        if option is None or option in HELP_OPTIONS:
+            raise InvalidQueryArgumentsException(
+                f"unrecognized arguments: {arguments[position]}"
+            )
+        if value is None:
+            if position + 1 == len(arguments) or kinds[position + 1][0] != KEYWORD:
+                raise InvalidQueryArgumentsException(
+                    f"argument {option}: expected one argument"
+                )
+            position += 1
+            value = arguments[position]
+        values_by_parameter[PARAMETERS_BY_OPTION[option]] = value
+        position += 1
+
+    return keywords or [], values_by_parameter
+
+
+# Parsed queries, by query string and defaults
+search_params_cache: LRUCache[Tuple[str, int, float], SearchParams] = LRUCache(
+    max_size=10000
+)
+
+
 class SearchQuery:
     def __init__(
         self,
@@ -20,24 +154,31 @@ class SearchQuery:
     ):
         self.query_string = query_string
 
-        parser = argparse.ArgumentParser()
-        parser.add_argument("keywords", nargs="*")
-        parser.add_argument("--strategy", default="hybrid")
-        parser.add_argument(
-            "--hybrid-search-fulltext-std-dev-factor",
-            default=default_hybrid_search_fulltext_std_dev_factor,
-        )
-        parser.add_argument(
-            "--semantic-score-cutoff",
-            default=default_semantic_score_cutoff,
+        cache_key = (
+            query_string,
+            default_hybrid_search_fulltext_std_dev_factor,
+            default_semantic_score_cutoff,
         )
+        params = search_params_cache.get(cache_key)
+        if params is None:
+            try:
+                keywords, values_by_parameter = parse_query_arguments(
+                    split_query_string(query_string)
+                )
+            except InvalidQueryArgumentsException:
+                raise Exception('Invalid search query: "%s"' % query_string)
 
-        try:
-            self.params = SearchParams(
-                **vars(parser.parse_args(shlex.split(query_string)))
+            params = SearchParams(
+                **{
+                    "keywords": keywords,
+                    "strategy": "hybrid",
+                    "hybrid_search_fulltext_std_dev_factor": default_hybrid_search_fulltext_std_dev_factor,
+                    "semantic_score_cutoff": default_semantic_score_cutoff,
+                    **values_by_parameter,
+                }
             )
-        except SystemExit:
-            raise Exception('Invalid search query: "%s"' % query_string)
+            search_params_cache.put(cache_key, params)
+        self.params = params
 
         if len(self.params.keywords) == 0:
             raise Exception("Invalid search query: is empty")
@@ -46,6 +187,64 @@ class SearchQuery:
     def string(self) -> str:
         return " ".join(self.params.keywords)
 
+    @property
+    def cache_key(self) -> Tuple[str, int, float, str]:
+        """
+        Queries that differ only in keyword case and whitespace have the same
+        key, as both search engines ignore those differences.
+        """
+        return (
+            self.params.strategy,
+            self.params.hybrid_search_fulltext_std_dev_factor,
+            self.params.semantic_score_cutoff,
+            " ".join(self.string.lower().split()),
+        )
+
     @property
     def is_valid(self) -> bool:
         return len(self.params.keywords) > 0
+
+
+@dataclass(frozen=True)
+class SearchCursor:
+    """
+    Position of a page of search results. Encoded into an opaque token that
+    carries the query, so that any worker can serve the next page, and the
+    data generation it was ranked in, since positions in another generation
+    do not line up.
+    """
+
+    query_string: str
+    generation_id: str
+    offset: int
+    limit: int
+
+    def encode(self) -> str:
+        payload = json.dumps(
+            [self.query_string, self.generation_id, self.offset, self.limit]
+        )
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> Self:
+        try:
+            query_string, generation_id, offset, limit = json.loads(
+                base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            )
+        except (binascii.Error, ValueError, TypeError):
+            raise Exception("Invalid search cursor")
+        if (
+            not isinstance(query_string, str)
+            or not isinstance(generation_id, str)
+            or not isinstance(offset, int)
+            or not isinstance(limit, int)
+            or offset < 0
+            or limit < 1
+        ):
+            raise Exception("Invalid search cursor")
+        return cls(
+            query_string=query_string,
+            generation_id=generation_id,
+            offset=offset,
+            limit=limit,
+        )
@@ -1,16 +1,185 @@
+import os
 import time
 import logging
+import threading
+import numpy as np
 from langchain.vectorstores import Chroma
-from typing import List
+from typing import Iterable, Iterator, List
+from langchain.embeddings.base import Embeddings
 from langchain.embeddings.sentence_transformer import SentenceTransformerEmbeddings
-from src.util import InputDocument
+from src.cache import LRUCache
+from src.embedding_cache import EmbeddingCache
+from src.embedding_service import EmbeddingClient
+from src.util import InputDocument, iter_batches
 from src.search import SearchEngine, SearchEngineResult, SearchType
 
-embedding_function = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+_embedding_function: SentenceTransformerEmbeddings | None = None
+_embedding_function_lock = threading.Lock()
+
+
+def get_embedding_function() -> SentenceTransformerEmbeddings:
+    """
+    The embedding model, loaded on first use. Importing sentence-transformers
+    and loading the model take seconds, which processes that never embed
+    locally, such as HTTP workers using the embedding service, do not pay.
+    """
+    global _embedding_function
+    if _embedding_function is None:
+        with _embedding_function_lock:
+            if _embedding_function is None:
+                _embedding_function = SentenceTransformerEmbeddings(
+                    model_name=EMBEDDING_MODEL_NAME
+                )
+    return _embedding_function
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Handed to Chroma in place of the model, so that opening a collection
+    does not load it.
+    """
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return get_embedding_function().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return get_embedding_function().embed_query(text)
+
+
+# Upper bound on the number of records sent to Chroma in a single call
+CHROMA_MAX_BATCH_SIZE = 5000
+
+# Documents embedded together when indexing a stream of them, large enough
+# for a pool of embedding processes to pay off
+INDEX_BATCH_SIZE = 2048
+
+
+def embed_documents(
+    texts: List[str],
+    batch_size: int = 32,
+    processes: int = 1,
+    cache: EmbeddingCache | None = None,
+) -> np.ndarray:
+    """
+    Embed texts in batches, optionally spread across a pool of CPU
+    processes. Texts are sorted by length first, so that each batch holds
+    texts of similar length and little compute is wasted on padding.
+
+    When a cache is given, only the texts missing from it are embedded.
+    """
+    # Same preprocessing as SentenceTransformerEmbeddings.embed_documents
+    texts = [text.replace("\n", " ") for text in texts]
+    if cache is None:
+        return _embed_texts(texts, batch_size, processes)
+
+    cached_embeddings_by_position, missing_positions = cache.get_many(texts)
+    logging.info(
+        "found %d of %d document embeddings in cache",
+        len(cached_embeddings_by_position),
+        len(texts),
+    )
+
+    missing_texts = [texts[i] for i in missing_positions]
+    missing_embeddings = _embed_texts(missing_texts, batch_size, processes)
+    cache.put_many(missing_texts, missing_embeddings)
+
+    embeddings = np.empty(
+        (len(texts), cache.get_dimensions() or missing_embeddings.shape[1]),
+        dtype=np.float32,
+    )
+    for position, embedding in cached_embeddings_by_position.items():
+        embeddings[position] = embedding
+    if len(missing_positions) > 0:
+        embeddings[missing_positions] = missing_embeddings
+    return embeddings
+
+
+def _embed_texts(texts: List[str], batch_size: int, processes: int) -> np.ndarray:
+    if len(texts) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+
+    start_time = time.perf_counter()
+
+    model = get_embedding_function().client
+    length_sorted_indices = np.argsort([len(text) for text in texts], kind="stable")
+    sorted_texts = [texts[i] for i in length_sorted_indices]
+
+    # Starting a pool means loading the model once per process, which only
+    # pays off if every process gets several batches
+    if processes > 1 and len(texts) > batch_size * processes:
+        pool = _start_cpu_pool(model, processes)
+        try:
+            sorted_embeddings = model.encode_multi_process(
+                sorted_texts,
+                pool,
+                batch_size=batch_size,
+                chunk_size=max(batch_size, len(texts) // (processes * 4)),
+            )
+        finally:
+            model.stop_multi_process_pool(pool)
+    else:
+        sorted_embeddings = model.encode(sorted_texts, batch_size=batch_size)
+
+    embeddings = np.empty_like(sorted_embeddings)
+    embeddings[length_sorted_indices] = sorted_embeddings
+
+    elapsed = time.perf_counter() - start_time
+    logging.info(
+        "embedded %d documents in %.2f seconds (%.1f docs/sec) with %d process(es)",
+        len(texts),
+        elapsed,
+        len(texts) / elapsed if elapsed > 0 else 0,
+        processes,
+    )
+    return embeddings
+
+
+def _start_cpu_pool(model, processes: int) -> dict:
+    # Each worker would otherwise run as many threads as there are cores,
+    # oversubscribing the CPU `processes` times over. Workers are spawned, so
+    # they take their thread count from the environment when importing torch
+    threads_per_process = max(1, (os.cpu_count() or 1) // processes)
+    previous_omp_num_threads = os.environ.get("OMP_NUM_THREADS")
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_process)
+    try:
+        return model.start_multi_process_pool(target_devices=["cpu"] * processes)
+    finally:
+        if previous_omp_num_threads is None:
+            del os.environ["OMP_NUM_THREADS"]
+        else:
+            os.environ["OMP_NUM_THREADS"] = previous_omp_num_threads
+
+
+def normalize_query_string(query_string: str) -> str:
+    # The model is uncased and ignores whitespace, so these variations
+    # produce the same embedding
+    return " ".join(query_string.lower().split())
 
 
 class SemanticSearchEngine(SearchEngine):
     db: Chroma
+    # Relative to the persist directory
+    persisted_filenames = ["chroma.sqlite3"]
+
+    def __init__(
+        self,
+        query_embedding_cache: LRUCache[str, List[float]] | None = None,
+        embedding_batch_size: int = 32,
+        embedding_processes: int = 1,
+        document_embedding_cache: EmbeddingCache | None = None,
+        embedding_client: EmbeddingClient | None = None,
+    ):
+        # May be shared across engines, since query embeddings do not depend
+        # on the indexed documents
+        self.query_embedding_cache = query_embedding_cache
+        # When given, queries are embedded by the embedding service instead
+        # of a model loaded in this process
+        self.embedding_client = embedding_client
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_processes = embedding_processes
+        self.document_embedding_cache = document_embedding_cache
 
     def load(self, persist_directory: str) -> None:
         logging.debug(
@@ -19,7 +188,7 @@ class SemanticSearchEngine(SearchEngine):
 
         persisted_db = Chroma(
             persist_directory=persist_directory,
-            embedding_function=embedding_function,
+            embedding_function=LazyEmbeddings(),
             # Prevents negative scores and consequent UserWarning. See https://github.com/langchain-ai/langchain/issues/10864
             collection_metadata={"hnsw:space": "cosine"},
         )
@@ -36,42 +205,135 @@ class SemanticSearchEngine(SearchEngine):
 
     def index(
         self,
-        project_docs: List[InputDocument],
+        project_docs: Iterable[InputDocument],
         persist_directory: str | None = None,
     ) -> None:
-        start_time = time.perf_counter()
+        for _ in self.iter_indexing(project_docs, persist_directory):
+            pass
 
-        raw_documents = [project_document.document for project_document in project_docs]
+    def iter_indexing(
+        self,
+        project_docs: Iterable[InputDocument],
+        persist_directory: str | None = None,
+    ) -> Iterator[InputDocument]:
+        """
+        Pass documents through, indexing them in batches as they go, so that
+        only a batch of them and of their embeddings is held at a time. The
+        index is complete once every document went through.
+        """
+        start_time = time.perf_counter()
 
-        self.db = Chroma.from_documents(
-            documents=raw_documents,
-            embedding=embedding_function,
-            ids=[doc.metadata["application_ref"] for doc in raw_documents],
+        self.db = Chroma(
             persist_directory=persist_directory,
+            embedding_function=LazyEmbeddings(),
             # Prevents negative scores and consequent UserWarning. See https://github.com/langchain-ai/langchain/issues/10864
             collection_metadata={"hnsw:space": "cosine"},
         )
+        indexed_count = 0
+        for batch in iter_batches(project_docs, INDEX_BATCH_SIZE):
+            self._upsert(batch)
+            indexed_count += len(batch)
+            yield from batch
 
         logging.debug(
             "indexed %d projects in %.2f seconds with chroma",
+            indexed_count,
+            time.perf_counter() - start_time,
+        )
+
+        self.db.persist()
+
+    def update(
+        self, project_docs: List[InputDocument], deleted_refs: List[str]
+    ) -> None:
+        start_time = time.perf_counter()
+
+        if len(project_docs) > 0:
+            # Chroma upserts by id, so changed documents replace their
+            # previous version instead of being duplicated
+            self._upsert(project_docs)
+        if len(deleted_refs) > 0:
+            self.db.delete(ids=deleted_refs)
+
+        logging.debug(
+            "updated %d and deleted %d projects in %.2f seconds with chroma",
             len(project_docs),
+            len(deleted_refs),
             time.perf_counter() - start_time,
         )
 
         self.db.persist()
 
     def search(
-        self, query_string: str, min_score: float = 0.35
+        self, query_string: str, min_score: float = 0.35, k: int = 100
     ) -> List[SearchEngineResult]:
+        relevance_score_fn = self.db._select_relevance_score_fn()
         return [
             SearchEngineResult(
                 ref=raw_doc.metadata["application_ref"],
                 score=score,
                 type=SearchType.semantic,
             )
-            for raw_doc, score in self.db.similarity_search_with_relevance_scores(
-                query_string,
-                k=100,
+            for raw_doc, score in (
+                (raw_doc, relevance_score_fn(distance))
+                for raw_doc, distance in self.db.similarity_search_by_vector_with_relevance_scores(
+                    self.embed_query(query_string),
+                    k=k,
+                )
             )
             if score > min_score
         ]
+
+    def embed_query(self, query_string: str) -> List[float]:
+        if self.query_embedding_cache is None:
+            return self._embed_query(query_string)
+
+        key = normalize_query_string(query_string)
+        embedding = self.query_embedding_cache.get(key)
+        if embedding is None:
+            embedding = self._embed_query(key)
+            self.query_embedding_cache.put(key, embedding)
+        return embedding
+
+    def warm_up(self) -> None:
+        """
+        Embeds a query, so that the first search does not pay for loading
+        the model or for the first inference.
+        """
+        self._embed_query("warm up")
+
+    def embed_documents(self, project_docs: List[InputDocument]) -> np.ndarray:
+        return embed_documents(
+            [doc.document.page_content for doc in project_docs],
+            batch_size=self.embedding_batch_size,
+            processes=self.embedding_processes,
+            cache=self.document_embedding_cache,
+        )
+
+    def _embed_query(self, query_string: str) -> List[float]:
+        if self.embedding_client is not None:
+            try:
+                return self.embedding_client.embed_query(query_string)
+            except (ConnectionError, FileNotFoundError) as e:
+                # Searches keep working without the service, at the cost of
+                # loading the model in this process
+                logging.warning(
+                    "embedding service unavailable (%s), embedding query in process",
+                    e,
+                )
+        return get_embedding_function().embed_query(query_string)
+
+    def _upsert(self, project_docs: List[InputDocument]) -> None:
+        raw_documents = [project_document.document for project_document in project_docs]
+        embeddings = self.embed_documents(project_docs).tolist()
+
+        for start in range(0, len(raw_documents), CHROMA_MAX_BATCH_SIZE):
+            end = start + CHROMA_MAX_BATCH_SIZE
+            self.db._collection.upsert(
+                ids=[
+                    doc.metadata["application_ref"] for doc in raw_documents[start:end]
+                ],
+                embeddings=embeddings[start:end],
+                metadatas=[doc.metadata for doc in raw_documents[start:end]],
+                documents=[doc.page_content for doc in raw_documents[start:end]],
+            )
@@ -0,0 +1,164 @@
+import json
+import os
+import time
+import logging
+import numpy as np
+from os import path
+from typing import Iterable, Iterator, List, Literal
+from src.cache import LRUCache
+from src.embedding_cache import EmbeddingCache
+from src.embedding_service import EmbeddingClient
+from src.util import InputDocument, iter_batches
+from src.search import SearchEngineResult, SearchType
+from src.search_semantic import INDEX_BATCH_SIZE, SemanticSearchEngine
+
+
+class NumpySemanticSearchEngine(SemanticSearchEngine):
+    """
+    Exact cosine similarity search over a contiguous matrix of normalized
+    embeddings. Only ids and embeddings are stored. A persisted index is
+    memory-mapped rather than read into memory.
+    """
+
+    ids: List[str]
+    embeddings: np.ndarray
+    persisted_filenames = ["embeddings.npy", "ids.json"]
+
+    def __init__(
+        self,
+        query_embedding_cache: LRUCache[str, List[float]] | None = None,
+        embedding_batch_size: int = 32,
+        embedding_processes: int = 1,
+        document_embedding_cache: EmbeddingCache | None = None,
+        embedding_client: EmbeddingClient | None = None,
+        dtype: Literal["float32", "float16"] = "float32",
+    ):
+        super().__init__(
+            query_embedding_cache=query_embedding_cache,
+            embedding_batch_size=embedding_batch_size,
+            embedding_processes=embedding_processes,
+            document_embedding_cache=document_embedding_cache,
+            embedding_client=embedding_client,
+        )
+        self.dtype = dtype
+
+    def load(self, persist_directory: str) -> None:
+        logging.debug("attempting to load embeddings from %s", persist_directory)
+
+        with open(path.join(persist_directory, "ids.json")) as file:
+            self.ids = json.load(file)
+        self.embeddings = np.load(
+            path.join(persist_directory, "embeddings.npy"), mmap_mode="r"
+        )
+
+        if len(self.ids) == 0 or len(self.ids) != self.embeddings.shape[0]:
+            raise Exception(f"Could not load embeddings from {persist_directory}")
+        else:
+            logging.debug("embeddings loaded from %s", persist_directory)
+
+        self.persist_directory = persist_directory
+
+    def iter_indexing(
+        self,
+        project_docs: Iterable[InputDocument],
+        persist_directory: str | None = None,
+    ) -> Iterator[InputDocument]:
+        start_time = time.perf_counter()
+
+        ids: List[str] = []
+        embedding_batches: List[np.ndarray] = []
+        for batch in iter_batches(project_docs, INDEX_BATCH_SIZE):
+            ids += [doc.document.metadata["application_ref"] for doc in batch]
+            embedding_batches.append(self._embed_normalized(batch))
+            yield from batch
+
+        self.ids = ids
+        self.embeddings = (
+            np.concatenate(embedding_batches)
+            if len(embedding_batches) > 0
+            else np.empty((0, 0), dtype=self.dtype)
+        )
+
+        logging.debug(
+            "indexed %d projects in %.2f seconds with numpy",
+            len(ids),
+            time.perf_counter() - start_time,
+        )
+
+        self.persist_directory = persist_directory
+        self._persist()
+
+    def update(
+        self, project_docs: List[InputDocument], deleted_refs: List[str]
+    ) -> None:
+        start_time = time.perf_counter()
+
+        replaced_refs = set(deleted_refs) | set(
+            doc.document.metadata["application_ref"] for doc in project_docs
+        )
+        kept_rows = [i for i, ref in enumerate(self.ids) if ref not in replaced_refs]
+
+        self.ids = [self.ids[i] for i in kept_rows] + [
+            doc.document.metadata["application_ref"] for doc in project_docs
+        ]
+        self.embeddings = self.embeddings[kept_rows]
+        if len(project_docs) > 0:
+            self.embeddings = np.concatenate(
+                [self.embeddings, self._embed_normalized(project_docs)]
+            )
+
+        logging.debug(
+            "updated %d and deleted %d projects in %.2f seconds with numpy",
+            len(project_docs),
+            len(deleted_refs),
+            time.perf_counter() - start_time,
+        )
+
+        self._persist()
+
+    def search(
+        self, query_string: str, min_score: float = 0.35, k: int = 100
+    ) -> List[SearchEngineResult]:
+        query_embedding = np.asarray(self.embed_query(query_string), dtype=np.float32)
+        query_embedding /= np.linalg.norm(query_embedding)
+        scores = self.embeddings @ query_embedding.astype(self.embeddings.dtype)
+
+        if len(scores) > k:
+            top_rows = np.argpartition(-scores, k)[:k]
+        else:
+            top_rows = np.arange(len(scores))
+        top_rows = top_rows[np.argsort(-scores[top_rows], kind="stable")]
+
+        return [
+            SearchEngineResult(
+                ref=self.ids[row],
+                score=float(scores[row]),
+                type=SearchType.semantic,
+            )
+            for row in top_rows
+            if scores[row] > min_score
+        ]
+
+    def _embed_normalized(self, project_docs: List[InputDocument]) -> np.ndarray:
+        embeddings = self.embed_documents(project_docs).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings.astype(self.dtype)
+
+    def _persist(self) -> None:
+        if self.persist_directory is None:
+            return
+
+        os.makedirs(self.persist_directory, exist_ok=True)
+        embeddings_filename = path.join(self.persist_directory, "embeddings.npy")
+        with open(embeddings_filename + ".tmp", "wb") as file:
+            np.save(file, np.ascontiguousarray(self.embeddings))
+        os.replace(embeddings_filename + ".tmp", embeddings_filename)
+
+        ids_filename = path.join(self.persist_directory, "ids.json")
+        with open(ids_filename + ".tmp", "w") as file:
+            json.dump(self.ids, file)
+        os.replace(ids_filename + ".tmp", ids_filename)
+
+        # Serve from the persisted copy, so that it is shared through the
+        # page cache instead of held in process memory
+        self.embeddings = np.load(embeddings_filename, mmap_mode="r")
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import Executor
+from typing import Dict, List, Sequence
+from strip_markdown import strip_markdown
+
+# TODO lift to configuration
+MAX_SUMMARY_TEXT_LENGTH = 300
+
+
+def get_summary_text(description: str) -> str:
+    description_plain = strip_markdown(description)
+    summary_text = description_plain[:MAX_SUMMARY_TEXT_LENGTH]
+    if len(description_plain) > MAX_SUMMARY_TEXT_LENGTH:
+        summary_text = summary_text + "..."
+    return summary_text
+
+
+class SummaryTextCache:
+    """
+    Persistent cache of summary texts, keyed by a hash of the description
+    they were rendered from, so that unchanged descriptions are not rendered
+    again by later ingests, including after a restart.
+
+    Saving only keeps the entries used since the previous save, so the
+    cache does not outgrow the current dataset.
+    """
+
+    def __init__(self, filename: str | None = None):
+        self.filename = filename
+        self._summary_texts_by_key: Dict[str, str] = {}
+        self._used_keys: set[str] = set()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._summary_texts_by_key)
+
+    def get(self, description: str) -> str | None:
+        key = self._get_key(description)
+        summary_text = self._summary_texts_by_key.get(key)
+        if summary_text is not None:
+            self._used_keys.add(key)
+        return summary_text
+
+    def put(self, description: str, summary_text: str) -> None:
+        key = self._get_key(description)
+        self._summary_texts_by_key[key] = summary_text
+        self._used_keys.add(key)
+
+    def save(self) -> None:
+        self._summary_texts_by_key = {
+            key: summary_text
+            for key, summary_text in self._summary_texts_by_key.items()
+            if key in self._used_keys
+        }
+        self._used_keys = set()
+        if self.filename is None:
+            return
+
+        with open(self.filename + ".tmp", "w") as file:
+            json.dump(self._summary_texts_by_key, file)
+        os.replace(self.filename + ".tmp", self.filename)
+
+    def _load(self) -> None:
+        if self.filename is None or not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename) as file:
+                self._summary_texts_by_key = json.load(file)
+        except ValueError as e:
+            logging.warning("ignoring unreadable %s: %s", self.filename, e)
+
+    def _get_key(self, description: str) -> str:
+        # Summaries depend on the length they are truncated to
+        return hashlib.sha256(
+            f"{MAX_SUMMARY_TEXT_LENGTH}\0{description}".encode("utf-8")
+        ).hexdigest()
+
+
+def get_summary_texts(
+    descriptions: Sequence[str],
+    cache: SummaryTextCache | None = None,
+    executor: Executor | None = None,
+) -> List[str]:
+    """
+    Summary texts of the given descriptions. Descriptions missing from the
+    cache are rendered once each, split in chunks across the executor's
+    processes when one is given.
+    """
+    summary_texts_by_description: Dict[str, str] = {}
+    missing_descriptions: Dict[str, None] = {}
+    for description in descriptions:
+        summary_text = None if cache is None else cache.get(description)
+        if summary_text is None:
+            missing_descriptions[description] = None
+        else:
+            summary_texts_by_description[description] = summary_text
+
+    if executor is None:
+        rendered_summary_texts = map(get_summary_text, missing_descriptions)
+    else:
+        # A few chunks per process balances the load without paying for
+        # one round trip per description
+        rendered_summary_texts = executor.map(
+            get_summary_text,
+            missing_descriptions,
+            chunksize=max(1, len(missing_descriptions) // 16),
+        )
+    for description, summary_text in zip(missing_descriptions, rendered_summary_texts):
+        summary_texts_by_description[description] = summary_text
+        if cache is not None:
+            cache.put(description, summary_text)
+
+    return [summary_texts_by_description[description] for description in descriptions]
@@ -0,0 +1,27 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class PhaseTimer:
+    """
+    Records how long each phase of a longer operation, such as a worker's
+    startup, takes. Phases are reported in the order they were recorded.
+    """
+
+    def __init__(self):
+        self.seconds_by_phase: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start_time)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.seconds_by_phase[name] = self.seconds_by_phase.get(name, 0) + seconds
+
+    def get_total_seconds(self) -> float:
+        return sum(self.seconds_by_phase.values())
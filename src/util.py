@@ -1,12 +1,20 @@
 import re
+import codecs
+import itertools
+import json
+import logging
+import socket
 from eth_utils.address import to_checksum_address
 from urllib.parse import urljoin
 from langchain.schema import Document
-from typing import List, Self
+from src.application_summaries import ApplicationSummary
+from typing import Any, Iterable, Iterator, List, Self, TypeVar
 from dataclasses import dataclass
 from pythonjsonlogger import jsonlogger
 from pythonjsonlogger.jsonlogger import JsonFormatter
 
+T = TypeVar("T")
+
 
 class InvalidInputDocumentException(Exception):
     pass
@@ -14,8 +22,15 @@ class InvalidInputDocumentException(Exception):
 
 # Wrap a Document to carry validity information together with the type
 class InputDocument:
-    def __init__(self, document: Document):
-        if (
+    __slots__ = ("document", "application_summary")
+
+    def __init__(
+        self,
+        document: Document,
+        application_summary: ApplicationSummary | None = None,
+    ):
+        # Documents that come with their summary were validated with it
+        if application_summary is not None or (
             isinstance(document.metadata.get("application_ref"), str)
             and isinstance(document.metadata.get("name"), str)
             and isinstance(document.metadata.get("website_url"), str)
@@ -27,6 +42,7 @@ class InputDocument:
             and document.page_content is not None
         ):
             self.document = document
+            self.application_summary = application_summary
         else:
             raise InvalidInputDocumentException(
                 document.metadata.get("application_ref")
@@ -75,6 +91,65 @@ def get_applications_file_url_from_application_file_locator(
     )
 
 
+def iter_json_array_items(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Incrementally decode a JSON array from a stream of UTF-8 encoded
+    chunks, yielding its items one at a time. Only one item is held in
+    memory at any time, in addition to the current chunk.
+    """
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+
+    def skip_separators(position: int) -> int:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        return position
+
+    for chunk in chunks:
+        buffer += utf8_decoder.decode(chunk)
+        position = skip_separators(0)
+
+        if not started:
+            if position == len(buffer):
+                continue
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            position = skip_separators(position + 1)
+
+        while position < len(buffer):
+            if buffer[position] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Item continues in the next chunk
+                break
+            if isinstance(item, (int, float)) and (
+                end == len(buffer) or buffer[end] not in " \t\r\n,]"
+            ):
+                # Numbers are not self-delimiting, this one might continue
+                # in the next chunk
+                break
+            yield item
+            position = skip_separators(end)
+
+        buffer = buffer[position:]
+
+    raise ValueError("Unterminated JSON array")
+
+
+def iter_batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+
 def get_json_log_formatter(hostname: str, deployment_environment: str) -> JsonFormatter:
     return jsonlogger.JsonFormatter(
         # TODO: add `created` as Unix time in milliseconds (the available
@@ -87,3 +162,22 @@ def get_json_log_formatter(hostname: str, deployment_environment: str) -> JsonFo
             "service": f"search-{deployment_environment}",
         },
     )
+
+
+def setup_json_logging(log_level: str, deployment_environment: str) -> None:
+    """
+    Log in JSON to stderr from the root logger. Replaces the handlers already
+    installed, so that a spawned process that re-imports the main module
+    does not log every line twice.
+    """
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(
+        get_json_log_formatter(
+            hostname=socket.gethostname(),
+            deployment_environment=deployment_environment,
+        ),
+    )
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+    root_logger.handlers.clear()
+    root_logger.addHandler(log_handler)
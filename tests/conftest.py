@@ -1,7 +1,17 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import copy
+import hashlib
+import json
 import os
+import threading
+import time
 from typing import List, Dict
-from src.data import InputDocument, deprecated_load_input_documents_from_projects_json
+from src.data import (
+    InputDocument,
+    deprecated_load_input_documents_from_projects_json,
+    load_input_documents_from_file,
+)
 import pytest
 import logging
 from src.data import ApplicationSummary
@@ -31,6 +41,92 @@ class SearchEnginesFixture:
     fulltext: FullTextSearchEngine
 
 
+@dataclass
+class FakeIndexer:
+    base_url: str
+    files_by_path: Dict[str, bytes] = field(default_factory=dict)
+    # Number of times a path should answer 503 before succeeding
+    failures_by_path: Dict[str, int] = field(default_factory=dict)
+    delay_seconds: float = 0
+    requested_paths: List[str] = field(default_factory=list)
+    # Paths of the responses that were not answered with 304
+    downloaded_paths: List[str] = field(default_factory=list)
+
+
+@pytest.fixture
+def fake_indexer():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            indexer.requested_paths.append(self.path)
+            time.sleep(indexer.delay_seconds)
+            if indexer.failures_by_path.get(self.path, 0) > 0:
+                indexer.failures_by_path[self.path] -= 1
+                self._respond(503, b"")
+            elif self.path in indexer.files_by_path:
+                body = indexer.files_by_path[self.path]
+                etag = '"%s"' % hashlib.sha256(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self._respond(304, b"", etag)
+                else:
+                    indexer.downloaded_paths.append(self.path)
+                    self._respond(200, body, etag)
+            else:
+                self._respond(404, b"")
+
+        def _respond(self, status: int, body: bytes, etag: str | None = None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if etag is not None:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    indexer = FakeIndexer(base_url=f"http://127.0.0.1:{server.server_address[1]}")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield indexer
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="session")
+def _aggregated_applications() -> List[dict]:
+    with open(
+        os.path.join(
+            os.path.dirname(__file__),
+            "fixtures/preprocessed_aggregated_applications.json",
+        )
+    ) as file:
+        applications = json.load(file)
+    # Fields required by ApplicationSummary that predate the fixture
+    for application in applications:
+        application.setdefault("roundName", "Dummy Round Name")
+        application.setdefault("anchorAddress", "0x123")
+    return applications
+
+
+@pytest.fixture
+def aggregated_applications(_aggregated_applications: List[dict]) -> List[dict]:
+    return copy.deepcopy(_aggregated_applications)
+
+
+@pytest.fixture(scope="session")
+def application_input_documents(
+    _aggregated_applications: List[dict], tmp_path_factory
+) -> List[InputDocument]:
+    filename = tmp_path_factory.mktemp("fixtures") / "applications_aggregate.json"
+    with open(filename, "w") as file:
+        json.dump(_aggregated_applications, file)
+    return load_input_documents_from_file(str(filename))
+
+
 @pytest.fixture(scope="session")
 def input_documents() -> List[InputDocument]:
     return deprecated_load_input_documents_from_projects_json(
@@ -0,0 +1,211 @@
+import copy
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+from typing import Iterator, List
+import pytest
+from fastapi.testclient import TestClient
+from src.data import (
+    Data,
+    get_fulltext_search_engine_factory,
+    get_semantic_search_engine_factory,
+)
+from src.search_query import SearchCursor
+
+
+@pytest.fixture(scope="module")
+def storage_dir(_aggregated_applications: List[dict], tmp_path_factory) -> str:
+    storage_dir = str(tmp_path_factory.mktemp("storage"))
+    source_dataset_filename = os.path.join(storage_dir, "applications_aggregate.json")
+    with open(source_dataset_filename, "w") as file:
+        json.dump(_aggregated_applications, file)
+    Data.ingest_from_file_and_persist(
+        source_dataset_filename=source_dataset_filename,
+        storage_dir=storage_dir,
+        first_run=True,
+        semantic_search_engine_factory=get_semantic_search_engine_factory("numpy"),
+        fulltext_search_engine_factory=get_fulltext_search_engine_factory("bm25"),
+    )
+    return storage_dir
+
+
+@pytest.fixture(scope="module")
+def app_module(storage_dir: str) -> Iterator[ModuleType]:
+    # The app is configured from the environment when imported
+    with pytest.MonkeyPatch.context() as m:
+        m.setenv("STORAGE_DIR", storage_dir)
+        m.setenv("APPLICATION_FILES_LOCATORS", "")
+        m.setenv("DEPLOYMENT_ENVIRONMENT", "test")
+        m.setenv("LOG_LEVEL", "INFO")
+        m.setenv("SEMANTIC_SEARCH_BACKEND", "numpy")
+        m.setenv("FULLTEXT_SEARCH_BACKEND", "bm25")
+        m.setenv("MAX_SEARCH_RESULTS", "10")
+        import src.app
+
+        yield src.app
+
+
+@pytest.fixture(scope="module")
+def client(app_module: ModuleType) -> Iterator[TestClient]:
+    with TestClient(app_module.app) as client:
+        deadline = time.monotonic() + 60
+        while client.get("/ready").status_code != 200:
+            assert time.monotonic() < deadline, "worker did not get ready"
+            time.sleep(0.1)
+        yield client
+
+
+def test_failed_startup_is_retried_on_reload(
+    app_module: ModuleType, client: TestClient, monkeypatch
+):
+    def failing_reload():
+        raise Exception("Storage is not mounted")
+
+    app_module.ready.clear()
+    with monkeypatch.context() as m:
+        m.setattr(app_module.data, "reload", failing_reload)
+        app_module.start_up()
+        assert client.get("/ready").status_code == 503
+
+        # Still failing
+        app_module.reload_data()
+        assert client.get("/ready").status_code == 503
+
+    app_module.reload_data()
+    assert client.get("/ready").status_code == 200
+
+
+def get_refs(response) -> List[str]:
+    return [r["data"]["applicationRef"] for r in response.json()["results"]]
+
+
+def test_search_is_paginated_by_cursor(client: TestClient):
+    params = {"q": "open source --strategy=fulltext"}
+    all_refs = get_refs(client.get("/search", params=params))
+    assert len(all_refs) == 10
+
+    refs = []
+    response = client.get("/search", params={**params, "limit": 4})
+    while True:
+        assert response.status_code == 200
+        refs += get_refs(response)
+        cursor = response.json()["nextCursor"]
+        if cursor is None:
+            break
+        response = client.get("/search", params={"cursor": cursor})
+
+    assert refs == all_refs
+
+
+@pytest.mark.parametrize("limit", [0, -1, 11])
+def test_search_rejects_invalid_limit(client: TestClient, limit: int):
+    response = client.get("/search", params={"q": "open source", "limit": limit})
+    assert response.status_code == 400
+    assert "Invalid limit" in response.json()["detail"]
+
+
+def test_search_rejects_invalid_cursor(client: TestClient):
+    response = client.get("/search", params={"cursor": "nope"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid search cursor"
+
+    # Made in a generation that has since been replaced
+    cursor = SearchCursor(
+        query_string="open source", generation_id="1", offset=4, limit=4
+    ).encode()
+    response = client.get("/search", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Search results changed, search again"
+
+
+def test_search_responses_are_cached(
+    app_module: ModuleType, client: TestClient, monkeypatch
+):
+    fulltext_search_engine = app_module.data.generation.fulltext_search_engine
+    searched_queries = []
+
+    def spy_search(query, **kwargs):
+        searched_queries.append(query)
+        return type(fulltext_search_engine).search(
+            fulltext_search_engine, query, **kwargs
+        )
+
+    monkeypatch.setattr(fulltext_search_engine, "search", spy_search)
+    params = {"q": "climate --strategy=fulltext", "limit": 5}
+
+    stats = app_module.search_result_cache.get_stats()
+    first_response = client.get("/search", params=params)
+    second_response = client.get("/search", params=params)
+
+    assert first_response.content == second_response.content
+    assert searched_queries == ["climate"]
+    assert app_module.search_result_cache.get_stats()["hits"] == stats["hits"] + 1
+    assert app_module.search_result_cache.get_stats()["misses"] == stats["misses"] + 1
+
+
+def test_identical_concurrent_searches_are_coalesced(
+    app_module: ModuleType, client: TestClient, monkeypatch
+):
+    fulltext_search_engine = app_module.data.generation.fulltext_search_engine
+    searched_queries = []
+
+    def slow_search(query, **kwargs):
+        searched_queries.append(query)
+        # Long enough for every request to arrive while searching
+        time.sleep(0.5)
+        return type(fulltext_search_engine).search(
+            fulltext_search_engine, query, **kwargs
+        )
+
+    monkeypatch.setattr(fulltext_search_engine, "search", slow_search)
+    params = {"q": "ethereum --strategy=fulltext", "limit": 5}
+
+    stats = app_module.search_single_flight.get_stats()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(
+            executor.map(lambda _: client.get("/search", params=params), range(4))
+        )
+
+    assert [r.status_code for r in responses] == [200] * 4
+    assert len({r.content for r in responses}) == 1
+    assert searched_queries == ["ethereum"]
+    assert app_module.search_single_flight.get_stats()["calls"] == stats["calls"] + 1
+    assert (
+        app_module.search_single_flight.get_stats()["coalesced"]
+        == stats["coalesced"] + 3
+    )
+
+
+def test_reload_to_new_generation_clears_search_caches(
+    app_module: ModuleType,
+    client: TestClient,
+    storage_dir: str,
+    _aggregated_applications: List[dict],
+):
+    params = {"q": "zyzzyva --strategy=fulltext"}
+    assert get_refs(client.get("/search", params=params)) == []
+    assert len(app_module.search_result_cache) > 0
+    assert len(app_module.ranking_cache) > 0
+
+    applications = copy.deepcopy(_aggregated_applications)
+    changed_application = applications[2]
+    changed_application["metadata"]["application"]["project"]["title"] = "Zyzzyva"
+    source_dataset_filename = os.path.join(storage_dir, "applications_aggregate.json")
+    with open(source_dataset_filename, "w") as file:
+        json.dump(applications, file)
+    Data.ingest_from_file_and_persist(
+        source_dataset_filename=source_dataset_filename,
+        storage_dir=storage_dir,
+        first_run=False,
+        semantic_search_engine_factory=get_semantic_search_engine_factory("numpy"),
+        fulltext_search_engine_factory=get_fulltext_search_engine_factory("bm25"),
+    )
+    app_module.reload_data()
+
+    assert len(app_module.search_result_cache) == 0
+    assert len(app_module.ranking_cache) == 0
+    assert get_refs(client.get("/search", params=params)) == [
+        f"10:{changed_application['roundId']}:{changed_application['id']}"
+    ]
@@ -0,0 +1,64 @@
+from typing import List
+from src.application_summaries import (
+    ApplicationSummary,
+    ApplicationSummaryStore,
+    validate_application_summaries,
+)
+from src.util import InputDocument
+
+
+def test_application_summary_store_round_trips_summaries(
+    application_input_documents: List[InputDocument], tmp_path
+):
+    summaries = [
+        ApplicationSummary.from_metadata(input_document.document.metadata)
+        for input_document in application_input_documents
+    ]
+    summaries[0] = summaries[0].model_copy(update={"logo_image_cid": None})
+    ApplicationSummaryStore.from_summaries(summaries).save(
+        str(tmp_path / "applications.bin")
+    )
+
+    store = ApplicationSummaryStore.load(str(tmp_path / "applications.bin"))
+
+    assert len(store) == len(summaries)
+    assert list(store) == [summary.application_ref for summary in summaries]
+    for summary in summaries:
+        assert summary.application_ref in store
+        assert store[summary.application_ref] == summary
+        assert store[summary.application_ref].model_dump_json(
+            by_alias=True
+        ) == summary.model_dump_json(by_alias=True)
+    assert "10:0x0:0" not in store
+    assert store.get("10:0x0:0") is None
+
+
+def test_validate_application_summaries_counts_invalid_records_by_reason(
+    application_input_documents: List[InputDocument],
+):
+    metadatas = [
+        dict(input_document.document.metadata)
+        for input_document in application_input_documents[:5]
+    ]
+    del metadatas[1]["round_name"]
+    metadatas[2]["name"] = None
+    metadatas[3]["chain_id"] = "ten"
+    del metadatas[4]["logo_image_cid"]
+
+    summaries, invalid_counts_by_reason = validate_application_summaries(metadatas)
+
+    assert [summary is not None for summary in summaries] == [
+        True,
+        False,
+        False,
+        False,
+        True,
+    ]
+    assert summaries[0] == ApplicationSummary.from_metadata(metadatas[0])
+    assert summaries[4] is not None and summaries[4].logo_image_cid is None
+    assert invalid_counts_by_reason == {
+        "round_name: missing": 1,
+        "name: string_type": 1,
+        "chain_id: int_parsing": 1,
+    }
+    assert validate_application_summaries(metadatas[:1]) == ([summaries[0]], {})
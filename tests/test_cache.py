@@ -0,0 +1,37 @@
+import time
+from src.cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used_entry():
+    cache: LRUCache[str, int] = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_expires_entries():
+    cache: LRUCache[str, int] = LRUCache(max_size=2, ttl_seconds=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_counts_hits_and_misses():
+    cache: LRUCache[str, int] = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 2 / 3
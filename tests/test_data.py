@@ -1,8 +1,23 @@
-from typing import cast
+import json
+import os
+from typing import List, cast
 import pytest
 from src.data import (
-    load_input_documents_from_file,
+    KEPT_GENERATIONS_COUNT,
+    Data,
+    get_generations_dirname,
+    get_raw_dump_filename,
+    prune_generations,
+    read_current_generation_id,
+    read_reusable_generation_id,
+    write_current_generation_id,
 )
+from src.fetch import HttpCache
+from src.search_fulltext import FullTextSearchEngine
+from src.search_fulltext_bm25 import BM25FullTextSearchEngine
+from src.search_semantic import SemanticSearchEngine
+from src.util import ApplicationFileLocator, InputDocument
+from tests.conftest import FakeIndexer
 
 
 @pytest.mark.skip(reason="TODO")
@@ -15,11 +30,436 @@ def test_data_load():
     pass
 
 
-def test_load_applications_from_file():
-    input_documents = load_input_documents_from_file(
-        "tests/fixtures/preprocessed_aggregated_applications.json",
+def test_data_ingest_builds_new_generation_with_changed_applications_only(
+    aggregated_applications, tmp_path, monkeypatch
+):
+    applications = aggregated_applications
+    source_dataset_filename = os.path.join(tmp_path, "applications_aggregate.json")
+    storage_dir = os.path.join(tmp_path, "storage")
+    os.makedirs(storage_dir)
+
+    with open(source_dataset_filename, "w") as file:
+        json.dump(applications, file)
+    Data.ingest_from_file_and_persist(
+        source_dataset_filename=source_dataset_filename,
+        storage_dir=storage_dir,
+        first_run=True,
+    )
+    data = Data(storage_dir)
+    data.reload()
+    first_generation = data.generation
+
+    updates = []
+    original_update = SemanticSearchEngine.update
+
+    def spy_update(self, project_docs, deleted_refs):
+        updates.append(
+            (
+                [d.document.metadata["application_ref"] for d in project_docs],
+                deleted_refs,
+            )
+        )
+        original_update(self, project_docs, deleted_refs)
+
+    monkeypatch.setattr(SemanticSearchEngine, "update", spy_update)
+
+    changed_application = applications[2]
+    changed_application["metadata"]["application"]["project"]["title"] = "Zyzzyva"
+    removed_application = applications.pop(3)
+    with open(source_dataset_filename, "w") as file:
+        json.dump(applications, file)
+    Data.ingest_from_file_and_persist(
+        source_dataset_filename=source_dataset_filename,
+        storage_dir=storage_dir,
+        first_run=False,
+    )
+
+    round_id = changed_application["roundId"]
+    assert updates == [
+        (
+            [f"10:{round_id}:{changed_application['id']}"],
+            [f"10:{round_id}:{removed_application['id']}"],
+        )
+    ]
+
+    data.reload()
+    assert data.generation is not first_generation
+    results = data.generation.fulltext_search_engine.search("zyzzyva")
+    assert [r.ref for r in results] == [f"10:{round_id}:{changed_application['id']}"]
+    assert results[0].ref in data.generation.application_summaries_by_ref
+    assert len(data.generation.application_summaries_by_ref) == 44
+    # A generation held by a request in flight is left untouched
+    assert first_generation.fulltext_search_engine.search("zyzzyva") == []
+    assert len(first_generation.application_summaries_by_ref) == 45
+
+    # Nothing changed, nothing gets reindexed
+    second_generation = data.generation
+    Data.ingest_from_file_and_persist(
+        source_dataset_filename=source_dataset_filename,
+        storage_dir=storage_dir,
+        first_run=False,
+    )
+    data.reload()
+    assert len(updates) == 1
+    assert data.generation is second_generation
+
+
+def test_data_generation_is_reused_only_if_built_with_same_setup_and_sources(
+    aggregated_applications, tmp_path
+):
+    source_dataset_filename = os.path.join(tmp_path, "applications_aggregate.json")
+    storage_dir = os.path.join(tmp_path, "storage")
+    os.makedirs(storage_dir)
+    with open(source_dataset_filename, "w") as file:
+        json.dump(aggregated_applications, file)
+
+    Data.ingest_from_file_and_persist(
+        source_dataset_filename=source_dataset_filename,
+        storage_dir=storage_dir,
+        first_run=True,
+        sources_hash="sources",
+    )
+    generation_id = read_current_generation_id(storage_dir)
+
+    assert generation_id is not None
+    assert (
+        read_reusable_generation_id(
+            storage_dir,
+            sources_hash="sources",
+            semantic_search_engine_factory=SemanticSearchEngine,
+            fulltext_search_engine_factory=FullTextSearchEngine,
+        )
+        == generation_id
+    )
+    assert (
+        read_reusable_generation_id(
+            storage_dir,
+            sources_hash="other sources",
+            semantic_search_engine_factory=SemanticSearchEngine,
+            fulltext_search_engine_factory=FullTextSearchEngine,
+        )
+        is None
+    )
+    assert (
+        read_reusable_generation_id(
+            storage_dir,
+            sources_hash="sources",
+            semantic_search_engine_factory=SemanticSearchEngine,
+            fulltext_search_engine_factory=BM25FullTextSearchEngine,
+        )
+        is None
+    )
+
+    def is_reusable() -> bool:
+        return (
+            read_reusable_generation_id(
+                storage_dir,
+                sources_hash="sources",
+                semantic_search_engine_factory=SemanticSearchEngine,
+                fulltext_search_engine_factory=FullTextSearchEngine,
+            )
+            is not None
+        )
+
+    generation_dirname = os.path.join(storage_dir, "generations", generation_id)
+    manifest_filename = os.path.join(generation_dirname, "manifest.json")
+    with open(manifest_filename) as file:
+        manifest = json.load(file)
+    with open(manifest_filename, "w") as file:
+        json.dump({**manifest, "application_count": 0}, file)
+    assert not is_reusable()
+
+    with open(manifest_filename, "w") as file:
+        json.dump(manifest, file)
+    assert is_reusable()
+
+    fulltext_index_filename = os.path.join(
+        generation_dirname, FullTextSearchEngine.index_filename
+    )
+    with open(fulltext_index_filename, "w") as file:
+        file.write("{")
+    assert not is_reusable()
+
+    # Switching engines rebuilds the generation rather than updating it
+    Data.ingest_from_file_and_persist(
+        source_dataset_filename=source_dataset_filename,
+        storage_dir=storage_dir,
+        first_run=False,
+        fulltext_search_engine_factory=BM25FullTextSearchEngine,
+        sources_hash="sources",
+    )
+    assert read_current_generation_id(storage_dir) != generation_id
+    data = Data(storage_dir, fulltext_search_engine_factory=BM25FullTextSearchEngine)
+    data.reload()
+    assert len(data.generation.application_summaries_by_ref) == 45
+
+
+def test_prune_generations_ignores_entries_that_are_not_generations(tmp_path):
+    storage_dir = str(tmp_path)
+    generations_dirname = get_generations_dirname(storage_dir)
+    generation_ids = [str(i) for i in range(1, KEPT_GENERATIONS_COUNT + 3)]
+    for generation_id in generation_ids:
+        os.makedirs(os.path.join(generations_dirname, generation_id))
+        with open(
+            os.path.join(generations_dirname, generation_id, "manifest.json"), "w"
+        ) as file:
+            file.write("{}")
+    write_current_generation_id(storage_dir, generation_ids[-1])
+    open(os.path.join(generations_dirname, ".DS_Store"), "w").close()
+    os.makedirs(os.path.join(generations_dirname, "tmp"))
+
+    prune_generations(storage_dir)
+
+    assert sorted(os.listdir(generations_dirname)) == sorted(
+        [".DS_Store", "tmp", *generation_ids[-KEPT_GENERATIONS_COUNT:]]
+    )
+
+
+def test_data_ingest_removes_generation_that_failed_to_build(
+    aggregated_applications, tmp_path, monkeypatch
+):
+    source_dataset_filename = os.path.join(tmp_path, "applications_aggregate.json")
+    storage_dir = os.path.join(tmp_path, "storage")
+    generations_dirname = os.path.join(storage_dir, "generations")
+    os.makedirs(storage_dir)
+    with open(source_dataset_filename, "w") as file:
+        json.dump(aggregated_applications, file)
+
+    Data.ingest_from_file_and_persist(
+        source_dataset_filename=source_dataset_filename,
+        storage_dir=storage_dir,
+        first_run=True,
+    )
+    generation_id = read_current_generation_id(storage_dir)
+
+    def failing_save_index(self, path):
+        raise ZeroDivisionError()
+
+    aggregated_applications[2]["metadata"]["application"]["project"][
+        "title"
+    ] = "Zyzzyva"
+    with open(source_dataset_filename, "w") as file:
+        json.dump(aggregated_applications, file)
+    with monkeypatch.context() as m:
+        m.setattr(FullTextSearchEngine, "save_index", failing_save_index)
+        with pytest.raises(ZeroDivisionError):
+            Data.ingest_from_file_and_persist(
+                source_dataset_filename=source_dataset_filename,
+                storage_dir=storage_dir,
+                first_run=False,
+            )
+
+    assert read_current_generation_id(storage_dir) == generation_id
+    assert os.listdir(generations_dirname) == [generation_id]
+
+    # A generation persisted without some of its files is never switched to
+    with monkeypatch.context() as m:
+        m.setattr(SemanticSearchEngine, "persisted_filenames", ["missing.sqlite3"])
+        with pytest.raises(Exception, match="missing.sqlite3"):
+            Data.ingest_from_file_and_persist(
+                source_dataset_filename=source_dataset_filename,
+                storage_dir=storage_dir,
+                first_run=False,
+            )
+
+    assert read_current_generation_id(storage_dir) == generation_id
+    assert os.listdir(generations_dirname) == [generation_id]
+
+    # Left behind by a process killed while building
+    os.makedirs(os.path.join(generations_dirname, "1"))
+    Data.ingest_from_file_and_persist(
+        source_dataset_filename=source_dataset_filename,
+        storage_dir=storage_dir,
+        first_run=False,
+    )
+
+    new_generation_id = read_current_generation_id(storage_dir)
+    assert new_generation_id != generation_id
+    assert sorted(os.listdir(generations_dirname)) == sorted(
+        [generation_id, new_generation_id]
+    )
+
+
+def test_data_ingest_from_indexer_streams_applications_and_dumps_them(
+    aggregated_applications, fake_indexer: FakeIndexer, tmp_path
+):
+    round_ids = list(dict.fromkeys(a["roundId"] for a in aggregated_applications))
+    fake_indexer.files_by_path["/data/10/rounds.json"] = json.dumps(
+        [
+            {"id": round_id, "metadata": {"name": f"Round {i}"}}
+            for i, round_id in enumerate(round_ids)
+        ]
+    ).encode()
+    for round_id in round_ids:
+        fake_indexer.files_by_path[
+            f"/data/10/rounds/{round_id}/applications.json"
+        ] = json.dumps(
+            [a for a in aggregated_applications if a["roundId"] == round_id]
+        ).encode()
+    storage_dir = os.path.join(tmp_path, "storage")
+
+    Data.ingest_from_application_locators_and_persist(
+        application_files_locators=[
+            ApplicationFileLocator(chain_id=10, round_id=round_id)
+            for round_id in round_ids
+        ],
+        storage_dir=storage_dir,
+        indexer_base_url=fake_indexer.base_url,
+        first_run=True,
+        raw_dump_filename=get_raw_dump_filename(storage_dir),
     )
 
+    data = Data(storage_dir)
+    data.reload()
+    assert len(data.generation.application_summaries_by_ref) == 45
+    assert {
+        s.round_name for s in data.generation.application_summaries_by_ref.values()
+    } == {f"Round {i}" for i in range(len(round_ids))}
+    with open(get_raw_dump_filename(storage_dir)) as file:
+        dumped_applications = json.load(file)
+    assert len(dumped_applications) == len(aggregated_applications)
+    assert {a["roundName"] for a in dumped_applications} == {
+        f"Round {i}" for i in range(len(round_ids))
+    }
+
+
+def test_data_ingest_that_failed_fetches_the_same_rounds_again(
+    aggregated_applications, fake_indexer: FakeIndexer, tmp_path, monkeypatch
+):
+    round_ids = list(dict.fromkeys(a["roundId"] for a in aggregated_applications))
+    fake_indexer.files_by_path["/data/10/rounds.json"] = json.dumps(
+        [{"id": round_id, "metadata": {"name": "Round"}} for round_id in round_ids]
+    ).encode()
+
+    def serve_applications(applications):
+        for round_id in round_ids:
+            fake_indexer.files_by_path[
+                f"/data/10/rounds/{round_id}/applications.json"
+            ] = json.dumps(
+                [a for a in applications if a["roundId"] == round_id]
+            ).encode()
+
+    storage_dir = os.path.join(tmp_path, "storage")
+    http_cache = HttpCache(os.path.join(storage_dir, "http_cache"))
+
+    def ingest(first_run: bool):
+        Data.ingest_from_application_locators_and_persist(
+            application_files_locators=[
+                ApplicationFileLocator(chain_id=10, round_id=round_id)
+                for round_id in round_ids
+            ],
+            storage_dir=storage_dir,
+            indexer_base_url=fake_indexer.base_url,
+            first_run=first_run,
+            http_cache=http_cache,
+        )
+
+    serve_applications(aggregated_applications)
+    ingest(first_run=True)
+
+    changed_application = aggregated_applications[2]
+    changed_application["metadata"]["application"]["project"]["title"] = "Zyzzyva"
+    serve_applications(aggregated_applications)
+
+    def failing_save_index(self, path):
+        raise OSError("No space left on device")
+
+    with monkeypatch.context() as m:
+        m.setattr(FullTextSearchEngine, "save_index", failing_save_index)
+        with pytest.raises(OSError):
+            ingest(first_run=False)
+
+    fake_indexer.downloaded_paths.clear()
+    ingest(first_run=False)
+
+    assert (
+        f"/data/10/rounds/{changed_application['roundId']}/applications.json"
+        in fake_indexer.downloaded_paths
+    )
+    data = Data(storage_dir)
+    data.reload()
+    assert [
+        r.ref for r in data.generation.fulltext_search_engine.search("zyzzyva")
+    ] == [f"10:{changed_application['roundId']}:{changed_application['id']}"]
+
+    # Once ingested, unchanged rounds are not downloaded again
+    fake_indexer.downloaded_paths.clear()
+    ingest(first_run=False)
+    assert fake_indexer.downloaded_paths == []
+
+
+def test_data_ingest_keeps_applications_of_rounds_that_could_not_be_fetched(
+    aggregated_applications, fake_indexer: FakeIndexer, tmp_path
+):
+    round_ids = list(dict.fromkeys(a["roundId"] for a in aggregated_applications))
+    fake_indexer.files_by_path["/data/10/rounds.json"] = json.dumps(
+        [
+            {"id": round_id.lower(), "metadata": {"name": "Round"}}
+            for round_id in round_ids
+        ]
+    ).encode()
+
+    def serve_applications(applications):
+        for round_id in round_ids:
+            fake_indexer.files_by_path[
+                f"/data/10/rounds/{round_id.lower()}/applications.json"
+            ] = json.dumps(
+                [a for a in applications if a["roundId"] == round_id]
+            ).encode()
+
+    storage_dir = os.path.join(tmp_path, "storage")
+
+    def ingest(first_run: bool):
+        Data.ingest_from_application_locators_and_persist(
+            application_files_locators=[
+                ApplicationFileLocator(chain_id=10, round_id=round_id.lower())
+                for round_id in round_ids
+            ],
+            storage_dir=storage_dir,
+            indexer_base_url=fake_indexer.base_url,
+            first_run=first_run,
+        )
+
+    serve_applications(aggregated_applications)
+    ingest(first_run=True)
+    data = Data(storage_dir)
+    data.reload()
+    refs = set(data.generation.application_summaries_by_ref)
+    assert len(refs) == 45
+
+    # One round answers 404, an application of the other one changed
+    changed_application = next(
+        a
+        for a in aggregated_applications
+        if a["roundId"] == round_ids[0] and a["status"] == "APPROVED"
+    )
+    changed_application["metadata"]["application"]["project"]["title"] = "Zyzzyva"
+    serve_applications(aggregated_applications)
+    del fake_indexer.files_by_path[
+        f"/data/10/rounds/{round_ids[1].lower()}/applications.json"
+    ]
+    ingest(first_run=False)
+
+    data.reload()
+    assert set(data.generation.application_summaries_by_ref) == refs
+    assert [
+        r.ref for r in data.generation.fulltext_search_engine.search("zyzzyva")
+    ] == [f"10:{round_ids[0]}:{changed_application['id']}"]
+    updated_generation_id = data.generation.id
+
+    # Indexer outage: nothing can be fetched, nothing is removed
+    fake_indexer.files_by_path.clear()
+    ingest(first_run=False)
+
+    assert read_current_generation_id(storage_dir) == updated_generation_id
+    assert len(os.listdir(os.path.join(storage_dir, "generations"))) == 2
+
+
+def test_load_applications_from_file(
+    application_input_documents: List[InputDocument],
+):
+    input_documents = application_input_documents
+
     assert len(input_documents) == 45
     assert (
         input_documents[0].document.metadata.get("application_ref")
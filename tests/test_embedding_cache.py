@@ -0,0 +1,58 @@
+from typing import List
+from unittest.mock import patch
+import numpy as np
+from src.util import InputDocument
+from src.embedding_cache import EmbeddingCache
+from src.search_semantic import EMBEDDING_MODEL_NAME, embed_documents
+from src.search_semantic_numpy import NumpySemanticSearchEngine
+import src.search_semantic
+
+
+def test_embedding_cache_persists_embeddings(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), model_name="model-a")
+    cache.put_many(["foo", "bar"], np.asarray([[1, 2], [3, 4]], dtype=np.float32))
+    cache.put_many(["bar", "baz"], np.asarray([[3, 4], [5, 6]], dtype=np.float32))
+
+    reloaded_cache = EmbeddingCache(str(tmp_path), model_name="model-a")
+    embeddings_by_position, missing_positions = reloaded_cache.get_many(
+        ["baz", "qux", "foo"]
+    )
+
+    assert len(reloaded_cache) == 3
+    assert missing_positions == [1]
+    assert embeddings_by_position[0].tolist() == [5, 6]
+    assert embeddings_by_position[2].tolist() == [1, 2]
+
+    other_model_cache = EmbeddingCache(str(tmp_path), model_name="model-b")
+    assert other_model_cache.get_many(["foo"]) == ({}, [0])
+
+
+def test_embed_documents_only_embeds_cache_misses(
+    application_input_documents: List[InputDocument],
+    tmp_path,
+):
+    texts = [d.document.page_content for d in application_input_documents]
+    expected_embeddings = embed_documents(texts)
+
+    cache = EmbeddingCache(str(tmp_path), model_name=EMBEDDING_MODEL_NAME)
+    embed_documents(texts[:10], cache=cache)
+
+    with patch.object(
+        src.search_semantic,
+        "_embed_texts",
+        wraps=src.search_semantic._embed_texts,
+    ) as embed_texts_spy:
+        engine = NumpySemanticSearchEngine(
+            document_embedding_cache=EmbeddingCache(
+                str(tmp_path), model_name=EMBEDDING_MODEL_NAME
+            )
+        )
+        engine.index(application_input_documents)
+
+    assert len(embed_texts_spy.call_args.args[0]) == len(texts) - 10
+    assert np.allclose(
+        engine.embeddings,
+        expected_embeddings
+        / np.linalg.norm(expected_embeddings, axis=1, keepdims=True),
+        atol=1e-5,
+    )
@@ -0,0 +1,68 @@
+import multiprocessing
+import threading
+import time
+import numpy as np
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from src.embedding_service import EmbeddingClient, EmbeddingServer
+from src.search_semantic import get_embedding_function
+from src.search_semantic_numpy import NumpySemanticSearchEngine
+from src.util import InputDocument
+
+
+def test_embedding_service_batches_concurrent_queries(tmp_path):
+    batch_sizes = []
+
+    def embed(queries: List[str]) -> np.ndarray:
+        batch_sizes.append(len(queries))
+        time.sleep(0.05)
+        return np.array([[len(query), 1.0] for query in queries])
+
+    socket_path = str(tmp_path / "embedding.sock")
+    server = EmbeddingServer(socket_path, embed, max_batch_wait_seconds=0.01)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = EmbeddingClient(socket_path, timeout_seconds=5)
+    queries = ["a" * length for length in range(1, 21)]
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        embeddings = list(executor.map(client.embed_query, queries))
+    client.close()
+
+    assert embeddings == [[float(len(query)), 1.0] for query in queries]
+    assert sum(batch_sizes) == len(queries)
+    assert len(batch_sizes) < len(queries)
+
+
+def serve_constant_embeddings(socket_path: str) -> None:
+    # Tells service embeddings apart from those of the model
+    def embed(queries: List[str]) -> np.ndarray:
+        return np.ones((len(queries), 384), dtype=np.float32)
+
+    EmbeddingServer(socket_path, embed).serve_forever()
+
+
+def test_search_falls_back_to_in_process_embedding_when_service_dies(
+    application_input_documents: List[InputDocument], tmp_path
+):
+    socket_path = str(tmp_path / "embedding.sock")
+    service = multiprocessing.get_context("fork").Process(
+        target=serve_constant_embeddings, args=(socket_path,), daemon=True
+    )
+    service.start()
+    engine = NumpySemanticSearchEngine(
+        embedding_client=EmbeddingClient(socket_path, timeout_seconds=5)
+    )
+    engine.index(application_input_documents)
+
+    assert engine._embed_query("open source") == [1.0] * 384
+
+    service.kill()
+    service.join()
+
+    assert np.allclose(
+        engine._embed_query("open source"),
+        get_embedding_function().embed_query("open source"),
+        atol=1e-5,
+    )
+    results = engine.search("open source")
+    assert len(results) > 0
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+from src.executor import BoundedExecutor, SingleFlight
+
+
+def test_bounded_executor_runs_calls_concurrently_up_to_limit():
+    executor = BoundedExecutor(max_workers=2)
+    release = threading.Event()
+    stats_while_blocked = {}
+
+    def blocking_call():
+        release.wait(timeout=5)
+        return threading.current_thread().name
+
+    async def run():
+        tasks = [asyncio.ensure_future(executor.run(blocking_call)) for _ in range(3)]
+        # Leave the event loop responsive while the pool is saturated
+        while executor.get_stats()["running"] < 2:
+            await asyncio.sleep(0.01)
+        stats_while_blocked.update(executor.get_stats())
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    start_time = time.perf_counter()
+    thread_names = asyncio.run(run())
+
+    assert time.perf_counter() - start_time < 5
+    assert stats_while_blocked["running"] == 2
+    assert stats_while_blocked["queued"] == 1
+    assert len(set(thread_names)) <= 2
+    assert executor.get_stats() == {
+        "max_workers": 2,
+        "queued": 0,
+        "running": 0,
+        "completed": 3,
+    }
+    executor.shutdown()
+
+
+def test_single_flight_coalesces_concurrent_calls_with_same_key():
+    single_flight: SingleFlight[str, str] = SingleFlight()
+    started_calls = []
+
+    async def compute(key: str) -> str:
+        started_calls.append(key)
+        await asyncio.sleep(0.05)
+        return key.upper()
+
+    async def run():
+        return await asyncio.gather(
+            *[
+                single_flight.run(key, lambda key=key: compute(key))
+                for key in ["foo", "foo", "bar", "foo"]
+            ]
+        )
+
+    assert asyncio.run(run()) == ["FOO", "FOO", "BAR", "FOO"]
+    assert started_calls == ["foo", "bar"]
+    assert single_flight.get_stats() == {"in_flight": 0, "calls": 2, "coalesced": 2}
@@ -0,0 +1,181 @@
+import json
+import os
+import time
+from typing import Any, Iterable, cast
+from src.data import fetch_and_enrich_applications, fetch_round_names
+from src.fetch import Fetcher, HttpCache
+from src.util import ApplicationFileLocator
+from tests.conftest import FakeIndexer
+
+ROUND_IDS = [
+    "0x10be322DE44389DeD49c0b2b73d8c3A1E3B6D871",
+    "0xB5C0939A9BB0C404b028D402493b86D9998af55e",
+    "0x98720dD1925d34a2453ebC1F91C9d48E7e89ec29",
+]
+
+
+def serve_rounds(fake_indexer: FakeIndexer, chain_id: int):
+    fake_indexer.files_by_path[f"/data/{chain_id}/rounds.json"] = json.dumps(
+        [
+            {"id": round_id, "metadata": {"name": f"Round {i}"}}
+            for i, round_id in enumerate(ROUND_IDS)
+        ]
+    ).encode()
+    for i, round_id in enumerate(ROUND_IDS):
+        fake_indexer.files_by_path[
+            f"/data/{chain_id}/rounds/{round_id}/applications.json"
+        ] = json.dumps([{"id": str(i), "status": "APPROVED"}]).encode()
+
+
+def test_fetch_and_enrich_applications(fake_indexer: FakeIndexer):
+    serve_rounds(fake_indexer, 10)
+
+    applications = fetch_and_enrich_applications(
+        [ApplicationFileLocator(chain_id=10, round_id=r) for r in ROUND_IDS],
+        fake_indexer.base_url,
+    ).applications
+
+    assert list(cast(Iterable[Any], applications)) == [
+        {"id": "0", "status": "APPROVED", "chainId": 10, "roundName": "Round 0"},
+        {"id": "1", "status": "APPROVED", "chainId": 10, "roundName": "Round 1"},
+        {"id": "2", "status": "APPROVED", "chainId": 10, "roundName": "Round 2"},
+    ]
+    # The rounds file is fetched once per chain
+    assert fake_indexer.requested_paths.count("/data/10/rounds.json") == 1
+
+
+def test_fetch_rounds_concurrently(fake_indexer: FakeIndexer):
+    serve_rounds(fake_indexer, 10)
+    fake_indexer.delay_seconds = 0.5
+
+    start_time = time.perf_counter()
+    applications = fetch_and_enrich_applications(
+        [ApplicationFileLocator(chain_id=10, round_id=r) for r in ROUND_IDS],
+        fake_indexer.base_url,
+        fetcher=Fetcher(max_concurrency=4),
+    ).applications
+    elapsed = time.perf_counter() - start_time
+
+    assert len(list(cast(Iterable[Any], applications))) == 3
+    # Four requests of 0.5s each would take 2s if performed sequentially
+    assert elapsed < 1.5
+
+
+def test_fetch_retries_failed_requests(fake_indexer: FakeIndexer):
+    serve_rounds(fake_indexer, 10)
+    applications_path = f"/data/10/rounds/{ROUND_IDS[0]}/applications.json"
+    fake_indexer.failures_by_path[applications_path] = 2
+
+    applications = fetch_and_enrich_applications(
+        [ApplicationFileLocator(chain_id=10, round_id=ROUND_IDS[0])],
+        fake_indexer.base_url,
+        fetcher=Fetcher(max_retries=3, backoff_factor=0.01),
+    ).applications
+
+    assert len(list(cast(Iterable[Any], applications))) == 1
+    assert fake_indexer.requested_paths.count(applications_path) == 3
+
+
+def test_fetch_skips_rounds_that_keep_failing(fake_indexer: FakeIndexer):
+    serve_rounds(fake_indexer, 10)
+    fake_indexer.failures_by_path[
+        f"/data/10/rounds/{ROUND_IDS[0]}/applications.json"
+    ] = 10
+
+    applications = fetch_and_enrich_applications(
+        [ApplicationFileLocator(chain_id=10, round_id=r) for r in ROUND_IDS[0:2]],
+        fake_indexer.base_url,
+        fetcher=Fetcher(max_retries=1, backoff_factor=0.01),
+    ).applications
+
+    assert [a["roundName"] for a in cast(Iterable[Any], applications)] == ["Round 1"]
+
+
+def test_fetch_reuses_cached_rounds_that_were_not_modified(
+    fake_indexer: FakeIndexer, tmp_path
+):
+    serve_rounds(fake_indexer, 10)
+    locators = [ApplicationFileLocator(chain_id=10, round_id=r) for r in ROUND_IDS]
+    http_cache = HttpCache(os.path.join(tmp_path, "http_cache"))
+
+    fetched = fetch_and_enrich_applications(
+        locators, fake_indexer.base_url, http_cache=http_cache
+    )
+    assert fetched.changed_rounds_count == 3
+    # Rounds are stored as their applications are consumed
+    assert len(list(cast(Iterable[Any], fetched.applications))) == 3
+
+    # Validators of a run whose data was not ingested are not relied upon
+    http_cache.discard()
+    fetched = fetch_and_enrich_applications(
+        locators,
+        fake_indexer.base_url,
+        http_cache=http_cache,
+        load_if_unchanged=False,
+    )
+    assert fetched.changed_rounds_count == 3
+    assert len(list(cast(Iterable[Any], fetched.applications))) == 3
+    http_cache.save()
+
+    fake_indexer.downloaded_paths.clear()
+    fetched = fetch_and_enrich_applications(
+        locators,
+        fake_indexer.base_url,
+        http_cache=HttpCache(os.path.join(tmp_path, "http_cache")),
+        load_if_unchanged=False,
+    )
+    assert fetched.changed_rounds_count == 0
+    assert fetched.applications is None
+    assert fake_indexer.downloaded_paths == []
+
+    changed_applications_path = f"/data/10/rounds/{ROUND_IDS[1]}/applications.json"
+    fake_indexer.files_by_path[changed_applications_path] = json.dumps(
+        [{"id": "1", "status": "REJECTED"}]
+    ).encode()
+    fetched = fetch_and_enrich_applications(
+        locators,
+        fake_indexer.base_url,
+        http_cache=HttpCache(os.path.join(tmp_path, "http_cache")),
+        load_if_unchanged=False,
+    )
+    assert fetched.changed_rounds_count == 1
+    assert fake_indexer.downloaded_paths == [changed_applications_path]
+    # Unchanged rounds are streamed from the cache
+    assert list(cast(Iterable[Any], fetched.applications)) == [
+        {"id": "0", "status": "APPROVED", "chainId": 10, "roundName": "Round 0"},
+        {"id": "1", "status": "REJECTED", "chainId": 10, "roundName": "Round 1"},
+        {"id": "2", "status": "APPROVED", "chainId": 10, "roundName": "Round 2"},
+    ]
+
+
+def test_fetch_round_names_indexes_requested_rounds_only(
+    fake_indexer: FakeIndexer, tmp_path
+):
+    serve_rounds(fake_indexer, 10)
+    rounds_file_url = f"{fake_indexer.base_url}/data/10/rounds.json"
+    http_cache = HttpCache(os.path.join(tmp_path, "http_cache"))
+
+    round_names = fetch_round_names(
+        rounds_file_url, ROUND_IDS[0:2], fetcher=Fetcher(), http_cache=http_cache
+    )
+    assert round_names.not_modified is False
+    assert round_names.round_names_by_id == {
+        ROUND_IDS[0]: "Round 0",
+        ROUND_IDS[1]: "Round 1",
+    }
+    http_cache.save()
+
+    round_names = fetch_round_names(
+        rounds_file_url, ROUND_IDS[0:1], fetcher=Fetcher(), http_cache=http_cache
+    )
+    assert round_names.not_modified is True
+    assert round_names.round_names_by_id[ROUND_IDS[0]] == "Round 0"
+    http_cache.save()
+
+    # A round that is not in the persisted index requires a full fetch
+    round_names = fetch_round_names(
+        rounds_file_url, ROUND_IDS, fetcher=Fetcher(), http_cache=http_cache
+    )
+    assert round_names.not_modified is False
+    assert round_names.round_names_by_id[ROUND_IDS[2]] == "Round 2"
+    assert fake_indexer.downloaded_paths == ["/data/10/rounds.json"] * 2
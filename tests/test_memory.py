@@ -0,0 +1,15 @@
+import os
+import pytest
+from src.memory import SMAPS_ROLLUP_FILENAME, get_memory_usage
+
+
+@pytest.mark.skipif(
+    not os.path.exists(SMAPS_ROLLUP_FILENAME), reason="requires /proc smaps_rollup"
+)
+def test_get_memory_usage_splits_resident_memory():
+    memory_usage = get_memory_usage()
+
+    assert memory_usage is not None
+    assert memory_usage["rss"] > 0
+    assert memory_usage["private"] > 0
+    assert memory_usage["shared"] + memory_usage["private"] == memory_usage["rss"]
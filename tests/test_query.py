@@ -1,5 +1,5 @@
 import pytest
-from src.search_query import SearchQuery
+from src.search_query import SearchCursor, SearchQuery, search_params_cache
 
 
 def test_default_parameters():
@@ -29,3 +29,79 @@ def test_set_fulltext_std_dev_factor_for_hybrid_search():
 def test_set_semantic_score_cutoff_for_hybrid_search():
     q = SearchQuery("open source --strategy=hybrid --semantic-score-cutoff=0.05")
     assert q.params.semantic_score_cutoff == 0.05
+
+
+def test_cache_key_ignores_keyword_case_and_whitespace():
+    assert (
+        SearchQuery("Open  Source --strategy=semantic").cache_key
+        == SearchQuery("open source --strategy=semantic").cache_key
+    )
+    assert (
+        SearchQuery("open source --strategy=semantic").cache_key
+        != SearchQuery("open source --strategy=fulltext").cache_key
+    )
+    assert (
+        SearchQuery("open source --semantic-score-cutoff=0.5").cache_key
+        != SearchQuery("open source").cache_key
+    )
+
+
+def test_options_follow_argparse_syntax():
+    q = SearchQuery("--strat fulltext open source --se=0.5")
+    assert q.params.strategy == "fulltext"
+    assert q.params.semantic_score_cutoff == 0.5
+    assert q.params.keywords == ["open", "source"]
+
+    q = SearchQuery("'open source' -- --strategy=semantic -5")
+    assert q.params.strategy == "hybrid"
+    assert q.params.keywords == ["open source", "--strategy=semantic", "-5"]
+
+
+@pytest.mark.parametrize(
+    "query_string",
+    [
+        "open --strategy=semantic source",
+        "open --strategy",
+        "open --s=semantic",
+        "open -x",
+        "open --help",
+    ],
+)
+def test_invalid_query_raises_exception(query_string, capsys):
+    with pytest.raises(Exception, match="Invalid search query"):
+        SearchQuery(query_string)
+    assert capsys.readouterr().err == ""
+
+
+def test_parsed_queries_are_memoized():
+    search_params_cache.clear()
+    q = SearchQuery("open source --strategy=semantic")
+    assert SearchQuery("open source --strategy=semantic").params is q.params
+    assert (
+        SearchQuery(
+            "open source --strategy=semantic", default_semantic_score_cutoff=0.5
+        ).params
+        is not q.params
+    )
+
+
+def test_search_cursor_round_trips_through_token():
+    cursor = SearchCursor(
+        query_string="open source --strategy=semantic",
+        generation_id="1700000000000000000",
+        offset=20,
+        limit=10,
+    )
+    token = cursor.encode()
+
+    assert SearchCursor.decode(token) == cursor
+    assert token.isascii() and "=" not in token
+
+
+@pytest.mark.parametrize(
+    "token",
+    ["", "nope", SearchCursor("open source", "1", 0, 0).encode(), "W10", "bnVsbA"],
+)
+def test_invalid_search_cursor_raises_exception(token):
+    with pytest.raises(Exception, match="Invalid search cursor"):
+        SearchCursor.decode(token)
@@ -0,0 +1,96 @@
+import brotli
+import gzip
+import json
+from src.rendered_response import RenderedResponse, parse_accept_encoding
+
+
+def test_rendered_response_negotiates_encoding_and_revalidates():
+    body = json.dumps({"applicationSummaries": [{"name": "Play Art"}] * 100}).encode()
+    rendered_response = RenderedResponse.render(body)
+
+    response = rendered_response.to_response(
+        {"accept-encoding": "gzip;q=0.5, deflate"},
+        headers={"Cache-Control": "max-age=600"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == "max-age=600"
+    assert gzip.decompress(response.body) == body
+    gzip_etag = response.headers["etag"]
+
+    response = rendered_response.to_response({"accept-encoding": "gzip;q=0"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.body == body
+    assert response.headers["etag"] != gzip_etag
+
+    response = rendered_response.to_response(
+        {"accept-encoding": "gzip", "if-none-match": gzip_etag}
+    )
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == gzip_etag
+
+    response = rendered_response.to_response({"if-none-match": '"other", W/"stale"'})
+    assert response.status_code == 200
+
+    # Same content, same validator across renders
+    assert RenderedResponse.render(body).etag == rendered_response.etag
+
+
+def test_rendered_response_prefers_brotli_and_revalidates_its_variant():
+    body = json.dumps({"applicationSummaries": [{"name": "Play Art"}] * 100}).encode()
+    rendered_response = RenderedResponse.render(body)
+
+    response = rendered_response.to_response({"accept-encoding": "gzip, deflate, br"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert brotli.decompress(response.body) == body
+    br_etag = response.headers["etag"]
+    assert br_etag == f'"{rendered_response.etag}-br"'
+
+    response = rendered_response.to_response(
+        {"accept-encoding": "br", "if-none-match": br_etag}
+    )
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == br_etag
+    assert response.headers["content-encoding"] == "br"
+
+    # Validated against the same content, whichever variant it came from
+    response = rendered_response.to_response(
+        {"accept-encoding": "gzip", "if-none-match": br_etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["content-encoding"] == "gzip"
+
+    response = rendered_response.to_response(
+        {"accept-encoding": "br", "if-none-match": '"stale-br"'}
+    )
+    assert response.status_code == 200
+    assert brotli.decompress(response.body) == body
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("") == []
+    assert parse_accept_encoding("gzip, deflate, br") == ["gzip", "deflate", "br"]
+    assert parse_accept_encoding("br;q=1.0, GZIP;q=0.8, *;q=0") == ["br", "gzip"]
+
+
+def test_saved_rendered_response_is_served_from_mapped_files(tmp_path):
+    body = json.dumps({"applicationSummaries": [{"name": "Play Art"}] * 100}).encode()
+    RenderedResponse.render(body).save(str(tmp_path / "response"))
+
+    rendered_response = RenderedResponse.load(str(tmp_path / "response"))
+
+    assert isinstance(rendered_response.bodies_by_encoding["identity"], memoryview)
+    assert rendered_response.etag == RenderedResponse.render(body).etag
+    response = rendered_response.to_response({"accept-encoding": "gzip"})
+    assert response.headers["content-length"] == str(
+        len(rendered_response.bodies_by_encoding["gzip"])
+    )
+    assert gzip.decompress(response.body) == body
+
+    response = rendered_response.to_response({"accept-encoding": "br"})
+    assert brotli.decompress(response.body) == body
@@ -1,13 +1,22 @@
+import os
 import pytest
 from typing import Dict, List
 from src.util import InputDocument
 from src.data import ApplicationSummary
 from src.search import SearchEngineResult, SearchType
 from src.search_fulltext import FullTextSearchEngine
-from src.search_semantic import SemanticSearchEngine
+from src.search_fulltext_bm25 import BM25FullTextSearchEngine
+from src.search_semantic import (
+    SemanticSearchEngine,
+    embed_documents,
+    get_embedding_function,
+)
+from src.search_semantic_numpy import NumpySemanticSearchEngine
+from src.cache import LRUCache
 from src.search_hybrid import combine_results
 from tests.conftest import SearchResultsFixture
 from pprint import pprint
+import numpy as np
 
 
 def test_fulltext_search(
@@ -70,6 +79,231 @@ def test_semantic_search(
     assert len(results) == 0
 
 
+def test_semantic_search_reuses_cached_query_embeddings(
+    application_input_documents: List[InputDocument], monkeypatch
+):
+    ss_engine = SemanticSearchEngine(query_embedding_cache=LRUCache(max_size=10))
+    ss_engine.index(application_input_documents)
+    first_results = ss_engine.search("open source", min_score=0)
+
+    embedded_queries = []
+    embedding_function = get_embedding_function()
+    original_embed_query = type(embedding_function).embed_query
+
+    def spy_embed_query(self, text):
+        embedded_queries.append(text)
+        return original_embed_query(self, text)
+
+    monkeypatch.setattr(type(embedding_function), "embed_query", spy_embed_query)
+
+    results = ss_engine.search("Open  Source", min_score=0)
+    assert embedded_queries == []
+    assert [r.ref for r in results] == [r.ref for r in first_results]
+    assert ss_engine.query_embedding_cache is not None
+    assert ss_engine.query_embedding_cache.hits == 1
+
+    ss_engine.search("education", min_score=0)
+    assert embedded_queries == ["education"]
+
+
+def test_embed_documents_in_batches_preserves_order(
+    application_input_documents: List[InputDocument],
+):
+    texts = [d.document.page_content for d in application_input_documents]
+    expected_embeddings = np.asarray(get_embedding_function().embed_documents(texts))
+
+    embeddings = embed_documents(texts, batch_size=4)
+    assert np.allclose(embeddings, expected_embeddings, atol=1e-5)
+
+    embeddings = embed_documents(texts, batch_size=4, processes=2)
+    assert np.allclose(embeddings, expected_embeddings, atol=1e-5)
+
+
+def test_embedding_pool_workers_share_the_cores(
+    application_input_documents: List[InputDocument], monkeypatch
+):
+    # Patched on the class, as the model is pickled into the workers
+    model_class = type(get_embedding_function().client)
+    start_multi_process_pool = model_class.start_multi_process_pool
+    omp_num_threads_at_start = []
+
+    def spy_start_multi_process_pool(self, target_devices):
+        omp_num_threads_at_start.append(os.environ.get("OMP_NUM_THREADS"))
+        return start_multi_process_pool(self, target_devices=target_devices)
+
+    monkeypatch.setattr(
+        model_class, "start_multi_process_pool", spy_start_multi_process_pool
+    )
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.delenv("OMP_NUM_THREADS", raising=False)
+    texts = [d.document.page_content for d in application_input_documents]
+
+    embed_documents(texts, batch_size=4, processes=2)
+
+    assert omp_num_threads_at_start == ["4"]
+    assert "OMP_NUM_THREADS" not in os.environ
+
+
+@pytest.fixture(scope="module")
+def application_semantic_engines(
+    application_input_documents: List[InputDocument],
+) -> Dict[str, SemanticSearchEngine]:
+    chroma_engine = SemanticSearchEngine()
+    chroma_engine.index(application_input_documents)
+    numpy_engine = NumpySemanticSearchEngine()
+    numpy_engine.index(application_input_documents)
+    numpy_float16_engine = NumpySemanticSearchEngine(dtype="float16")
+    numpy_float16_engine.index(application_input_documents)
+    return {
+        "chroma": chroma_engine,
+        "numpy": numpy_engine,
+        "numpy_float16": numpy_float16_engine,
+    }
+
+
+@pytest.mark.parametrize("backend", ["numpy", "numpy_float16"])
+@pytest.mark.parametrize(
+    "query", ["open source", "education", "nature preservation", "refi"]
+)
+def test_numpy_semantic_search_recall_matches_chroma(
+    application_semantic_engines: Dict[str, SemanticSearchEngine],
+    backend: str,
+    query: str,
+):
+    chroma_results = application_semantic_engines["chroma"].search(query, min_score=0)
+    numpy_results = application_semantic_engines[backend].search(query, min_score=0)
+
+    top_k = 10
+    chroma_top_refs = set(r.ref for r in chroma_results[:top_k])
+    numpy_top_refs = set(r.ref for r in numpy_results[:top_k])
+    assert len(chroma_top_refs & numpy_top_refs) / top_k >= 0.9
+
+    chroma_scores_by_ref = {r.ref: r.score for r in chroma_results}
+    for r in numpy_results[:top_k]:
+        if r.ref in chroma_scores_by_ref:
+            assert r.score == pytest.approx(chroma_scores_by_ref[r.ref], abs=1e-2)
+
+
+def test_numpy_semantic_search_applies_min_score(
+    application_semantic_engines: Dict[str, SemanticSearchEngine],
+):
+    results = application_semantic_engines["numpy"].search("open source", min_score=0)
+    cutoff = results[5].score
+
+    results = application_semantic_engines["numpy"].search(
+        "open source", min_score=cutoff
+    )
+
+    assert len(results) == 5
+    assert all(r.score > cutoff for r in results)
+
+
+def test_persist_restore_and_update_numpy_semantic_search_index(
+    application_input_documents: List[InputDocument], tmp_path
+):
+    ss_engine = NumpySemanticSearchEngine()
+    ss_engine.index(
+        application_input_documents[:-1], persist_directory=str(tmp_path / "index")
+    )
+    expected_results = ss_engine.search("education", min_score=0)
+
+    ss_engine_with_loaded_index = NumpySemanticSearchEngine()
+    ss_engine_with_loaded_index.load(str(tmp_path / "index"))
+    assert ss_engine_with_loaded_index.search("education", min_score=0) == (
+        expected_results
+    )
+
+    added_document = application_input_documents[-1]
+    deleted_ref = expected_results[0].ref
+    ss_engine_with_loaded_index.update([added_document], [deleted_ref])
+
+    ss_engine_with_updated_index = NumpySemanticSearchEngine()
+    ss_engine_with_updated_index.load(str(tmp_path / "index"))
+    refs = [r.ref for r in ss_engine_with_updated_index.search("education", 0)]
+    assert len(refs) == len(application_input_documents) - 1
+    assert deleted_ref not in refs
+    assert added_document.document.metadata["application_ref"] in refs
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["education", "open source", "nature preservation", "public goods", "refi"],
+)
+def test_bm25_fulltext_search_ranking_matches_lunr(
+    application_input_documents: List[InputDocument], query: str
+):
+    lunr_engine = FullTextSearchEngine()
+    lunr_engine.index(application_input_documents)
+    bm25_engine = BM25FullTextSearchEngine()
+    bm25_engine.index(application_input_documents)
+
+    lunr_results = lunr_engine.search(query)
+    bm25_results = bm25_engine.search(query)
+
+    assert set(r.ref for r in bm25_results) == set(r.ref for r in lunr_results)
+    # Equal scores may be ordered differently, so compare scores by rank
+    assert [r.score for r in bm25_results] == pytest.approx(
+        [r.score for r in lunr_results], abs=0.01
+    )
+    assert bm25_results[0].ref == lunr_results[0].ref
+
+
+@pytest.mark.parametrize("query", ["education", "open source", "public goods"])
+def test_fulltext_search_returns_top_k_results(
+    application_input_documents: List[InputDocument], query: str
+):
+    for fts_engine in [FullTextSearchEngine(), BM25FullTextSearchEngine()]:
+        fts_engine.index(application_input_documents)
+        all_results = fts_engine.search(query)
+        assert len(all_results) > 5
+
+        for k in [1, 5, len(all_results) + 1]:
+            assert fts_engine.search(query, k=k) == all_results[:k]
+
+
+def test_numpy_semantic_search_returns_top_k_results(
+    application_semantic_engines: Dict[str, SemanticSearchEngine],
+):
+    results = application_semantic_engines["numpy"].search("open source", min_score=0)
+
+    assert (
+        application_semantic_engines["numpy"].search("open source", min_score=0, k=5)
+        == results[:5]
+    )
+
+
+def test_persist_restore_and_update_bm25_fulltext_search_index(
+    application_input_documents: List[InputDocument], tmp_path
+):
+    fts_engine = BM25FullTextSearchEngine()
+    fts_engine.index(application_input_documents[:-1])
+    fts_engine.save_index(str(tmp_path / "fts_index.bin"))
+    expected_results = fts_engine.search("education")
+
+    fts_engine_with_loaded_index = BM25FullTextSearchEngine()
+    fts_engine_with_loaded_index.load_index(str(tmp_path / "fts_index.bin"))
+    assert fts_engine_with_loaded_index.search("education") == expected_results
+    # Served straight from the mapped file
+    assert not fts_engine_with_loaded_index.idfs.flags.writeable
+
+    added_document = application_input_documents[-1]
+    deleted_ref = expected_results[0].ref
+    fts_engine_with_loaded_index.update([added_document], [deleted_ref])
+
+    fts_engine_with_loaded_index.save_index(str(tmp_path / "updated_fts_index.bin"))
+    fts_engine_with_updated_index = BM25FullTextSearchEngine()
+    fts_engine_with_updated_index.load_index(str(tmp_path / "updated_fts_index.bin"))
+
+    refs = [r.ref for r in fts_engine_with_updated_index.search("education")]
+    assert deleted_ref not in refs
+    assert (
+        fts_engine_with_loaded_index.search(added_document.document.metadata["name"])[
+            0
+        ].ref
+        == added_document.document.metadata["application_ref"]
+    )
+
+
 def test_hybrid_search_with_strongly_relevant_keywords(
     result_sets: SearchResultsFixture,
     application_summaries_by_ref: Dict[str, ApplicationSummary],
@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from unittest.mock import patch
+from src.data import iter_input_documents
+from src.summary_text import SummaryTextCache, get_summary_text, get_summary_texts
+from src.util import InputDocument
+import src.summary_text
+
+
+def test_get_summary_text_strips_markdown_and_truncates():
+    assert get_summary_text("**Play** [Art](https://example.com)") == "Play Art"
+    assert get_summary_text("a" * 400) == "a" * 300 + "..."
+
+
+def test_summary_text_cache_renders_each_description_once(tmp_path):
+    filename = str(tmp_path / "summary_text_cache.json")
+    cache = SummaryTextCache(filename)
+    descriptions = ["# foo", "*bar*", "# foo"]
+
+    assert get_summary_texts(descriptions, cache=cache) == ["foo", "bar", "foo"]
+    assert len(cache) == 2
+    cache.save()
+
+    reloaded_cache = SummaryTextCache(filename)
+    with patch.object(
+        src.summary_text, "get_summary_text", wraps=get_summary_text
+    ) as get_summary_text_spy:
+        assert get_summary_texts(["*bar*", "_baz_"], cache=reloaded_cache) == [
+            "bar",
+            "baz",
+        ]
+    get_summary_text_spy.assert_called_once_with("_baz_")
+
+    # Entries not used since the previous save are dropped
+    reloaded_cache.save()
+    assert len(SummaryTextCache(filename)) == 2
+    assert SummaryTextCache(filename).get("# foo") is None
+
+
+def test_iter_input_documents_summarizes_across_processes(
+    aggregated_applications: List[dict],
+    application_input_documents: List[InputDocument],
+):
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        descriptions = [d.document.page_content for d in application_input_documents]
+        assert get_summary_texts(descriptions, executor=executor) == [
+            get_summary_text(description) for description in descriptions
+        ]
+
+    cache = SummaryTextCache()
+    input_documents = list(
+        iter_input_documents(aggregated_applications, summary_text_cache=cache)
+    )
+    assert [d.document.metadata for d in input_documents] == [
+        d.document.metadata for d in application_input_documents
+    ]
+    assert len(cache) > 0
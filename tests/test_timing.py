@@ -0,0 +1,16 @@
+import time
+from src.timing import PhaseTimer
+
+
+def test_phase_timer_records_phases_in_order():
+    timer = PhaseTimer()
+    timer.record("imports", 1.5)
+    with timer.phase("load"):
+        time.sleep(0.01)
+    with timer.phase("imports"):
+        pass
+
+    assert list(timer.seconds_by_phase) == ["imports", "load"]
+    assert timer.seconds_by_phase["imports"] >= 1.5
+    assert timer.seconds_by_phase["load"] >= 0.01
+    assert timer.get_total_seconds() == sum(timer.seconds_by_phase.values())
@@ -1,4 +1,5 @@
-from src.util import ApplicationFileLocator
+import json
+from src.util import ApplicationFileLocator, iter_json_array_items
 
 
 def test_application_file_locator_ensures_address_is_checksummed():
@@ -7,3 +8,14 @@ def test_application_file_locator_ensures_address_is_checksummed():
     )
     assert locator.chain_id == 10
     assert locator.round_id == "0xB5C0939A9BB0C404b028D402493b86D9998af55e"
+
+
+def test_iter_json_array_items_across_chunk_boundaries():
+    items = [{"id": "0x1", "metadata": {"name": "Rëfi"}}, 12345, "text", 3.5, None]
+    encoded = json.dumps(items, ensure_ascii=False).encode("utf-8")
+
+    for chunk_size in [1, 2, 3, 1000]:
+        chunks = [
+            encoded[i : i + chunk_size] for i in range(0, len(encoded), chunk_size)
+        ]
+        assert list(iter_json_array_items(chunks)) == items